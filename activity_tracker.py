@@ -0,0 +1,159 @@
+import os
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from app import db
+from models import IssueActivity, utcnow
+
+logger = logging.getLogger(__name__)
+
+IssueKey = Tuple[str, int]
+
+
+class ActivityTracker:
+    """Records issue activity for stale detection with a single UPSERT per write
+
+    With ACTIVITY_FLUSH_MS > 0, touches are coalesced in memory (latest
+    timestamp per issue) and written by a background thread in one bulk
+    statement per interval instead of one statement per event.
+    """
+
+    def __init__(self):
+        self.flush_interval_ms = int(os.getenv("ACTIVITY_FLUSH_MS", "0"))
+        # Activity pushes the issue's stale deadline this far into the future
+        self.stale_after = timedelta(days=int(os.getenv("STALE_DAYS", "14")))
+        self._pending: Dict[IssueKey, datetime] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._app = None
+
+    @property
+    def buffered(self) -> bool:
+        return self._thread is not None
+
+    def start(self, app):
+        """Start the write-behind flusher if ACTIVITY_FLUSH_MS is set"""
+        if self.flush_interval_ms <= 0 or self._thread is not None:
+            return
+        self._app = app
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="activity-flusher", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info("Activity write-behind enabled (%s ms)", self.flush_interval_ms)
+
+    def stop(self):
+        """Stop the flusher and write out anything still buffered"""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=5)
+        with self._app.app_context():
+            self.flush()
+
+    def touch(self, repo_full_name: str, issue_number: int, when: Optional[datetime] = None):
+        """Mark an issue as active now, creating its tracking row if needed"""
+        when = when or utcnow()
+        if self.buffered:
+            with self._lock:
+                key = (repo_full_name, issue_number)
+                if key not in self._pending or self._pending[key] < when:
+                    self._pending[key] = when
+            return
+
+        try:
+            self.upsert({(repo_full_name, issue_number): when})
+        except Exception as e:
+            logger.error("Failed to update issue activity: %s", e)
+            db.session.rollback()
+
+    def flush(self) -> int:
+        """Write all buffered touches in one statement; returns the row count"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            self.upsert(pending)
+        except Exception as e:
+            logger.error("Failed to flush %s issue activity updates: %s", len(pending), e)
+            db.session.rollback()
+            # Put them back for the next attempt, keeping newer touches
+            with self._lock:
+                for key, when in pending.items():
+                    if key not in self._pending or self._pending[key] < when:
+                        self._pending[key] = when
+            return 0
+        return len(pending)
+
+    def upsert(self, touches: Dict[IssueKey, datetime]):
+        """Insert or refresh tracking rows, reset their stale flag and deadline, then commit"""
+        rows = [
+            {
+                "repo_full_name": repo_full_name,
+                "issue_number": issue_number,
+                "last_activity": when,
+                "is_stale": False,
+                "created_at": when,
+                "next_check_at": when + self.stale_after,
+            }
+            for (repo_full_name, issue_number), when in touches.items()
+        ]
+
+        dialect = db.engine.dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            self._upsert_portable(rows)
+            return
+
+        stmt = insert(IssueActivity).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["repo_full_name", "issue_number"],
+            set_={
+                "last_activity": stmt.excluded.last_activity,
+                "is_stale": False,
+                "next_check_at": stmt.excluded.next_check_at,
+            },
+        )
+        db.session.execute(stmt)
+        db.session.commit()
+
+    def _upsert_portable(self, rows):
+        # Dialects without ON CONFLICT: read-modify-write in one transaction
+        for row in rows:
+            activity = (
+                db.session.query(IssueActivity)
+                .filter_by(repo_full_name=row["repo_full_name"], issue_number=row["issue_number"])
+                .first()
+            )
+            if activity:
+                activity.last_activity = row["last_activity"]
+                activity.is_stale = False
+                activity.next_check_at = row["next_check_at"]
+            else:
+                db.session.add(IssueActivity(**row))
+        db.session.commit()
+
+    def _run(self):
+        interval = self.flush_interval_ms / 1000.0
+        while not self._stop.wait(interval):
+            try:
+                with self._app.app_context():
+                    self.flush()
+            except Exception as e:
+                logger.error("Activity flusher error: %s", e)
+
+
+# Global instance
+activity_tracker = ActivityTracker()
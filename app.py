@@ -5,20 +5,24 @@ from dotenv import load_dotenv
 # Load environment variables from .env
 load_dotenv()
 
-from flask import Flask
+import click
+from flask import Flask, Response
 from flask_sqlalchemy import SQLAlchemy
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (queue-backed, JSON by default; see log_pipeline.py)
+from log_pipeline import log_pipeline
+
+log_pipeline.configure()
 logger = logging.getLogger(__name__)
 
 # Create the SQLAlchemy object (no custom model_class)
 db = SQLAlchemy()
 
-# Create Scheduler (single instance)
-scheduler = BackgroundScheduler()
+# Versioned schema migrations (apply with `flask --app main db upgrade`)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Background scheduler, created by start_scheduler() in processes that run jobs
+scheduler = None
 
 
 def create_app():
@@ -40,57 +44,127 @@ def create_app():
     # Initialize extensions
     db.init_app(app)
 
+    # Alembic is only loaded for the `flask` CLI (e.g. `flask db upgrade`)
+    # or DB_AUTO_UPGRADE; serving workers never touch the schema
+    auto_upgrade = os.environ.get("DB_AUTO_UPGRADE", "false").lower() == "true"
+    if auto_upgrade or click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+
+        Migrate(app, db, directory=MIGRATIONS_DIR)
+
     with app.app_context():
         # Import models so tables get registered against the same db registry
         import models  # noqa: F401
 
-        # create tables
-        db.create_all()
+        # Schema changes are applied at deploy time; DB_AUTO_UPGRADE=true runs
+        # pending migrations at startup instead (convenient for local SQLite)
+        if auto_upgrade:
+            from flask_migrate import upgrade
+
+            upgrade()
 
         # Register webhook blueprint
         from routes.webhook import webhook_bp
 
         app.register_blueprint(webhook_bp)
 
+        # Start the async ingestion workers when WEBHOOK_ASYNC is enabled
+        from event_queue import event_queue
+        from routes.webhook import dispatch_event
+
+        if event_queue.enabled:
+            event_queue.start(app, dispatch_event)
+
+        # Start the activity write-behind flusher when ACTIVITY_FLUSH_MS is set
+        from activity_tracker import activity_tracker
+
+        activity_tracker.start(app)
+
+        # Start the GitHub write dispatcher when OUTBOX_ENABLED is set
+        from outbox import outbox
+
+        outbox.start(app)
+
         # Health endpoint
         @app.route("/healthz")
         def health_check():
             return {"status": "ok", "message": "GitHub Issue Triage Bot is running"}
 
+        # Prometheus metrics (METRICS_ENABLED=false hides the endpoint)
+        from metrics import metrics
+
+        if metrics.enabled:
+            metrics.instrument_engine(db.engine)
+
+            @app.route("/metrics")
+            def metrics_endpoint():
+                return Response(
+                    metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+                )
+
+        # Opt-in request tracing and profiling (TRACE_ENABLED / PROFILE_DIR)
+        from tracing import tracer
+
+        if tracer.active:
+            tracer.instrument_session(db.session)
+
         # Start scheduler for stale issue detection if not already running
         try:
-            from handlers.stale import check_stale_issues
-
             # Avoid starting duplicate scheduler when Flask debug reloader spawns two processes.
             # When using the reloader, WERKZEUG_RUN_MAIN == "true" in the child process that runs the app.
             werkzeug_run_main = os.environ.get("WERKZEUG_RUN_MAIN")
-            should_start = False
-
-            if not scheduler.running:
-                # Start scheduler in production (app.debug == False) OR in the reloader child (WERKZEUG_RUN_MAIN == "true")
-                if not app.debug or werkzeug_run_main == "true":
-                    should_start = True
-
-            if should_start:
-                scheduler.add_job(
-                    func=check_stale_issues,
-                    trigger=CronTrigger(hour=9),  # Run daily at 9 AM
-                    id="stale_issues_job",
-                    replace_existing=True,
-                )
-                scheduler.start()
-                logger.info("Scheduler started and stale issues job scheduled.")
+            # SCHEDULER_ENABLED=false keeps webhook-only workers free of the scheduler
+            enabled = os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+
+            # Start scheduler in production (app.debug == False) OR in the reloader child (WERKZEUG_RUN_MAIN == "true")
+            if enabled and (not app.debug or werkzeug_run_main == "true"):
+                start_scheduler(app)
             else:
                 logger.debug(
-                    "Scheduler not started in this process (debug reloader parent or already running)."
+                    "Scheduler not started in this process (disabled or debug reloader parent)."
                 )
 
         except Exception as e:
-            logger.error(f"Failed to start scheduler: {e}")
+            logger.error("Failed to start scheduler: %s", e)
 
     return app
 
 
+def start_scheduler(app):
+    """Create and start the background scheduler with the stale issues job (once per process)"""
+    global scheduler
+    if scheduler is not None and scheduler.running:
+        return
+
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+    from handlers.stale import check_stale_issues, poll_due_issues
+
+    scheduler = BackgroundScheduler()
+    if os.getenv("STALE_MODE", "scan").lower() == "incremental":
+        # Only issues whose deadline passed are read, so polling often is cheap
+        scheduler.add_job(
+            func=poll_due_issues,
+            args=[app],
+            trigger=IntervalTrigger(seconds=int(os.getenv("STALE_POLL_SECONDS", "60"))),
+            id="stale_issues_job",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+    else:
+        scheduler.add_job(
+            func=check_stale_issues,
+            args=[app],
+            trigger=CronTrigger(hour=9),  # Run daily at 9 AM
+            id="stale_issues_job",
+            replace_existing=True,
+        )
+    scheduler.start()
+    logger.info("Scheduler started and stale issues job scheduled.")
+
+
 if __name__ == "__main__":
     app = create_app()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,258 @@
+import os
+import ssl
+import json
+import time
+import atexit
+import asyncio
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from github_client import github_client, _endpoint
+from metrics import metrics, GITHUB_REQUEST_ERRORS, GITHUB_REQUEST_SECONDS
+from tracing import tracer
+
+# aiohttp is imported when the loop sends its first request, like PyGithub
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "issue-triage-bot"
+
+_SSL_CONTEXT: Optional[ssl.SSLContext] = None
+
+
+def _ssl_context() -> ssl.SSLContext:
+    global _SSL_CONTEXT
+    if _SSL_CONTEXT is None:
+        # The same CA bundle overrides requests (and so PyGithub) honours
+        bundle = os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("CURL_CA_BUNDLE")
+        if bundle and os.path.isdir(bundle):
+            _SSL_CONTEXT = ssl.create_default_context(capath=bundle)
+        else:
+            _SSL_CONTEXT = ssl.create_default_context(cafile=bundle or None)
+    return _SSL_CONTEXT
+
+
+class AsyncIssue:
+    """Awaitable counterparts of the PyGithub Issue writes used by IssueBatch"""
+
+    def __init__(self, client: "AsyncGitHubClient", repo_full_name: str, issue_number: int):
+        self.client = client
+        self.repo_full_name = repo_full_name
+        self.path = f"/repos/{repo_full_name}/issues/{issue_number}"
+
+    async def edit(self, **fields):
+        return await self.client.request(self.repo_full_name, "PATCH", self.path, fields)
+
+    async def create_comment(self, body: str):
+        return await self.client.request(self.repo_full_name, "POST", f"{self.path}/comments", {"body": body})
+
+    async def add_to_labels(self, *labels: str):
+        return await self.client.request(self.repo_full_name, "POST", f"{self.path}/labels", {"labels": list(labels)})
+
+    async def add_to_assignees(self, *assignees: str):
+        return await self.client.request(
+            self.repo_full_name, "POST", f"{self.path}/assignees", {"assignees": list(assignees)}
+        )
+
+
+class AsyncGitHubClient:
+    """GitHub REST writes on one shared event loop, over a pooled aiohttp session
+
+    Handlers hand coroutines to run() from any thread; they all run on a
+    single long-lived loop thread, so the requests of many webhooks (and
+    the independent writes of one issue) are in flight together without a
+    thread or an event loop per request. Requests go through the same
+    rate limit schedulers, credentials, cache invalidation and metrics as
+    the PyGithub client. GITHUB_ASYNC_POOL_SIZE caps open connections;
+    idle ones are kept for GITHUB_ASYNC_KEEPALIVE seconds.
+
+    aiohttp follows redirects (renamed or transferred repositories), decodes
+    gzip and honours HTTPS_PROXY/HTTP_PROXY/NO_PROXY. Transport errors are
+    not retried here, since GitHub may have acted on a request whose
+    connection broke; the scheduler retries rate limits and 5xx replies.
+    """
+
+    def __init__(self):
+        self.pool_size = max(1, int(os.getenv("GITHUB_ASYNC_POOL_SIZE", "20")))
+        self.keepalive = float(os.getenv("GITHUB_ASYNC_KEEPALIVE", "30"))
+        self.timeout = float(os.getenv("GITHUB_ASYNC_TIMEOUT", "15"))
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        # Created on the loop thread by its first request
+        self._http: Optional["aiohttp.ClientSession"] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        # A forked worker inherits neither the loop thread nor its sockets
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def run(self, coro):
+        """Run coro on the shared loop and wait for its result (from any other thread)
+
+        Context variables (log correlation, request priority, the trace)
+        are carried over to the coroutine.
+        """
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("run() called from the event loop thread; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def issue(self, repo_full_name: str, issue_number: int) -> AsyncIssue:
+        return AsyncIssue(self, repo_full_name, issue_number)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": self.in_flight}
+
+    async def request(
+        self, repo_full_name: str, verb: str, path: str, input: Optional[Any] = None
+    ) -> Tuple[Dict[str, str], Any]:
+        """Send one scheduled request on behalf of repo_full_name; returns (headers, data)
+
+        Raises GithubException for error responses, like PyGithub.
+        """
+        from github import GithubException
+
+        url = github_client.base_url + path
+        scheduler, installation_id = await self._route(repo_full_name)
+        # Writes drop cached reads of the resource, as in the PyGithub path
+        github_client.cache.invalidate(url)
+
+        self.in_flight += 1
+        try:
+            try:
+                return await scheduler.execute_async(lambda: self._send(verb, url, input, installation_id), verb)
+            except GithubException as e:
+                if e.status != 401 or installation_id is None:
+                    raise
+                # Revoked early, or our clock is off; the next token() call mints a new one
+                from github_app import github_app
+
+                github_app.invalidate(installation_id)
+                return await scheduler.execute_async(lambda: self._send(verb, url, input, installation_id), verb)
+        finally:
+            self.in_flight -= 1
+
+    async def _route(self, repo_full_name: str):
+        """Scheduler and installation id (None for the static token) for a repository"""
+        if not github_client.app_id:
+            return github_client.scheduler, None
+
+        from github_app import github_app
+
+        # Lookups and new pool entries may block, so they leave the loop thread
+        installation_id = github_app.cached_installation(repo_full_name)
+        if installation_id is None:
+            installation_id = await asyncio.to_thread(github_app.installation_for, repo_full_name)
+        scheduler = github_client.installation_scheduler(installation_id, create=False)
+        if scheduler is None:
+            scheduler = await asyncio.to_thread(github_client.installation_scheduler, installation_id)
+        return scheduler, installation_id
+
+    async def _authorization(self, installation_id: Optional[int]) -> str:
+        if installation_id is None:
+            if not github_client.token:
+                raise ValueError("GitHub client not initialized - missing token")
+            return f"token {github_client.token}"
+
+        from github_app import github_app
+
+        token = github_app.cached_token(installation_id)
+        if token is None:
+            token = await asyncio.to_thread(github_app.token, installation_id)
+        return f"token {token}"
+
+    async def _send(
+        self, verb: str, url: str, input: Optional[Any], installation_id: Optional[int]
+    ) -> Tuple[Dict[str, str], Any]:
+        from github import GithubException
+
+        headers = {"Authorization": await self._authorization(installation_id)}
+        endpoint = _endpoint(url)
+        start = time.perf_counter()
+        try:
+            with tracer.span(f"github {verb} {endpoint}"):
+                async with self._session().request(verb, url, json=input, headers=headers) as response:
+                    status = response.status
+                    response_headers = {name.lower(): value for name, value in response.headers.items()}
+                    raw = await response.read()
+        except Exception:
+            GITHUB_REQUEST_ERRORS.inc(method=verb, endpoint=endpoint, status="exception")
+            raise
+        finally:
+            GITHUB_REQUEST_SECONDS.observe(time.perf_counter() - start, method=verb, endpoint=endpoint)
+
+        try:
+            data = json.loads(raw) if raw else None
+        except ValueError:
+            data = {"data": raw.decode("utf-8", "replace")}
+        if status >= 400:
+            GITHUB_REQUEST_ERRORS.inc(method=verb, endpoint=endpoint, status=status)
+            raise GithubException(status, data, response_headers)
+        return response_headers, data
+
+    def _session(self) -> "aiohttp.ClientSession":
+        # Created on the loop thread, which the session is bound to
+        if self._http is None:
+            import aiohttp
+
+            self._http = aiohttp.ClientSession(
+                headers={"Accept": "application/vnd.github+json", "User-Agent": USER_AGENT},
+                connector=aiohttp.TCPConnector(
+                    limit=self.pool_size, keepalive_timeout=self.keepalive, ssl=_ssl_context()
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trust_env=True,
+            )
+        return self._http
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=loop.run_forever, name="github-async", daemon=True
+                )
+                self._thread.start()
+                self._loop = loop
+                atexit.register(self.stop)
+        return self._loop
+
+    def stop(self):
+        """Close pooled connections and stop the loop thread"""
+        loop, self._loop = self._loop, None
+        if loop is None or not loop.is_running():
+            return
+
+        async def close_client():
+            http, self._http = self._http, None
+            if http is not None:
+                await http.close()
+
+        try:
+            asyncio.run_coroutine_threadsafe(close_client(), loop).result(timeout=5)
+        except Exception as e:
+            logger.warning("Failed to close GitHub connections: %s", e)
+        loop.call_soon_threadsafe(loop.stop)
+
+    def _after_fork(self):
+        self._loop = None
+        self._thread = None
+        self._http = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+
+# Global instance
+async_github = AsyncGitHubClient()
+
+metrics.gauge(
+    "triage_github_async_in_flight",
+    "GitHub requests currently in flight on the shared event loop",
+    lambda: async_github.in_flight if async_github._loop is not None else None,
+)
@@ -0,0 +1,731 @@
+"""Local stand-in for the GitHub REST API, for load and soak testing
+
+Serves the endpoints the bot uses from memory: repositories, issues
+(get, create, edit, list with Link pagination), issue labels, assignees,
+comments, /rate_limit and the GraphQL issue-state query. Every response
+carries X-RateLimit-* headers from a simulated budget, GETs get an ETag
+and answer If-None-Match with 304, and latency and errors can be injected.
+Issues are created on first access, so any webhook corpus can be replayed
+without seeding.
+
+It also stands in for GitHub App authentication: any JWT is exchanged for
+an installation token (valid for token_ttl seconds) and each repository
+owner maps to one installation. Like GitHub, each installation gets its
+own rate limit budget; any other token shares a single one.
+
+    python benchmarks/fake_github.py --port 8765 --latency-ms 20 --error-rate 0.01
+    GITHUB_API_URL=http://127.0.0.1:8765 GITHUB_TOKEN=fake python main.py
+
+Control endpoints (not rate limited):
+
+    GET  /_fake/stats    request counters and store size
+    POST /_fake/config   JSON object with any of the CONFIG_KEYS below
+    POST /_fake/reset    drop all issues and counters
+"""
+import re
+import sys
+import json
+import base64
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit
+
+logger = logging.getLogger(__name__)
+
+CONFIG_KEYS = (
+    "latency_ms",
+    "jitter_ms",
+    "error_rate",
+    "secondary_limit_rate",
+    "retry_after",
+    "rate_limit",
+    "rate_window",
+    "auto_create",
+    "issues_per_repo",
+    "token_ttl",
+)
+
+# Endpoints authenticated with the app JWT; not rate limited
+APP_ACTIONS = ("create_installation_token", "get_repo_installation")
+
+SECONDARY_LIMIT_MESSAGE = (
+    "You have exceeded a secondary rate limit. Please wait a few minutes before you try again."
+)
+
+GRAPHQL_ISSUE_RE = re.compile(r"(\w+)\s*:\s*issue\(\s*number\s*:\s*(\d+)\s*\)")
+
+REPO = r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)"
+ISSUE = REPO + r"/issues/(?P<number>\d+)"
+
+# (method, path pattern, FakeGitHub method)
+ROUTES = [
+    ("GET", r"/rate_limit", "rate_limit_status"),
+    ("POST", r"/graphql", "graphql"),
+    ("POST", r"/app/installations/(?P<installation>\d+)/access_tokens", "create_installation_token"),
+    ("GET", REPO + r"/installation", "get_repo_installation"),
+    ("GET", REPO, "get_repo"),
+    ("GET", REPO + r"/labels", "list_repo_labels"),
+    ("GET", REPO + r"/issues", "list_issues"),
+    ("POST", REPO + r"/issues", "create_issue"),
+    ("GET", ISSUE, "get_issue"),
+    ("PATCH", ISSUE, "edit_issue"),
+    ("GET", ISSUE + r"/labels", "get_labels"),
+    ("POST", ISSUE + r"/labels", "add_labels"),
+    ("PUT", ISSUE + r"/labels", "set_labels"),
+    ("DELETE", ISSUE + r"/labels/(?P<label>[^/]+)", "remove_label"),
+    ("POST", ISSUE + r"/assignees", "add_assignees"),
+    ("DELETE", ISSUE + r"/assignees", "remove_assignees"),
+    ("GET", ISSUE + r"/comments", "list_comments"),
+    ("POST", ISSUE + r"/comments", "create_comment"),
+]
+ROUTES = [(method, re.compile(pattern + r"/?$"), action) for method, pattern, action in ROUTES]
+
+
+class FakeResponse(Exception):
+    """Raised by an endpoint to answer with an error status"""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.body = {"message": message, "documentation_url": "https://docs.github.com/rest"}
+        self.headers = headers or {}
+
+
+def _timestamp(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _user(base: str, login: str) -> Dict[str, Any]:
+    return {
+        "login": login,
+        "id": int(hashlib.sha1(login.encode()).hexdigest()[:8], 16),
+        "type": "User",
+        "url": f"{base}/users/{login}",
+        "html_url": f"https://github.com/{login}",
+    }
+
+
+class FakeGitHub:
+    """In-memory GitHub state shared by all request threads"""
+
+    def __init__(self, **config):
+        self.latency_ms = 0.0
+        self.jitter_ms = 0.0
+        self.error_rate = 0.0
+        self.secondary_limit_rate = 0.0
+        self.retry_after = 1
+        self.rate_limit = 5000
+        self.rate_window = 3600
+        self.auto_create = True
+        self.issues_per_repo = 0
+        self.token_ttl = 3600
+        self.configure(**config)
+
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self.reset()
+
+    def configure(self, **config):
+        """Change settings at runtime; unknown keys raise ValueError"""
+        for key, value in config.items():
+            if key not in CONFIG_KEYS:
+                raise ValueError(f"Unknown fake GitHub setting: {key}")
+            current = getattr(self, key)
+            if isinstance(current, bool) and isinstance(value, str):
+                value = value.lower() == "true"
+            setattr(self, key, type(current)(value))
+        if "rate_window" in config and hasattr(self, "_budgets"):
+            # A shorter window takes effect now rather than after the current one
+            for budget in self._budgets.values():
+                budget[1] = min(budget[1], time.time() + self.rate_window)
+
+    def reset(self):
+        with self._lock:
+            self.repos: Dict[str, Dict[int, Dict[str, Any]]] = {}
+            self.comments: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+            self.counters = Counter()
+            self._next_id = 1
+            # Budget key ("installation:<id>" or "token") -> [used, reset time]
+            self._budgets: Dict[str, List[float]] = {}
+            # Installation token -> (installation id, expires at)
+            self.app_tokens: Dict[str, Tuple[int, float]] = {}
+            self.installations: Dict[str, int] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(sorted(self.counters.items())),
+                "repos": len(self.repos),
+                "issues": sum(len(issues) for issues in self.repos.values()),
+                "comments": sum(len(comments) for comments in self.comments.values()),
+                "rate_used": int(sum(used for used, _ in self._budgets.values())),
+                "rate_used_by_client": {key: int(used) for key, (used, _) in sorted(self._budgets.items())},
+                "installations": len(self.installations),
+                "app_tokens": len(self.app_tokens),
+            }
+
+    # -- request pipeline ---------------------------------------------------
+
+    def handle(
+        self, method: str, path: str, query: Dict[str, str], body: Any, base: str, credential: str = ""
+    ) -> Tuple[int, Any, Dict[str, str]]:
+        """Route one request; returns (status, json body, extra headers)"""
+        for route_method, pattern, action in ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                break
+        else:
+            raise FakeResponse(404, "Not Found")
+
+        with self._lock:
+            self.counters[f"{method} {action}"] += 1
+            if action in APP_ACTIONS:
+                self._check_jwt(credential)
+                return getattr(self, action)(base=base, query=query, body=body, **match.groupdict())
+
+            client = self._authenticate(credential)
+            fault = self._inject_fault()
+            if fault:
+                raise fault
+            if action == "rate_limit_status":
+                return self.rate_limit_status(base=base, query=query, body=body, client=client)
+            self._charge(client)
+            return getattr(self, action)(base=base, query=query, body=body, **match.groupdict())
+
+    def client_key(self, credential: str) -> str:
+        """Rate limit budget a credential draws from"""
+        _, _, token = credential.partition(" ")
+        with self._lock:
+            installation = self.app_tokens.get(token)
+        return f"installation:{installation[0]}" if installation else "token"
+
+    def delay(self):
+        delay = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    def rate_headers(self, action: str = "", client: str = "token") -> Dict[str, str]:
+        with self._lock:
+            used, reset = self._budget(client)
+            return {
+                "X-RateLimit-Limit": str(self.rate_limit),
+                "X-RateLimit-Remaining": str(max(self.rate_limit - int(used), 0)),
+                "X-RateLimit-Reset": str(int(reset)),
+                "X-RateLimit-Used": str(int(used)),
+                "X-RateLimit-Resource": "graphql" if action == "graphql" else "core",
+            }
+
+    def refund(self, client: str = "token"):
+        """Give back the budget of a request answered with 304, as GitHub does"""
+        with self._lock:
+            budget = self._budget(client)
+            budget[0] = max(budget[0] - 1, 0)
+            self.counters["not_modified"] += 1
+
+    def _budget(self, client: str) -> List[float]:
+        """[used, reset] of a client's current window (caller holds the lock)"""
+        now = time.time()
+        budget = self._budgets.setdefault(client, [0, now + self.rate_window])
+        if now >= budget[1]:
+            budget[0], budget[1] = 0, now + self.rate_window
+        return budget
+
+    def _charge(self, client: str):
+        budget = self._budget(client)
+        if budget[0] >= self.rate_limit:
+            self.counters["rate_limited"] += 1
+            raise FakeResponse(403, f"API rate limit exceeded for {client}.")
+        budget[0] += 1
+
+    def _authenticate(self, credential: str) -> str:
+        """Budget key of a request; expired or unknown installation tokens get 401"""
+        _, _, token = credential.partition(" ")
+        if not token.startswith("ghs_"):
+            return "token"
+        installation = self.app_tokens.get(token)
+        if installation is None or installation[1] <= time.time():
+            self.counters["bad_credentials"] += 1
+            raise FakeResponse(401, "Bad credentials")
+        return f"installation:{installation[0]}"
+
+    def _check_jwt(self, credential: str):
+        scheme, _, token = credential.partition(" ")
+        try:
+            claims = json.loads(base64.urlsafe_b64decode(token.split(".")[1] + "=="))
+        except (IndexError, ValueError):
+            claims = {}
+        if scheme != "Bearer" or "iss" not in claims:
+            raise FakeResponse(401, "A JSON web token could not be decoded")
+
+    def _inject_fault(self) -> Optional[FakeResponse]:
+        roll = self._rng.random()
+        if roll < self.error_rate:
+            self.counters["injected_5xx"] += 1
+            return FakeResponse(self._rng.choice([500, 502, 503]), "Server Error")
+        if roll < self.error_rate + self.secondary_limit_rate:
+            self.counters["injected_secondary_limit"] += 1
+            return FakeResponse(
+                403, SECONDARY_LIMIT_MESSAGE, {"Retry-After": str(self.retry_after)}
+            )
+        return None
+
+    # -- store --------------------------------------------------------------
+
+    def _repo(self, owner: str, name: str) -> Dict[int, Dict[str, Any]]:
+        full_name = f"{owner}/{name}"
+        issues = self.repos.get(full_name)
+        if issues is None:
+            if not self.auto_create:
+                raise FakeResponse(404, "Not Found")
+            issues = self.repos[full_name] = {}
+            now = datetime.now(timezone.utc)
+            for number in range(1, self.issues_per_repo + 1):
+                # Spread seeded issues over the last 90 days, oldest first
+                age = timedelta(days=90 * (self.issues_per_repo - number) / self.issues_per_repo)
+                self._new_issue(full_name, number, now - age)
+        return issues
+
+    def _issue(self, owner: str, name: str, number: str) -> Dict[str, Any]:
+        issues = self._repo(owner, name)
+        issue = issues.get(int(number))
+        if issue is None:
+            if not self.auto_create:
+                raise FakeResponse(404, "Not Found")
+            issue = self._new_issue(f"{owner}/{name}", int(number), datetime.now(timezone.utc))
+        return issue
+
+    def _new_issue(self, full_name: str, number: int, created: datetime, **fields) -> Dict[str, Any]:
+        issue = {
+            "id": self._next_id,
+            "repo": full_name,
+            "number": number,
+            "title": fields.get("title", f"Issue {number}"),
+            "body": fields.get("body", ""),
+            "state": "open",
+            "labels": list(dict.fromkeys(fields.get("labels", []))),
+            "assignees": list(dict.fromkeys(fields.get("assignees", []))),
+            "user": "octocat",
+            "created_at": created,
+            "updated_at": created,
+            "closed_at": None,
+        }
+        self._next_id += 1
+        self.repos[full_name][number] = issue
+        return issue
+
+    def _touch(self, issue: Dict[str, Any]):
+        issue["updated_at"] = datetime.now(timezone.utc)
+
+    def _render_issue(self, base: str, issue: Dict[str, Any]) -> Dict[str, Any]:
+        repo_url = f"{base}/repos/{issue['repo']}"
+        url = f"{repo_url}/issues/{issue['number']}"
+        assignees = [_user(base, login) for login in issue["assignees"]]
+        return {
+            "id": issue["id"],
+            "node_id": f"I_{issue['id']}",
+            "url": url,
+            "repository_url": repo_url,
+            "labels_url": f"{url}/labels{{/name}}",
+            "comments_url": f"{url}/comments",
+            "html_url": f"https://github.com/{issue['repo']}/issues/{issue['number']}",
+            "number": issue["number"],
+            "title": issue["title"],
+            "body": issue["body"],
+            "state": issue["state"],
+            "locked": False,
+            "labels": [self._render_label(base, issue["repo"], label) for label in issue["labels"]],
+            "assignee": assignees[0] if assignees else None,
+            "assignees": assignees,
+            "user": _user(base, issue["user"]),
+            "comments": len(self.comments.get((issue["repo"], issue["number"]), [])),
+            "created_at": _timestamp(issue["created_at"]),
+            "updated_at": _timestamp(issue["updated_at"]),
+            "closed_at": _timestamp(issue["closed_at"]) if issue["closed_at"] else None,
+        }
+
+    def _render_label(self, base: str, full_name: str, name: str) -> Dict[str, Any]:
+        return {
+            "id": int(hashlib.sha1(name.encode()).hexdigest()[:8], 16),
+            "name": name,
+            "color": "ededed",
+            "default": False,
+            "url": f"{base}/repos/{full_name}/labels/{quote(name)}",
+        }
+
+    def _paginate(self, base: str, path: str, query: Dict[str, str], items: list):
+        per_page = min(max(int(query.get("per_page", 30)), 1), 100)
+        page = max(int(query.get("page", 1)), 1)
+        last = max((len(items) + per_page - 1) // per_page, 1)
+
+        def link(number: int, rel: str) -> str:
+            params = urlencode({**query, "page": number})
+            return f'<{base}{path}?{params}>; rel="{rel}"'
+
+        links = []
+        if page < last:
+            links += [link(page + 1, "next"), link(last, "last")]
+        if page > 1:
+            links += [link(1, "first"), link(page - 1, "prev")]
+        headers = {"Link": ", ".join(links)} if links else {}
+        return 200, items[(page - 1) * per_page : page * per_page], headers
+
+    # -- endpoints ----------------------------------------------------------
+
+    def rate_limit_status(self, base, query, body, client):
+        used, reset = self._budget(client)
+        core = {
+            "limit": self.rate_limit,
+            "remaining": max(self.rate_limit - int(used), 0),
+            "reset": int(reset),
+            "used": int(used),
+        }
+        return 200, {"resources": {"core": core, "graphql": core}, "rate": core}, {}
+
+    def create_installation_token(self, base, query, body, installation):
+        if int(installation) not in self.installations.values():
+            raise FakeResponse(404, "Not Found")
+        token = f"ghs_fake{installation}x{len(self.app_tokens) + 1}"
+        expires_at = time.time() + self.token_ttl
+        self.app_tokens[token] = (int(installation), expires_at)
+        return 201, {
+            "token": token,
+            "expires_at": _timestamp(datetime.fromtimestamp(expires_at, timezone.utc)),
+            "permissions": {"issues": "write", "metadata": "read"},
+            "repository_selection": "all",
+        }, {}
+
+    def get_repo_installation(self, base, query, body, owner, name):
+        installation = self.installations.get(owner.lower())
+        if installation is None:
+            if not self.auto_create:
+                raise FakeResponse(404, "Not Found")
+            installation = self.installations[owner.lower()] = len(self.installations) + 1
+        return 200, {
+            "id": installation,
+            "app_id": 1,
+            "account": _user(base, owner),
+            "repository_selection": "all",
+        }, {}
+
+    def get_repo(self, base, query, body, owner, name):
+        self._repo(owner, name)
+        full_name = f"{owner}/{name}"
+        return 200, {
+            "id": int(hashlib.sha1(full_name.encode()).hexdigest()[:8], 16),
+            "name": name,
+            "full_name": full_name,
+            "owner": _user(base, owner),
+            "private": False,
+            "default_branch": "main",
+            "url": f"{base}/repos/{full_name}",
+            "html_url": f"https://github.com/{full_name}",
+        }, {}
+
+    def list_repo_labels(self, base, query, body, owner, name):
+        issues = self._repo(owner, name)
+        names = sorted({label for issue in issues.values() for label in issue["labels"]})
+        labels = [self._render_label(base, f"{owner}/{name}", label) for label in names]
+        return self._paginate(base, f"/repos/{owner}/{name}/labels", query, labels)
+
+    def list_issues(self, base, query, body, owner, name):
+        issues = list(self._repo(owner, name).values())
+        state = query.get("state", "open")
+        if state != "all":
+            issues = [issue for issue in issues if issue["state"] == state]
+        if query.get("labels"):
+            wanted = set(query["labels"].split(","))
+            issues = [issue for issue in issues if wanted <= set(issue["labels"])]
+        sort_key = "updated_at" if query.get("sort") == "updated" else "created_at"
+        issues.sort(key=lambda issue: issue[sort_key], reverse=query.get("direction", "desc") == "desc")
+        rendered = [self._render_issue(base, issue) for issue in issues]
+        return self._paginate(base, f"/repos/{owner}/{name}/issues", query, rendered)
+
+    def create_issue(self, base, query, body, owner, name):
+        issues = self._repo(owner, name)
+        number = max(issues, default=0) + 1
+        issue = self._new_issue(
+            f"{owner}/{name}",
+            number,
+            datetime.now(timezone.utc),
+            title=body.get("title", ""),
+            body=body.get("body") or "",
+            labels=body.get("labels", []),
+            assignees=body.get("assignees", []),
+        )
+        return 201, self._render_issue(base, issue), {}
+
+    def get_issue(self, base, query, body, owner, name, number):
+        return 200, self._render_issue(base, self._issue(owner, name, number)), {}
+
+    def edit_issue(self, base, query, body, owner, name, number):
+        issue = self._issue(owner, name, number)
+        for field in ("title", "body"):
+            if field in body:
+                issue[field] = body[field] or ""
+        if "labels" in body:
+            issue["labels"] = list(dict.fromkeys(body["labels"]))
+        if "assignees" in body:
+            issue["assignees"] = list(dict.fromkeys(body["assignees"]))
+        if body.get("state") in ("open", "closed") and body["state"] != issue["state"]:
+            issue["state"] = body["state"]
+            issue["closed_at"] = datetime.now(timezone.utc) if body["state"] == "closed" else None
+        self._touch(issue)
+        return 200, self._render_issue(base, issue), {}
+
+    def get_labels(self, base, query, body, owner, name, number):
+        issue = self._issue(owner, name, number)
+        labels = [self._render_label(base, issue["repo"], label) for label in issue["labels"]]
+        return 200, labels, {}
+
+    def add_labels(self, base, query, body, owner, name, number):
+        issue = self._issue(owner, name, number)
+        names = body.get("labels", []) if isinstance(body, dict) else body
+        issue["labels"] = list(dict.fromkeys(issue["labels"] + list(names)))
+        self._touch(issue)
+        return self.get_labels(base, query, body, owner, name, number)
+
+    def set_labels(self, base, query, body, owner, name, number):
+        issue = self._issue(owner, name, number)
+        names = body.get("labels", []) if isinstance(body, dict) else body
+        issue["labels"] = list(dict.fromkeys(names))
+        self._touch(issue)
+        return self.get_labels(base, query, body, owner, name, number)
+
+    def remove_label(self, base, query, body, owner, name, number, label):
+        issue = self._issue(owner, name, number)
+        label = unquote(label)
+        if label not in issue["labels"]:
+            raise FakeResponse(404, "Label does not exist")
+        issue["labels"].remove(label)
+        self._touch(issue)
+        return self.get_labels(base, query, body, owner, name, number)
+
+    def add_assignees(self, base, query, body, owner, name, number):
+        issue = self._issue(owner, name, number)
+        issue["assignees"] = list(dict.fromkeys(issue["assignees"] + body.get("assignees", [])))
+        self._touch(issue)
+        return 201, self._render_issue(base, issue), {}
+
+    def remove_assignees(self, base, query, body, owner, name, number):
+        issue = self._issue(owner, name, number)
+        removed = set(body.get("assignees", []))
+        issue["assignees"] = [login for login in issue["assignees"] if login not in removed]
+        self._touch(issue)
+        return 200, self._render_issue(base, issue), {}
+
+    def list_comments(self, base, query, body, owner, name, number):
+        issue = self._issue(owner, name, number)
+        comments = self.comments.get((issue["repo"], issue["number"]), [])
+        path = f"/repos/{owner}/{name}/issues/{number}/comments"
+        return self._paginate(base, path, query, [dict(comment) for comment in comments])
+
+    def create_comment(self, base, query, body, owner, name, number):
+        issue = self._issue(owner, name, number)
+        now = _timestamp(datetime.now(timezone.utc))
+        comment = {
+            "id": self._next_id,
+            "url": f"{base}/repos/{issue['repo']}/issues/comments/{self._next_id}",
+            "html_url": f"https://github.com/{issue['repo']}/issues/{issue['number']}#issuecomment-{self._next_id}",
+            "issue_url": f"{base}/repos/{issue['repo']}/issues/{issue['number']}",
+            "body": body.get("body", ""),
+            "user": _user(base, "triage-bot"),
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._next_id += 1
+        self.comments.setdefault((issue["repo"], issue["number"]), []).append(comment)
+        self._touch(issue)
+        return 201, comment, {}
+
+    def graphql(self, base, query, body):
+        """Answer the aliased issue(number:) lookups sent by get_issue_states"""
+        variables = body.get("variables") or {}
+        try:
+            issues = self._repo(variables["owner"], variables["name"])
+        except (KeyError, FakeResponse):
+            return 200, {"data": {"repository": None}, "errors": [{"type": "NOT_FOUND"}]}, {}
+
+        repository = {}
+        for alias, number in GRAPHQL_ISSUE_RE.findall(body.get("query", "")):
+            issue = issues.get(int(number))
+            if issue is None and self.auto_create:
+                issue = self._issue(variables["owner"], variables["name"], number)
+            repository[alias] = (
+                {
+                    "state": issue["state"].upper(),
+                    "labels": {"nodes": [{"name": label} for label in issue["labels"]]},
+                }
+                if issue
+                else None
+            )
+        return 200, {"data": {"repository": repository}}, {}
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeGitHub/1.0"
+    # Headers and body are separate writes; without this, Nagle plus delayed
+    # ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _dispatch(self, method: str):
+        github: FakeGitHub = self.server.github
+        url = urlsplit(self.path)
+        query = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+
+        if url.path.startswith("/_fake/"):
+            self._control(method, url.path, raw)
+            return
+
+        base = f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]}"
+        github.delay()
+        action = "graphql" if url.path.rstrip("/") == "/graphql" else ""
+        credential = self.headers.get("Authorization", "")
+        try:
+            body = json.loads(raw) if raw else {}
+            status, data, headers = github.handle(method, url.path, query, body, base, credential)
+        except FakeResponse as e:
+            status, data, headers = e.status, e.body, e.headers
+        except (ValueError, TypeError, KeyError) as e:
+            status, data, headers = 400, {"message": f"Problems parsing JSON: {e}"}, {}
+
+        client = github.client_key(credential)
+        headers = {**github.rate_headers(action, client), **headers}
+        payload = json.dumps(data).encode()
+        if method == "GET" and status == 200:
+            etag = f'W/"{hashlib.sha1(payload).hexdigest()}"'
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                github.refund(client)
+                headers.update(github.rate_headers(action, client))
+                self._send(304, b"", headers)
+                return
+        self._send(status, payload, headers)
+
+    def _control(self, method: str, path: str, raw: bytes):
+        github: FakeGitHub = self.server.github
+        try:
+            if method == "GET" and path == "/_fake/stats":
+                data = github.stats()
+            elif method == "POST" and path == "/_fake/config":
+                github.configure(**(json.loads(raw) if raw else {}))
+                data = {key: getattr(github, key) for key in CONFIG_KEYS}
+            elif method == "POST" and path == "/_fake/reset":
+                github.reset()
+                data = {"status": "reset"}
+            else:
+                self._send(404, b'{"message": "Not Found"}', {})
+                return
+        except ValueError as e:
+            self._send(400, json.dumps({"message": str(e)}).encode(), {})
+            return
+        self._send(200, json.dumps(data).encode(), {})
+
+    def _send(self, status: int, payload: bytes, headers: Dict[str, str]):
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+
+class FakeGitHubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: Tuple[str, int], github: Optional[FakeGitHub] = None):
+        super().__init__(address, FakeGitHubHandler)
+        self.github = github or FakeGitHub()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_github(host: str = "127.0.0.1", port: int = 0, **config) -> FakeGitHubServer:
+    """Serve a FakeGitHub from a daemon thread; port 0 picks a free port"""
+    server = FakeGitHubServer((host, port), FakeGitHub(**config))
+    thread = threading.Thread(target=server.serve_forever, name="fake-github", daemon=True)
+    thread.start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra latency up to this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 5xx")
+    parser.add_argument(
+        "--secondary-limit-rate", type=float, default=0.0,
+        help="fraction of requests answered with a secondary rate limit 403",
+    )
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After sent with secondary limits")
+    parser.add_argument("--rate-limit", type=int, default=5000, help="requests per window")
+    parser.add_argument("--rate-window", type=int, default=3600, help="rate limit window in seconds")
+    parser.add_argument("--issues-per-repo", type=int, default=0, help="open issues seeded into each new repo")
+    parser.add_argument("--token-ttl", type=int, default=3600, help="lifetime of installation tokens in seconds")
+    parser.add_argument("--no-auto-create", action="store_true", help="404 for repos/issues never created")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(message)s")
+    github = FakeGitHub(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        secondary_limit_rate=args.secondary_limit_rate,
+        retry_after=args.retry_after,
+        rate_limit=args.rate_limit,
+        rate_window=args.rate_window,
+        issues_per_repo=args.issues_per_repo,
+        token_ttl=args.token_ttl,
+        auto_create=not args.no_auto_create,
+    )
+    server = FakeGitHubServer((args.host, args.port), github)
+    logger.info("Fake GitHub API listening on %s", server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""Compare the weighted label scorer with the keyword matcher
+
+Times LabelMatcher.match per issue against LabelScorer one issue at a time
+and in batches, on a synthetic corpus or a JSONL export of issues (one
+REST issue object per line). When NumPy is installed the scorer is also
+timed with its pure Python fallback. Alongside throughput it reports how
+often each engine applies each label and how far their label sets agree,
+which is what to look at when tuning weights and thresholds.
+
+    python benchmarks/label_scoring.py --synthetic 20000
+    python benchmarks/label_scoring.py --input issues.jsonl --rules weighted.json --top-k 3
+    python benchmarks/label_scoring.py --synthetic 20000 --output scoring.json
+    python benchmarks/label_scoring.py --synthetic 20000 --baseline scoring.json --max-regression 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import label_scoring  # noqa: E402
+from label_scoring import LabelScorer  # noqa: E402
+from rules_manager import LabelMatcher  # noqa: E402
+
+
+def synthetic_texts(count: int, seed: int = 1) -> List[str]:
+    """Issue titles and bodies: mostly filler prose with some rule keywords"""
+    rng = random.Random(seed)
+    keywords = (
+        "error crash fails broken issue feature request docs readme guide how why what question "
+        "slow performance security exploit duplicate already invalid"
+    ).split()
+    filler = (
+        "the a this when after we it page button user api login settings save open update "
+        "version app server returns shows click again expected instead every time from"
+    ).split()
+    phrases = ["how do i", "steps to reproduce", "stack trace", "is there a way", "same as"]
+
+    texts = []
+    for _ in range(count):
+        words = [rng.choice(filler) for _ in range(rng.randint(5, 150))]
+        for _ in range(rng.randint(0, 6)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(phrases))
+        title = " ".join(rng.choice(filler + keywords) for _ in range(rng.randint(3, 8)))
+        texts.append(f"{title} {' '.join(words)}")
+    return texts
+
+
+def load_texts(path: str) -> List[str]:
+    texts = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                issue = json.loads(line)
+                texts.append(f"{issue.get('title') or ''} {issue.get('body') or ''}")
+    return texts
+
+
+def timed(fn: Callable[[], List[List[str]]], repeat: int) -> Dict:
+    """Best of repeat runs, so one-off stalls do not skew the comparison"""
+    best, labels = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        labels = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"seconds": best, "labels": labels}
+
+
+def summarize(run: Dict, count: int) -> Dict:
+    fired = Counter(label for labels in run["labels"] for label in labels)
+    return {
+        "issues_per_second": round(count / run["seconds"], 1) if run["seconds"] else None,
+        "us_per_issue": round(run["seconds"] / count * 1e6, 2),
+        "labels_per_issue": round(sum(map(len, run["labels"])) / count, 3),
+        "label_rate": {label: round(hits / count, 4) for label, hits in fired.most_common()},
+    }
+
+
+def agreement(left: List[List[str]], right: List[List[str]]) -> Dict:
+    same = sum(1 for a, b in zip(left, right) if set(a) == set(b))
+    jaccard = [len(set(a) & set(b)) / len(set(a) | set(b)) if a or b else 1.0 for a, b in zip(left, right)]
+    return {"identical": round(same / len(left), 4), "mean_jaccard": round(sum(jaccard) / len(jaccard), 4)}
+
+
+def run(args) -> Dict:
+    texts = load_texts(args.input) if args.input else synthetic_texts(args.synthetic, args.seed)
+    with open(args.rules) as f:
+        rules = json.load(f)
+
+    matcher = LabelMatcher(rules)
+    scorer = LabelScorer(rules, args.threshold, args.top_k)
+    # Warm the scorer's match cache and NumPy before timing
+    scorer.match_batch(texts[:100])
+
+    runs = {
+        "keywords": timed(lambda: [matcher.match(text) for text in texts], args.repeat),
+        "scored_single": timed(lambda: [scorer.match(text) for text in texts], args.repeat),
+        "scored_batch": timed(lambda: scorer.match_batch(texts), args.repeat),
+    }
+    if label_scoring.np is not None:
+        numpy, label_scoring.np = label_scoring.np, None
+        try:
+            fallback = LabelScorer(rules, args.threshold, args.top_k)
+            runs["scored_python"] = timed(lambda: fallback.match_batch(texts), args.repeat)
+        finally:
+            label_scoring.np = numpy
+
+    result = {
+        "issues": len(texts),
+        "numpy": label_scoring.np.__version__ if label_scoring.np is not None else None,
+        "threshold": args.threshold,
+        "top_k": args.top_k,
+        "engines": {name: summarize(value, len(texts)) for name, value in runs.items()},
+        "agreement_with_keywords": agreement(runs["keywords"]["labels"], runs["scored_batch"]["labels"]),
+    }
+    if "scored_python" in runs:
+        result["fallback_matches_numpy"] = runs["scored_python"]["labels"] == runs["scored_batch"]["labels"]
+    return result
+
+
+def check_thresholds(result: Dict, args) -> List[str]:
+    failures = []
+    if result.get("fallback_matches_numpy") is False:
+        failures.append("the Python fallback and NumPy scorers returned different labels")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        limit = 1 + args.max_regression
+        for name, engine in result["engines"].items():
+            before = baseline["engines"].get(name)
+            if before and engine["us_per_issue"] > before["us_per_issue"] * limit:
+                failures.append(
+                    f"{name} regressed: {engine['us_per_issue']} vs baseline {before['us_per_issue']} us/issue"
+                )
+    return failures
+
+
+def print_report(result: Dict):
+    print(f"issues: {result['issues']}  numpy: {result['numpy'] or 'not installed'}")
+    print()
+    print(f"{'engine':<16}{'issues/s':>12}{'us/issue':>10}{'labels/issue':>14}")
+    for name, engine in result["engines"].items():
+        print(
+            f"{name:<16}{engine['issues_per_second']:>12}{engine['us_per_issue']:>10}"
+            f"{engine['labels_per_issue']:>14}"
+        )
+    print()
+    keywords, scored = result["engines"]["keywords"], result["engines"]["scored_batch"]
+    print(f"{'label':<16}{'keywords':>10}{'scored':>10}")
+    for label in dict.fromkeys([*keywords["label_rate"], *scored["label_rate"]]):
+        print(f"{label:<16}{keywords['label_rate'].get(label, 0):>10}{scored['label_rate'].get(label, 0):>10}")
+    print()
+    agree = result["agreement_with_keywords"]
+    print(f"same labels as keywords: {agree['identical']:.1%}  mean jaccard: {agree['mean_jaccard']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="JSONL export with one issue object per line")
+    parser.add_argument("--synthetic", type=int, default=10000, help="synthetic issues when --input is not given")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rules", default=os.path.join(ROOT, "rules", "labels.json"))
+    parser.add_argument("--threshold", type=float, default=1.0, help="default per-label threshold")
+    parser.add_argument("--top-k", type=int, default=0, help="labels per issue for the scorer (0 = all)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per engine; the fastest counts")
+    parser.add_argument("--output", help="write the JSON result here")
+    parser.add_argument("--baseline", help="JSON result of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed fraction slower than baseline")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = check_thresholds(result, args)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
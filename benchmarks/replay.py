@@ -0,0 +1,463 @@
+"""Replay a corpus of webhook deliveries against create_app() and report throughput
+
+Each corpus line is a JSON object:
+
+    {"event": "issues", "delivery": "<id>", "payload": {...}}
+
+Optional keys: "body" (the exact raw body as a string, used instead of
+re-serializing "payload") and "signature" (an X-Hub-Signature-256 value;
+computed with --secret when missing).
+
+GitHub is replaced by a local stub, so the numbers cover signature checks,
+JSON parsing, rule matching, handler logic and database work only. With
+--fake-github (or --github-url) the real client talks HTTP to the fake API
+in benchmarks/fake_github.py instead, which adds the client, scheduler and
+cache to the measurement. --stale-sweep then backdates every tracked issue
+and times one stale sweep over them. --github-app authenticates as a GitHub
+App with a throwaway key, minting installation tokens from the fake.
+
+    python benchmarks/replay.py --synthetic 2000
+    python benchmarks/replay.py --synthetic 5000 --fake-github --stale-sweep
+    python benchmarks/replay.py corpus.jsonl --output result.json
+    python benchmarks/replay.py corpus.jsonl --baseline result.json --max-regression 0.2
+"""
+import os
+import sys
+import json
+import asyncio
+import time
+import hmac
+import random
+import hashlib
+import logging
+import argparse
+import resource
+import tempfile
+import threading
+import tracemalloc
+from collections import Counter, OrderedDict, defaultdict
+from datetime import timedelta
+from typing import Dict, Iterator, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCH_SECRET = "benchmark-secret"
+
+
+def load_corpus(path: str) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_corpus(count: int, seed: int = 1) -> List[dict]:
+    """A mix of opened/edited/labeled issues and comments across a few repos"""
+    rng = random.Random(seed)
+    words = (
+        "error crash slow docs readme feature request how why security exploit "
+        "login page button api timeout database migration broken fails guide"
+    ).split()
+    paths = ["src/api/users.py", "src/web/app.js", "docs/setup.md", "database/schema.sql", "lib/util.c"]
+    commands = ["/priority high", "/size m", "/area backend", "/assign @octocat", "thanks!"]
+    events = []
+    for i in range(count):
+        repo = f"bench-org/repo-{rng.randrange(5)}"
+        number = rng.randrange(1, 2000)
+        kind = rng.random()
+        issue = {"number": number, "labels": [], "assignees": []}
+        if kind < 0.4:
+            body = " ".join(rng.choices(words, k=rng.choice([3, 30, 120])))
+            if rng.random() < 0.5:
+                body += f" see {rng.choice(paths)}"
+            issue.update(title=" ".join(rng.choices(words, k=6)), body=body)
+            event, payload = "issues", {"action": "opened", "issue": issue}
+        elif kind < 0.6:
+            event, payload = "issues", {"action": "edited", "issue": issue}
+        elif kind < 0.7:
+            event, payload = "issues", {"action": "labeled", "issue": issue}
+        else:
+            comment = {"body": rng.choice(commands)}
+            event, payload = "issue_comment", {"action": "created", "issue": issue, "comment": comment}
+        payload["repository"] = {"full_name": repo}
+        events.append({"event": event, "delivery": f"synthetic-{i}", "payload": payload})
+    return events
+
+
+def install_github_stub(latency_ms: float):
+    """Point every module that imported github_client at a recording stub"""
+    from github_client import GitHubClient, RequestScheduler
+    from github_cache import ResponseCache
+
+    class StubIssue:
+        def __init__(self, client):
+            self.client = client
+
+        def _request(self, name):
+            self.client.calls[name] += 1
+            if latency_ms:
+                time.sleep(latency_ms / 1000.0)
+
+        def create_comment(self, body):
+            self._request("create_comment")
+
+        def edit(self, **kwargs):
+            self._request("edit")
+
+        def add_to_labels(self, *labels):
+            self._request("add_to_labels")
+
+        def add_to_assignees(self, *assignees):
+            self._request("add_to_assignees")
+
+    class AsyncStubIssue(StubIssue):
+        async def _request(self, name):
+            self.client.calls[name] += 1
+            if latency_ms:
+                await asyncio.sleep(latency_ms / 1000.0)
+
+        async def create_comment(self, body):
+            await self._request("create_comment")
+
+        async def edit(self, **kwargs):
+            await self._request("edit")
+
+        async def add_to_labels(self, *labels):
+            await self._request("add_to_labels")
+
+        async def add_to_assignees(self, *assignees):
+            await self._request("add_to_assignees")
+
+    class StubGitHubClient(GitHubClient):
+        def __init__(self):
+            self.token = None
+            self.app_id = ""
+            self._github = None
+            self._installations = OrderedDict()
+            self._lock = threading.Lock()
+            self.scheduler = RequestScheduler()
+            self.cache = ResponseCache(max_size=0)
+            self.calls = Counter()
+
+        def get_lazy_issue(self, repo_full_name, issue_number):
+            return StubIssue(self)
+
+        def async_issue(self, repo_full_name, issue_number):
+            return AsyncStubIssue(self)
+
+        def get_issue_states(self, repo_full_name, issue_numbers):
+            StubIssue(self)._request("graphql_issue_states")
+            return {number: {"state": "open", "labels": []} for number in issue_numbers}
+
+    stub = StubGitHubClient()
+    for name, module in list(sys.modules.items()):
+        if getattr(module, "github_client", None).__class__ is GitHubClient:
+            module.github_client = stub
+    return stub
+
+
+def generate_app_key() -> str:
+    """Throwaway RSA key in PEM form; the fake API does not check JWT signatures"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+
+
+def create_bench_app(database_url: str):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["DB_AUTO_UPGRADE"] = "true"
+    os.environ["WEBHOOK_ASYNC"] = "false"
+    os.environ.setdefault("GH_WEBHOOK_SECRET", BENCH_SECRET)
+    os.chdir(ROOT)
+
+    # Replay drives the stale sweep itself when asked to
+    os.environ["SCHEDULER_ENABLED"] = "false"
+
+    from app import create_app, db
+
+    return create_app(), db
+
+
+def run_stale_sweep(app, db, statements: List[int]) -> dict:
+    """Backdate every tracked issue past the stale cutoff and time one sweep"""
+    from models import IssueActivity, utcnow
+    from handlers.stale import check_stale_issues
+
+    stale_days = int(os.getenv("STALE_DAYS", "14"))
+    with app.app_context():
+        tracked = db.session.query(IssueActivity).update(
+            {
+                IssueActivity.last_activity: utcnow() - timedelta(days=stale_days + 1),
+                IssueActivity.is_stale: False,
+            }
+        )
+        db.session.commit()
+
+    statements[0] = 0
+    start = time.perf_counter()
+    check_stale_issues(app)
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        marked = db.session.query(IssueActivity).filter_by(is_stale=True).count()
+    return {
+        "tracked": tracked,
+        "marked_stale": marked,
+        "seconds": round(elapsed, 3),
+        "issues_per_sec": round(tracked / elapsed, 2) if elapsed else 0.0,
+        "db_statements": statements[0],
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def deliveries(corpus: List[dict], repeat: int) -> Iterator[dict]:
+    for round_number in range(repeat):
+        for entry in corpus:
+            if round_number:
+                # Fresh delivery IDs so de-duplication does not skip repeats
+                entry = dict(entry, delivery=f"{entry.get('delivery', 'event')}-r{round_number}")
+            yield entry
+
+
+def run(args) -> dict:
+    corpus = synthetic_corpus(args.synthetic, args.seed) if args.synthetic else load_corpus(args.corpus)
+    if args.write_corpus:
+        with open(args.write_corpus, "w") as f:
+            for entry in corpus:
+                f.write(json.dumps(entry) + "\n")
+
+    fake = None
+    github_url = args.github_url
+    if args.fake_github:
+        from fake_github import start_fake_github
+
+        fake = start_fake_github(latency_ms=args.github_latency_ms, rate_limit=args.github_rate_limit)
+        github_url = fake.url
+    if github_url:
+        # Must be set before github_client is first imported
+        os.environ["GITHUB_API_URL"] = github_url
+        os.environ.setdefault("GITHUB_TOKEN", "fake-token")
+        if args.github_app:
+            os.environ["GITHUB_APP_ID"] = "1"
+            os.environ["GITHUB_APP_PRIVATE_KEY"] = generate_app_key()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/replay.db"
+    app, db = create_bench_app(database_url)
+    logging.getLogger().setLevel(args.log_level)
+    stub = None if github_url else install_github_stub(args.github_latency_ms)
+    secret = (args.secret or os.environ["GH_WEBHOOK_SECRET"]).encode()
+
+    import routes.webhook as webhook
+    from sqlalchemy import event as sa_event
+
+    # Time each handler as called from dispatch_event
+    handler_samples: Dict[str, List[float]] = defaultdict(list)
+    for name in ("handle_issue_event", "handle_comment_event"):
+        original = getattr(webhook, name)
+
+        def timed(payload, _original=original, _name=name):
+            start = time.perf_counter()
+            try:
+                return _original(payload)
+            finally:
+                handler_samples[_name].append(time.perf_counter() - start)
+
+        setattr(webhook, name, timed)
+
+    statements = [0]
+    with app.app_context():
+        engine = db.engine
+    sa_event.listen(engine, "before_cursor_execute", lambda *a, **k: statements.__setitem__(0, statements[0] + 1))
+
+    client = app.test_client()
+    event_samples: Dict[str, List[float]] = defaultdict(list)
+    event_statements: Dict[str, List[int]] = defaultdict(list)
+    statuses = Counter()
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    measured = 0
+    total_time = 0.0
+    for index, entry in enumerate(deliveries(corpus, args.repeat)):
+        body = entry["body"].encode() if "body" in entry else json.dumps(entry["payload"]).encode()
+        signature = entry.get("signature") or "sha256=" + hmac.new(secret, body, hashlib.sha256).hexdigest()
+        payload = entry.get("payload") or json.loads(body)
+        key = entry["event"] + (f".{payload['action']}" if payload.get("action") else "")
+        headers = {
+            "X-GitHub-Event": entry["event"],
+            "X-GitHub-Delivery": entry.get("delivery", f"replay-{index}"),
+            "X-Hub-Signature-256": signature,
+            "Content-Type": "application/json",
+        }
+
+        statements[0] = 0
+        start = time.perf_counter()
+        response = client.post("/webhook", data=body, headers=headers)
+        elapsed = time.perf_counter() - start
+
+        if index < args.warmup:
+            if index == args.warmup - 1:
+                handler_samples.clear()
+            continue
+        measured += 1
+        total_time += elapsed
+        statuses[response.status_code] += 1
+        event_samples[key].append(elapsed)
+        event_statements[key].append(statements[0])
+
+    peak_traced = None
+    if args.trace_memory:
+        peak_traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    sweep = run_stale_sweep(app, db, statements) if args.stale_sweep else None
+
+    if stub is not None:
+        github_calls = stub.calls
+    elif fake is not None:
+        github_calls = fake.github.stats()["counters"]
+    else:
+        from github_client import github_client
+
+        github_calls = github_client.scheduler.counters
+
+    all_samples = [sample for samples in event_samples.values() for sample in samples]
+    return {
+        "events": measured,
+        "events_per_sec": round(measured / total_time, 2) if total_time else 0.0,
+        "latency": summarize(all_samples),
+        "by_event": {
+            key: {
+                **summarize(samples),
+                "db_statements_per_event": round(sum(event_statements[key]) / len(samples), 2),
+            }
+            for key, samples in sorted(event_samples.items())
+        },
+        "by_handler": {name: summarize(samples) for name, samples in sorted(handler_samples.items())},
+        "http_status": {str(code): count for code, count in sorted(statuses.items())},
+        "github_calls": dict(sorted(github_calls.items())),
+        "stale_sweep": sweep,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_traced_bytes": peak_traced,
+    }
+
+
+def check_thresholds(result: dict, args) -> List[str]:
+    failures = []
+    if args.min_events_per_sec and result["events_per_sec"] < args.min_events_per_sec:
+        failures.append(f"throughput {result['events_per_sec']} ev/s < {args.min_events_per_sec}")
+    if args.max_p95_ms and result["latency"]["p95_ms"] > args.max_p95_ms:
+        failures.append(f"p95 {result['latency']['p95_ms']} ms > {args.max_p95_ms}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        limit = 1 + args.max_regression
+        if result["events_per_sec"] * limit < baseline["events_per_sec"]:
+            failures.append(
+                f"throughput regressed: {result['events_per_sec']} vs baseline {baseline['events_per_sec']} ev/s"
+            )
+        if result["latency"]["p95_ms"] > baseline["latency"]["p95_ms"] * limit:
+            failures.append(
+                f"p95 regressed: {result['latency']['p95_ms']} vs baseline {baseline['latency']['p95_ms']} ms"
+            )
+    return failures
+
+
+def print_report(result: dict):
+    print(f"events: {result['events']}  throughput: {result['events_per_sec']} ev/s")
+    latency = result["latency"]
+    print(f"latency p50/p95/p99: {latency['p50_ms']} / {latency['p95_ms']} / {latency['p99_ms']} ms")
+    print()
+    print(f"{'event':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'db stmts':>10}")
+    for key, row in result["by_event"].items():
+        print(
+            f"{key:<28}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+            f"{row['p99_ms']:>10}{row['db_statements_per_event']:>10}"
+        )
+    print()
+    for name, row in result["by_handler"].items():
+        print(f"{name:<28}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    print()
+    print(f"http status: {result['http_status']}")
+    print(f"github calls: {result['github_calls']}")
+    sweep = result.get("stale_sweep")
+    if sweep:
+        print(
+            f"stale sweep: {sweep['tracked']} issues in {sweep['seconds']} s "
+            f"({sweep['issues_per_sec']}/s), {sweep['marked_stale']} marked, "
+            f"{sweep['db_statements']} db statements"
+        )
+    print(f"peak rss: {result['peak_rss_kb']} KB", end="")
+    if result["peak_traced_bytes"] is not None:
+        print(f"  peak traced: {result['peak_traced_bytes'] / 1024:.0f} KB", end="")
+    print()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", help="JSONL file of webhook deliveries")
+    parser.add_argument("--synthetic", type=int, default=0, help="generate N synthetic deliveries instead")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--write-corpus", help="save the corpus used (e.g. the synthetic one) to this path")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the corpus this many times")
+    parser.add_argument("--warmup", type=int, default=50, help="deliveries excluded from the results")
+    parser.add_argument("--secret", help="webhook secret used to sign/verify (default: GH_WEBHOOK_SECRET)")
+    parser.add_argument("--database-url", help="database to replay into (default: fresh SQLite file)")
+    parser.add_argument("--github-latency-ms", type=float, default=0.0, help="simulated latency per GitHub call")
+    parser.add_argument("--fake-github", action="store_true", help="use the real client against an in-process fake API")
+    parser.add_argument(
+        "--github-rate-limit", type=int, default=10_000_000,
+        help="hourly budget of the fake API; lower it to exercise background pacing",
+    )
+    parser.add_argument("--github-url", help="use the real client against this API (e.g. a running fake_github.py)")
+    parser.add_argument("--github-app", action="store_true", help="authenticate as a GitHub App (needs a fake API)")
+    parser.add_argument("--stale-sweep", action="store_true", help="time a stale sweep over the tracked issues")
+    parser.add_argument("--trace-memory", action="store_true", help="also report tracemalloc peak (slower)")
+    parser.add_argument("--log-level", default="WARNING", help="root log level during the replay")
+    parser.add_argument("--output", help="write the JSON result here")
+    parser.add_argument("--baseline", help="JSON result of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed fraction worse than baseline")
+    parser.add_argument("--min-events-per-sec", type=float, default=0.0)
+    parser.add_argument("--max-p95-ms", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    if not args.corpus and not args.synthetic:
+        parser.error("give a corpus file or --synthetic N")
+    if args.github_app and not (args.fake_github or args.github_url):
+        parser.error("--github-app needs --fake-github or --github-url")
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = check_thresholds(result, args)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Measure worker cold start: import, create_app() and the first request
+
+Every run is a fresh interpreter, so nothing is cached in sys.modules. The
+child reports how long `import app`, create_app() and the first request
+(GET /healthz through the test client) took, and which heavy optional
+modules were loaded by then; the parent also times the whole process
+from spawn to exit.
+
+    python benchmarks/startup.py --runs 20
+    python benchmarks/startup.py --importtime 15
+    python benchmarks/startup.py --output startup.json
+    python benchmarks/startup.py --baseline startup.json --max-regression 0.2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should stay off the boot path of a webhook worker
+HEAVY_MODULES = ("github", "alembic", "apscheduler", "requests")
+
+PHASES = ("import_ms", "create_app_ms", "first_request_ms", "boot_ms", "process_ms")
+
+
+def child():
+    """Runs inside the measured interpreter and prints one JSON line"""
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    import app as app_module
+
+    imported = time.perf_counter()
+    flask_app = app_module.create_app()
+    created = time.perf_counter()
+    response = flask_app.test_client().get("/healthz")
+    answered = time.perf_counter()
+
+    print(
+        json.dumps(
+            {
+                "import_ms": (imported - start) * 1000,
+                "create_app_ms": (created - imported) * 1000,
+                "first_request_ms": (answered - created) * 1000,
+                "boot_ms": (answered - start) * 1000,
+                "status": response.status_code,
+                "loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+            }
+        )
+    )
+
+
+def child_env(database_url: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", database_url)
+    env.setdefault("GH_WEBHOOK_SECRET", "startup-bench")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    # Like a production worker: no reloader, no debug
+    env.pop("FLASK_DEBUG", None)
+    env.pop("WERKZEUG_RUN_MAIN", None)
+    return env
+
+
+def run_once(env: Dict[str, str]) -> dict:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"child failed ({proc.returncode}):\n{proc.stderr[-2000:]}")
+    sample = json.loads(proc.stdout.strip().splitlines()[-1])
+    sample["process_ms"] = elapsed
+    return sample
+
+
+def slowest_imports(env: Dict[str, str], top: int) -> List[dict]:
+    """Cumulative import time of the slowest modules, from `python -X importtime`"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Indentation marks nesting; only top-level imports add up to the total
+        rows.append(
+            {
+                "module": name.strip(),
+                "cumulative_ms": int(cumulative) / 1000,
+                "top_level": len(name) - len(name.lstrip()) <= 1,
+            }
+        )
+    rows.sort(key=lambda row: -row["cumulative_ms"])
+    return rows[:top]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run(args) -> dict:
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/startup.db"
+    env = child_env(database_url)
+
+    for _ in range(args.warmup):
+        # Warms the OS page cache and __pycache__ so runs are comparable
+        run_once(env)
+
+    samples = [run_once(env) for _ in range(args.runs)]
+    result = {
+        "runs": len(samples),
+        "python": sys.version.split()[0],
+        "loaded_modules": sorted({name for sample in samples for name in sample["loaded"]}),
+        "non_200": sum(1 for sample in samples if sample["status"] != 200),
+    }
+    for phase in PHASES:
+        values = [sample[phase] for sample in samples]
+        result[phase] = {
+            "p50": round(percentile(values, 50), 2),
+            "p95": round(percentile(values, 95), 2),
+            "min": round(min(values), 2),
+            "mean": round(sum(values) / len(values), 2),
+        }
+    if args.importtime:
+        result["slowest_imports"] = slowest_imports(env, args.importtime)
+    return result
+
+
+def check_thresholds(result: dict, args) -> List[str]:
+    failures = []
+    if result["non_200"]:
+        failures.append(f"{result['non_200']} runs did not answer /healthz with 200")
+    if args.max_boot_ms and result["boot_ms"]["p50"] > args.max_boot_ms:
+        failures.append(f"boot p50 {result['boot_ms']['p50']} ms > {args.max_boot_ms}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        limit = 1 + args.max_regression
+        for phase in ("boot_ms", "process_ms"):
+            if result[phase]["p50"] > baseline[phase]["p50"] * limit:
+                failures.append(
+                    f"{phase} p50 regressed: {result[phase]['p50']} vs baseline {baseline[phase]['p50']} ms"
+                )
+    return failures
+
+
+def print_report(result: dict):
+    print(f"runs: {result['runs']}  python: {result['python']}")
+    print()
+    print(f"{'phase':<20}{'p50 ms':>10}{'p95 ms':>10}{'min ms':>10}{'mean ms':>10}")
+    for phase in PHASES:
+        row = result[phase]
+        print(f"{phase:<20}{row['p50']:>10}{row['p95']:>10}{row['min']:>10}{row['mean']:>10}")
+    print()
+    print(f"heavy modules loaded at first request: {', '.join(result['loaded_modules']) or 'none'}")
+    if result.get("slowest_imports"):
+        print()
+        print(f"{'module':<48}{'cumulative ms':>14}")
+        for row in result["slowest_imports"]:
+            name = row["module"] if row["top_level"] else f"  {row['module']}"
+            print(f"{name:<48}{row['cumulative_ms']:>14.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters to measure")
+    parser.add_argument("--warmup", type=int, default=2, help="runs excluded from the results")
+    parser.add_argument("--database-url", help="DATABASE_URL for the children (default: unused SQLite file)")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="also list the N slowest imports")
+    parser.add_argument("--output", help="write the JSON result here")
+    parser.add_argument("--baseline", help="JSON result of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed fraction slower than baseline")
+    parser.add_argument("--max-boot-ms", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child()
+        return 0
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = check_thresholds(result, args)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""Triage a backlog of existing issues offline, then optionally apply the result
+
+`decide` streams issues from a JSONL export (one GitHub issue object per
+line, as returned by the REST API) or from a repository's paginated issue
+listing, matches labels, owners and the checklist heuristic across a pool
+of worker processes and writes one decision per issue to a JSONL file.
+Labels and assignees the issue already has are left out of its decision.
+
+`apply` sends the decisions through GitHubClient at background priority,
+so the scheduler paces them against the rate limit and leaves room for
+webhooks. Progress is checkpointed after every batch; re-running the same
+command resumes after the last applied batch, and decisions that failed
+are appended to <decisions>.failed for another pass. Checklist comments
+are only posted with --checklist.
+
+    python bulk_triage.py decide --input issues.jsonl --output decisions.jsonl
+    python bulk_triage.py decide --repo owner/name --output decisions.jsonl --workers 8
+    python bulk_triage.py decide --input issues.jsonl --output decisions.jsonl --resume
+    python bulk_triage.py apply decisions.jsonl --batch-size 50 --concurrency 4
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from triage import decide_batch
+
+logger = logging.getLogger(__name__)
+
+
+def _names(items: Iterable[Any], key: str) -> List[str]:
+    # Exports carry label/user objects, hand-written files may carry plain names
+    return [item[key] if isinstance(item, dict) else item for item in items or []]
+
+
+def _repo_of(issue: Dict[str, Any], default: Optional[str]) -> Optional[str]:
+    if issue.get("repo"):
+        return issue["repo"]
+    repository = issue.get("repository")
+    if isinstance(repository, dict) and repository.get("full_name"):
+        return repository["full_name"]
+    url = issue.get("repository_url") or ""
+    if "/repos/" in url:
+        return url.split("/repos/", 1)[1]
+    return default
+
+
+def read_export(path: str, default_repo: Optional[str], include_closed: bool = False) -> Iterator[dict]:
+    """Issues from a JSONL export, skipping pull requests (and closed issues)"""
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            issue = json.loads(line)
+            if "pull_request" in issue:
+                continue
+            if not include_closed and issue.get("state", "open") != "open":
+                continue
+            repo = _repo_of(issue, default_repo)
+            if not repo:
+                raise ValueError(f"{path}:{line_number}: no repository; pass --repo")
+            yield {
+                "repo": repo,
+                "number": issue["number"],
+                "title": issue.get("title"),
+                "body": issue.get("body"),
+                "labels": _names(issue.get("labels"), "name"),
+                "assignees": _names(issue.get("assignees"), "login"),
+            }
+
+
+def list_issues(repo_full_name: str, include_closed: bool = False) -> Iterator[dict]:
+    """Issues of a repository, page by page, through the shared GitHub client"""
+    from github_client import github_client
+
+    state = "all" if include_closed else "open"
+    with github_client.background():
+        for issue in github_client.get_repo(repo_full_name).get_issues(state=state):
+            if issue.pull_request is not None:
+                continue
+            yield {
+                "repo": repo_full_name,
+                "number": issue.number,
+                "title": issue.title,
+                "body": issue.body,
+                "labels": [label.name for label in issue.labels],
+                "assignees": [user.login for user in issue.assignees],
+            }
+
+
+def decision_for(issue: Dict[str, Any], decision: Dict[str, Any]) -> Dict[str, Any]:
+    """An issue's triage decision without the labels and assignees it already has"""
+    labels, assignees = set(issue.get("labels", [])), set(issue.get("assignees", []))
+    return {
+        "repo": issue["repo"],
+        "number": issue["number"],
+        "labels": [label for label in decision["labels"] if label not in labels],
+        "owners": [owner for owner in decision["owners"] if owner not in assignees],
+        "checklist": decision["checklist"],
+    }
+
+
+def _init_worker():
+    from rules_manager import rules_manager
+
+    logging.getLogger().setLevel(logging.WARNING)
+    # Compile the matchers once per process rather than on the first chunk
+    if rules_manager.label_engine == "scored":
+        rules_manager.get_label_scorer()
+    else:
+        rules_manager.get_label_matcher()
+    rules_manager.get_owner_trie()
+
+
+def _decide_chunk(issues: List[dict]) -> List[dict]:
+    # One batch per chunk, so LABEL_ENGINE=scored scores it in a single pass
+    decisions = decide_batch([(issue.get("title"), issue.get("body")) for issue in issues])
+    return [decision_for(issue, decision) for issue, decision in zip(issues, decisions)]
+
+
+def _complete_lines(path: str) -> int:
+    """Count whole lines in path, truncating a partial last line from a crash"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            f.truncate(end)
+    return data.count(b"\n", 0, end)
+
+
+def run_decide(args) -> int:
+    if args.input:
+        issues = read_export(args.input, args.repo, args.include_closed)
+    elif args.repo:
+        issues = list_issues(args.repo, args.include_closed)
+    else:
+        print("decide needs --input or --repo", file=sys.stderr)
+        return 2
+
+    done = _complete_lines(args.output) if args.resume else 0
+    if done:
+        print(f"resuming after {done} decisions already in {args.output}", file=sys.stderr)
+        issues = islice(issues, done, None)
+
+    workers = args.workers or os.cpu_count() or 1
+    # Issues are read a window at a time so huge exports never sit in memory
+    window_size = args.chunk_size * workers * 4
+    pool = multiprocessing.Pool(workers, initializer=_init_worker) if workers > 1 else None
+    if pool is None:
+        _init_worker()
+
+    start = time.perf_counter()
+    counts = {"issues": 0, "labels": 0, "owners": 0, "checklist": 0}
+    try:
+        with open(args.output, "a" if args.resume else "w") as out:
+            while True:
+                window = list(islice(issues, window_size))
+                if not window:
+                    break
+                chunks = [window[i : i + args.chunk_size] for i in range(0, len(window), args.chunk_size)]
+                results = pool.map(_decide_chunk, chunks) if pool else map(_decide_chunk, chunks)
+                for decisions in results:
+                    for decision in decisions:
+                        out.write(json.dumps(decision) + "\n")
+                        counts["issues"] += 1
+                        counts["labels"] += bool(decision["labels"])
+                        counts["owners"] += bool(decision["owners"])
+                        counts["checklist"] += decision["checklist"]
+                out.flush()
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{done + counts['issues']} decided ({counts['issues'] / elapsed:.0f} issues/s)",
+                    file=sys.stderr,
+                )
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "issues": counts["issues"],
+                "with_labels": counts["labels"],
+                "with_owners": counts["owners"],
+                "needing_checklist": counts["checklist"],
+                "workers": workers,
+                "seconds": round(elapsed, 3),
+                "issues_per_second": round(counts["issues"] / elapsed, 1) if elapsed else None,
+            },
+            indent=2,
+        )
+    )
+    return 0
+
+
+def _read_progress(path: str) -> int:
+    try:
+        with open(path) as f:
+            return int(json.load(f)["applied"])
+    except FileNotFoundError:
+        return 0
+
+
+def _write_progress(path: str, applied: int):
+    # Replace atomically so an interrupted run never leaves a torn checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"applied": applied, "updated_at": time.time()}, f)
+    os.replace(tmp, path)
+
+
+async def _apply_batch(decisions: List[dict], checklist: bool, concurrency: int) -> List[bool]:
+    import asyncio
+    from github_client import github_client
+    from triage import CHECKLIST_COMMENT
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def apply_one(decision: dict) -> bool:
+        # Current labels are unknown this long after the export, so labels
+        # and assignees are added with POSTs rather than replaced by a PATCH
+        batch = github_client.batch(decision["repo"], decision["number"], durable=False)
+        batch.add_labels(decision["labels"]).add_assignees(decision["owners"])
+        if checklist and decision["checklist"]:
+            batch.add_comment(CHECKLIST_COMMENT)
+        async with semaphore:
+            return await batch.flush_async()
+
+    return await asyncio.gather(*(apply_one(decision) for decision in decisions))
+
+
+def _actionable(decision: dict, checklist: bool) -> bool:
+    return bool(decision["labels"] or decision["owners"] or (checklist and decision["checklist"]))
+
+
+def run_apply(args) -> int:
+    from async_github import async_github
+    from github_client import github_client
+
+    progress_path = args.progress or f"{args.decisions}.progress"
+    failed_path = f"{args.decisions}.failed"
+    applied = _read_progress(progress_path)
+    if applied:
+        print(f"resuming after {applied} decisions already applied", file=sys.stderr)
+
+    start = time.perf_counter()
+    counts = {"sent": 0, "failed": 0, "skipped": 0}
+    with open(args.decisions) as f:
+        lines = islice((line for line in f if line.strip()), applied, None)
+        while True:
+            window = [json.loads(line) for line in islice(lines, args.batch_size)]
+            if not window:
+                break
+            todo = [decision for decision in window if _actionable(decision, args.checklist)]
+            counts["skipped"] += len(window) - len(todo)
+
+            if todo and not args.dry_run:
+                # Below webhook traffic: the scheduler keeps its reserve for them
+                with github_client.background():
+                    results = async_github.run(_apply_batch(todo, args.checklist, args.concurrency))
+                failed = [decision for decision, ok in zip(todo, results) if not ok]
+                if failed:
+                    with open(failed_path, "a") as out:
+                        out.writelines(json.dumps(decision) + "\n" for decision in failed)
+                counts["failed"] += len(failed)
+                counts["sent"] += len(todo) - len(failed)
+            else:
+                counts["sent"] += len(todo)
+
+            applied += len(window)
+            if not args.dry_run:
+                _write_progress(progress_path, applied)
+            remaining = github_client.rate_limit_status().get("remaining")
+            print(
+                f"{applied} applied, {counts['failed']} failed, rate limit remaining {remaining}",
+                file=sys.stderr,
+            )
+            if args.pause:
+                time.sleep(args.pause)
+
+    if not args.dry_run:
+        async_github.stop()
+    print(
+        json.dumps(
+            {**counts, "applied": applied, "seconds": round(time.perf_counter() - start, 3), "dry_run": args.dry_run},
+            indent=2,
+        )
+    )
+    return 1 if counts["failed"] else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    decide_parser = commands.add_parser("decide", help="match rules against issues and write decisions")
+    decide_parser.add_argument("--input", help="JSONL export with one issue object per line")
+    decide_parser.add_argument("--repo", help="owner/name; lists its issues when --input is not given")
+    decide_parser.add_argument("--output", required=True, help="decisions JSONL to write")
+    decide_parser.add_argument("--include-closed", action="store_true")
+    decide_parser.add_argument("--workers", type=int, default=0, help="worker processes (default: CPU count)")
+    decide_parser.add_argument("--chunk-size", type=int, default=500, help="issues per task sent to a worker")
+    decide_parser.add_argument("--resume", action="store_true", help="append after the decisions already in --output")
+
+    apply_parser = commands.add_parser("apply", help="send decisions to GitHub")
+    apply_parser.add_argument("decisions", help="decisions JSONL written by decide")
+    apply_parser.add_argument("--batch-size", type=int, default=50, help="decisions per checkpoint")
+    apply_parser.add_argument("--concurrency", type=int, default=4, help="issues in flight at once")
+    apply_parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    apply_parser.add_argument("--checklist", action="store_true", help="also post the checklist comment")
+    apply_parser.add_argument("--progress", help="checkpoint file (default: <decisions>.progress)")
+    apply_parser.add_argument("--dry-run", action="store_true", help="count what would be sent")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    if args.command == "decide":
+        return run_decide(args)
+    return run_apply(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
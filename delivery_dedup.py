@@ -0,0 +1,110 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import WebhookDelivery, utcnow
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryDeduplicator:
+    """Idempotency guard keyed on the X-GitHub-Delivery header
+
+    A bounded in-process LRU answers repeats without touching the database.
+    The webhook_delivery table is authoritative across processes and
+    restarts: its primary key makes claiming a delivery atomic. Rows older
+    than the TTL are pruned periodically.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("DELIVERY_DEDUP", "true").lower() == "true"
+        self.cache_size = int(os.getenv("DELIVERY_DEDUP_CACHE_SIZE", "10000"))
+        self.ttl = timedelta(hours=float(os.getenv("DELIVERY_DEDUP_TTL_HOURS", "72")))
+        self.prune_interval = float(os.getenv("DELIVERY_DEDUP_PRUNE_SECONDS", "3600"))
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def claim(self, delivery_id: Optional[str], event_type: Optional[str] = None) -> bool:
+        """Record a delivery; returns False if it was already processed"""
+        if not self.enabled or not delivery_id:
+            return True
+
+        with self._lock:
+            if delivery_id in self._seen:
+                self._seen.move_to_end(delivery_id)
+                return False
+
+        try:
+            db.session.add(WebhookDelivery(delivery_id=delivery_id, event_type=event_type))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            self._remember(delivery_id)
+            return False
+        except Exception as e:
+            # Fail open: processing twice beats dropping the event
+            db.session.rollback()
+            logger.warning("Could not record delivery %s: %s", delivery_id, e)
+            return True
+
+        self._remember(delivery_id)
+        self._maybe_prune()
+        return True
+
+    def release(self, delivery_id: Optional[str]):
+        """Forget a delivery whose processing failed so a redelivery is handled"""
+        if not self.enabled or not delivery_id:
+            return
+        with self._lock:
+            self._seen.pop(delivery_id, None)
+        try:
+            db.session.query(WebhookDelivery).filter_by(delivery_id=delivery_id).delete()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Could not release delivery %s: %s", delivery_id, e)
+
+    def prune(self) -> int:
+        """Delete recorded deliveries older than the TTL"""
+        cutoff = utcnow() - self.ttl
+        try:
+            deleted = (
+                db.session.query(WebhookDelivery)
+                .filter(WebhookDelivery.received_at < cutoff)
+                .delete(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Failed to prune webhook deliveries: %s", e)
+            return 0
+        if deleted:
+            logger.info("Pruned %s webhook deliveries older than %s", deleted, self.ttl)
+        return deleted
+
+    def _remember(self, delivery_id: str):
+        with self._lock:
+            self._seen[delivery_id] = None
+            self._seen.move_to_end(delivery_id)
+            while len(self._seen) > self.cache_size:
+                self._seen.popitem(last=False)
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_prune < self.prune_interval:
+                return
+            self._last_prune = now
+        self.prune()
+
+
+# Global instance
+delivery_deduplicator = DeliveryDeduplicator()
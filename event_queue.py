@@ -0,0 +1,158 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+from typing import Any, Callable, Hashable, Optional
+from metrics import metrics
+from tracing import tracer
+from log_pipeline import log_context
+from keyed_executor import KeyedExecutor
+
+logger = logging.getLogger(__name__)
+
+# Sentinel placed on the queue to tell the intake thread to exit
+_STOP = object()
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue is at capacity"""
+
+
+class EventQueue:
+    """Bounded in-process queue of webhook deliveries drained by a worker pool
+
+    An intake thread parses each delivery and hands it to a KeyedExecutor
+    keyed by (repository, issue number), so events for the same issue are
+    handled one at a time and in arrival order while different issues run
+    in parallel on WEBHOOK_WORKERS threads. At most WEBHOOK_KEY_BACKLOG
+    events wait per issue; beyond that the intake waits, and deliveries
+    back up into the queue (and then get 503) instead of piling onto one
+    issue.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("WEBHOOK_ASYNC", "false").lower() == "true"
+        self.num_workers = int(os.getenv("WEBHOOK_WORKERS", "4"))
+        self.max_depth = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+        self.key_backlog = int(os.getenv("WEBHOOK_KEY_BACKLOG", "100"))
+        self.drain_timeout = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+        self._queue = queue.Queue(maxsize=self.max_depth)
+        self._intake: Optional[threading.Thread] = None
+        self._executor = KeyedExecutor("webhook-worker", self.num_workers, self.key_backlog)
+        self._app = None
+        self._handler: Optional[Callable[[str, dict, Optional[str]], dict]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._intake is not None
+
+    def depth(self) -> int:
+        """Number of deliveries waiting to be processed"""
+        return self._queue.qsize() + self._executor.depth()
+
+    def key_stats(self) -> dict:
+        """Per-issue contention counters of the worker pool"""
+        return self._executor.stats()
+
+    def start(self, app, handler: Callable[[str, dict, Optional[str]], dict]):
+        """Start the worker pool; handler(event_type, payload, delivery_id) runs in an app context"""
+        with self._lock:
+            if self._intake is not None:
+                return
+            self._app = app
+            self._handler = handler
+            self._executor.start()
+            self._intake = threading.Thread(target=self._run, name="webhook-intake", daemon=True)
+            self._intake.start()
+            atexit.register(self.stop)
+            logger.info(
+                "Started %s webhook workers (queue size %s)", self.num_workers, self.max_depth
+            )
+
+    def enqueue(self, event_type: str, body: bytes, delivery_id: Optional[str] = None):
+        """Add a verified raw delivery to the queue without blocking"""
+        try:
+            self._queue.put_nowait((event_type, body, delivery_id))
+        except queue.Full:
+            raise QueueFullError(f"Webhook queue is full ({self.max_depth} events)")
+
+    def stop(self, drain: bool = True):
+        """Stop the workers, optionally processing everything already queued first"""
+        with self._lock:
+            intake, self._intake = self._intake, None
+        if intake is None:
+            return
+
+        if not drain:
+            # Discard pending deliveries so the sentinel is picked up immediately
+            try:
+                while True:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+            except queue.Empty:
+                pass
+
+        logger.info("Stopping webhook workers (%s events pending)", self.depth())
+        # Blocking put: the sentinel queues up behind pending events
+        self._queue.put(_STOP)
+        intake.join(timeout=self.drain_timeout)
+        if intake.is_alive():
+            logger.warning("%s did not finish draining in time", intake.name)
+        self._executor.stop(drain=drain, timeout=self.drain_timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self._route(*item)
+            finally:
+                self._queue.task_done()
+
+    def _route(self, event_type: str, body: bytes, delivery_id: Optional[str]):
+        """Parse a delivery and queue it behind earlier events for the same issue"""
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError:
+            with log_context(delivery=delivery_id, event=event_type):
+                logger.error("Dropping queued %s event with invalid JSON", event_type)
+            return
+
+        self._executor.submit(
+            _issue_key(payload, delivery_id), self._process, event_type, payload, delivery_id
+        )
+
+    def _process(self, event_type: str, payload: dict, delivery_id: Optional[str]):
+        with log_context(delivery=delivery_id, event=event_type), tracer.trace(
+            "queued_event", event=event_type, delivery=delivery_id
+        ):
+            try:
+                with self._app.app_context():
+                    result = self._handler(event_type, payload, delivery_id)
+                logger.debug("Processed queued %s event: %s", event_type, result)
+            except Exception as e:
+                logger.error("Queued %s event failed: %s", event_type, e)
+
+
+def _issue_key(payload: Any, delivery_id: Optional[str]) -> Hashable:
+    """(repository, issue number) of an event; events without an issue get a key of their own"""
+    if isinstance(payload, dict):
+        repo = (payload.get("repository") or {}).get("full_name")
+        number = (payload.get("issue") or {}).get("number")
+        if repo and number is not None:
+            return (repo.lower(), number)
+    return ("delivery", delivery_id or object())
+
+
+# Global instance
+event_queue = EventQueue()
+
+metrics.gauge(
+    "triage_webhook_queue_depth",
+    "Webhook deliveries waiting in the ingestion queue",
+    lambda: event_queue.depth() if event_queue.running else None,
+)
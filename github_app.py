@@ -0,0 +1,191 @@
+import os
+import time
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from github.Auth import Auth
+
+logger = logging.getLogger(__name__)
+
+# GitHub accepts app JWTs for at most 10 minutes; stay under that and
+# backdate iat so a slightly fast local clock is not rejected
+JWT_LIFETIME = 540
+JWT_CLOCK_SKEW = 60
+
+
+class GitHubAppError(Exception):
+    """Raised when an installation token or installation lookup fails"""
+
+
+class GitHubApp:
+    """Installation access tokens for a GitHub App, minted on demand and cached
+
+    A JWT signed with the app's private key (RS256) is exchanged for a
+    token at POST /app/installations/{id}/access_tokens. Each token is
+    reused until GITHUB_APP_TOKEN_MARGIN seconds before it expires (GitHub
+    issues them for an hour). Repositories are mapped to installations from
+    the installation.id of webhook payloads, or looked up once with
+    GET /repos/{owner}/{repo}/installation for background work.
+    """
+
+    def __init__(self):
+        self.app_id = os.getenv("GITHUB_APP_ID", "")
+        self.base_url = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+        self.refresh_margin = float(os.getenv("GITHUB_APP_TOKEN_MARGIN", "300"))
+        self.private_key = os.getenv("GITHUB_APP_PRIVATE_KEY", "").replace("\\n", "\n")
+        key_path = os.getenv("GITHUB_APP_PRIVATE_KEY_PATH", "")
+        if key_path and not self.private_key:
+            with open(key_path) as f:
+                self.private_key = f.read()
+
+        # installation id -> (token, expires at as epoch seconds)
+        self._tokens: Dict[int, Tuple[str, float]] = {}
+        self._installations: Dict[str, int] = {}
+        # One mint per installation at a time; other threads wait for its token
+        self._mint_locks: Dict[int, threading.Lock] = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+        self._jwt: Tuple[str, float] = ("", 0.0)
+        self._session = None
+        self.counters = {"tokens_minted": 0, "token_hits": 0, "installation_lookups": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.app_id and self.private_key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "installations": len(set(self._installations.values())),
+                "cached_tokens": len(self._tokens),
+                **self.counters,
+            }
+
+    def token(self, installation_id: int) -> str:
+        """A token for installation_id valid for at least GITHUB_APP_TOKEN_MARGIN seconds"""
+        cached = self.cached_token(installation_id)
+        if cached:
+            return cached
+        with self._mint_locks[installation_id]:
+            # Another thread may have minted it while we waited
+            cached = self.cached_token(installation_id)
+            if cached:
+                return cached
+            token, expires_at = self._mint(installation_id)
+            with self._lock:
+                self._tokens[installation_id] = (token, expires_at)
+                self.counters["tokens_minted"] += 1
+            logger.info(
+                "Minted token for installation %s (expires in %.0fs)",
+                installation_id,
+                expires_at - time.time(),
+            )
+            return token
+
+    def invalidate(self, installation_id: int):
+        """Forget the cached token, e.g. after GitHub rejected it"""
+        with self._lock:
+            self._tokens.pop(installation_id, None)
+
+    def remember(self, repo_full_name: str, installation_id: int):
+        """Record which installation covers a repository (from a webhook payload)"""
+        with self._lock:
+            self._installations[repo_full_name.lower()] = int(installation_id)
+
+    def installation_for(self, repo_full_name: str) -> int:
+        """Installation id covering repo_full_name, looked up once if not yet known"""
+        installation_id = self.cached_installation(repo_full_name)
+        if installation_id is not None:
+            return installation_id
+
+        status, data = self._request("GET", f"/repos/{repo_full_name}/installation")
+        if status != 200 or "id" not in data:
+            raise GitHubAppError(f"App is not installed on {repo_full_name} ({status})")
+        with self._lock:
+            self._installations[repo_full_name.lower()] = int(data["id"])
+            self.counters["installation_lookups"] += 1
+        return int(data["id"])
+
+    def cached_installation(self, repo_full_name: str) -> Optional[int]:
+        """Installation id of repo_full_name if already known, without a lookup"""
+        with self._lock:
+            return self._installations.get(repo_full_name.lower())
+
+    def auth(self, installation_id: int) -> "InstallationAuth":
+        return InstallationAuth(self, installation_id)
+
+    def jwt(self) -> str:
+        """App JWT, reused until shortly before it expires"""
+        token, expires_at = self._jwt
+        now = time.time()
+        if token and expires_at - now > JWT_CLOCK_SKEW:
+            return token
+
+        import jwt
+
+        issued = int(now) - JWT_CLOCK_SKEW
+        payload = {"iat": issued, "exp": issued + JWT_LIFETIME, "iss": str(self.app_id)}
+        token = jwt.encode(payload, self.private_key, algorithm="RS256")
+        self._jwt = (token, float(issued + JWT_LIFETIME))
+        return token
+
+    def cached_token(self, installation_id: int) -> Optional[str]:
+        """The cached token if it is still good, without minting (never blocks on I/O)"""
+        with self._lock:
+            cached = self._tokens.get(installation_id)
+            if cached and cached[1] - time.time() > self.refresh_margin:
+                self.counters["token_hits"] += 1
+                return cached[0]
+        return None
+
+    def _mint(self, installation_id: int) -> Tuple[str, float]:
+        status, data = self._request("POST", f"/app/installations/{installation_id}/access_tokens")
+        if status != 201 or "token" not in data:
+            raise GitHubAppError(
+                f"Could not mint a token for installation {installation_id} ({status}): {data.get('message')}"
+            )
+        expires_at = datetime.fromisoformat(data["expires_at"].replace("Z", "+00:00")).timestamp()
+        return data["token"], expires_at
+
+    def _request(self, method: str, path: str) -> Tuple[int, Dict[str, Any]]:
+        """App-authenticated (JWT) request; these do not count against installation budgets"""
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+        response = self._session.request(
+            method,
+            self.base_url + path,
+            headers={
+                "Authorization": f"Bearer {self.jwt()}",
+                "Accept": "application/vnd.github+json",
+            },
+            timeout=15,
+        )
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        return response.status_code, data if isinstance(data, dict) else {}
+
+
+class InstallationAuth(Auth):
+    """PyGithub auth that sends a current installation token with every request"""
+
+    def __init__(self, app: GitHubApp, installation_id: int):
+        self.app = app
+        self.installation_id = installation_id
+
+    @property
+    def token_type(self) -> str:
+        return "token"
+
+    @property
+    def token(self) -> str:
+        return self.app.token(self.installation_id)
+
+
+# Global instance
+github_app = GitHubApp()
@@ -0,0 +1,325 @@
+import os
+import atexit
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlencode, urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+def _key_path(key: str) -> str:
+    """The resource path of a cache key, without its query string"""
+    return key.split("?")[0]
+
+
+class CachedResponse:
+    __slots__ = ("headers", "data", "stored_at")
+
+    def __init__(self, headers: Dict[str, Any], data: Any, stored_at: float):
+        self.headers = headers
+        self.data = data
+        self.stored_at = stored_at
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get("etag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.headers.get("last-modified")
+
+
+class ResponseCache:
+    """ETag/Last-Modified cache for GitHub GET requests
+
+    Entries younger than the TTL are served without any request. Older
+    entries are revalidated with If-None-Match / If-Modified-Since, and
+    GitHub answers those with a 304 that does not count against the rate
+    limit. Writes to a URL drop the cached reads of that resource. The
+    in-memory LRU can be backed by a SQLite file that survives restarts;
+    with GITHUB_CACHE_FLUSH_MS > 0 its inserts and deletes are queued and
+    written by a background thread in one transaction per interval.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        path: Optional[str] = None,
+    ):
+        self.max_size = max_size if max_size is not None else int(os.getenv("GITHUB_CACHE_SIZE", "1024"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("GITHUB_CACHE_TTL", "60"))
+        path = path if path is not None else os.getenv("GITHUB_CACHE_PATH", "")
+        self.flush_interval_ms = int(os.getenv("GITHUB_CACHE_FLUSH_MS", "1000"))
+
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        # Path (without query) -> cached keys, and path -> paths cached below
+        # it, so a write finds the reads it affects without scanning them all
+        self._by_path: Dict[str, Set[str]] = {}
+        self._below: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "revalidated": 0, "misses": 0, "invalidations": 0}
+
+        # SQLite statements waiting for the flusher, in the order they were made
+        self._writes: List[Tuple[str, tuple]] = []
+        # (invalidated paths, their parents) of queued DELETEs and of the ones
+        # being written, so reads do not return rows that are about to go
+        self._deletes: Tuple[Set[str], Set[str]] = (set(), set())
+        self._flushing: Tuple[Set[str], Set[str]] = (set(), set())
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._db = None
+        self._writer = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS github_cache ("
+                "key TEXT PRIMARY KEY, headers TEXT NOT NULL, data TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, key_path TEXT)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(github_cache)")}
+            if "key_path" not in columns:
+                # Cache files written before key_path existed
+                self._db.execute("ALTER TABLE github_cache ADD COLUMN key_path TEXT")
+                self._db.executemany(
+                    "UPDATE github_cache SET key_path = ? WHERE key = ?",
+                    [(_key_path(key), key) for (key,) in self._db.execute("SELECT key FROM github_cache")],
+                )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_github_cache_key_path ON github_cache (key_path)")
+            self._db.commit()
+            # The flusher writes on its own connection so reads never wait for it
+            self._writer = sqlite3.connect(path, check_same_thread=False)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._entries), **self.counters}
+
+    def wrap(self, request: Callable) -> Callable:
+        """Wrap a PyGithub requestJsonAndCheck so GETs go through the cache"""
+
+        def cached(verb, url, parameters=None, headers=None, input=None):
+            if not self.enabled:
+                return request(verb, url, parameters, headers, input)
+            if verb != "GET":
+                # GraphQL queries are POSTs as well, but this bot only reads through them
+                if not _key_path(self._path(url)).endswith("/graphql"):
+                    self.invalidate(url)
+                return request(verb, url, parameters, headers, input)
+            return self._get(request, url, parameters, headers)
+
+        return cached
+
+    def _get(self, request: Callable, url: str, parameters, headers):
+        key = self._key(url, parameters)
+        entry = self.get(key)
+
+        if entry is not None and time.time() - entry.stored_at < self.ttl:
+            with self._lock:
+                self.counters["hits"] += 1
+            return entry.headers, entry.data
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if entry.etag:
+                request_headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request_headers["If-Modified-Since"] = entry.last_modified
+
+        response_headers, data = request("GET", url, parameters, request_headers, None)
+
+        if entry is not None and data is None:
+            # 304 Not Modified: the body is empty, reuse the cached one
+            with self._lock:
+                self.counters["revalidated"] += 1
+            self.put(key, entry.headers, entry.data)
+            return entry.headers, entry.data
+
+        with self._lock:
+            self.counters["misses"] += 1
+        normalized = {name.lower(): value for name, value in response_headers.items()}
+        if "etag" in normalized or "last-modified" in normalized:
+            self.put(key, normalized, data)
+        return response_headers, data
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            if self._db is None or self._deleted(_key_path(key)):
+                return None
+            row = self._db.execute(
+                "SELECT headers, data, stored_at FROM github_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = CachedResponse(json.loads(row[0]), json.loads(row[1]), row[2])
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, headers: Dict[str, Any], data: Any):
+        entry = CachedResponse(headers, data, time.time())
+        self._remember(key, entry)
+        if self._db is not None:
+            try:
+                row = (key, json.dumps(headers), json.dumps(data), entry.stored_at, _key_path(key))
+            except (TypeError, ValueError) as e:
+                logger.warning("Failed to persist GitHub cache entry: %s", e)
+                return
+            self._queue(
+                "INSERT OR REPLACE INTO github_cache (key, headers, data, stored_at, key_path) "
+                "VALUES (?, ?, ?, ?, ?)",
+                row,
+            )
+
+    def invalidate(self, url: str):
+        """Drop cached reads affected by a write to url
+
+        That is the resource itself, everything below it, and its parents
+        (e.g. adding labels changes the issue and the issue listings).
+        """
+        path = _key_path(self._path(url))
+        segments = path.split("/")
+        parents = ["/".join(segments[:end]) for end in range(2, len(segments))]
+
+        with self._lock:
+            paths = [path, *parents, *self._below.get(path, ())]
+            stale = [key for key_path in paths for key in self._by_path.get(key_path, ())]
+            for key in stale:
+                self._forget(key)
+            self.counters["invalidations"] += len(stale)
+            if self._db is None:
+                return
+            self._deletes[0].add(path)
+            self._deletes[1].update(parents)
+        # Below path is the key_path range [path + "/", path + "0"): "0" follows "/"
+        self._queue(
+            "DELETE FROM github_cache WHERE key_path = ? OR (key_path >= ? AND key_path < ?) "
+            f"OR key_path IN ({', '.join('?' * len(parents)) or 'NULL'})",
+            (path, path + "/", path + "0", *parents),
+        )
+
+    def clear(self):
+        with self._flush_lock, self._lock:
+            self._entries.clear()
+            self._by_path.clear()
+            self._below.clear()
+            self._writes.clear()
+            self._deletes = (set(), set())
+            if self._db is not None:
+                self._db.execute("DELETE FROM github_cache")
+                self._db.commit()
+
+    def flush(self) -> int:
+        """Write the queued SQLite statements in one transaction; returns how many"""
+        with self._flush_lock:
+            with self._lock:
+                writes, self._writes = self._writes, []
+                self._flushing, self._deletes = self._deletes, (set(), set())
+            if not writes:
+                return 0
+            try:
+                with self._writer:
+                    for statement, params in writes:
+                        self._writer.execute(statement, params)
+            except sqlite3.Error as e:
+                logger.warning("Failed to persist %s GitHub cache writes: %s", len(writes), e)
+            with self._lock:
+                self._flushing = (set(), set())
+            return len(writes)
+
+    def stop(self):
+        """Stop the flusher and write out anything still queued"""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=5)
+        self.flush()
+
+    def _queue(self, statement: str, params: tuple):
+        with self._lock:
+            self._writes.append((statement, params))
+            start = self._thread is None and self.flush_interval_ms > 0
+            if start:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="github-cache-flusher", daemon=True)
+                self._thread.start()
+        if start:
+            atexit.register(self.stop)
+        elif self.flush_interval_ms <= 0:
+            self.flush()
+
+    def _run(self):
+        interval = self.flush_interval_ms / 1000.0
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("GitHub cache flusher error: %s", e)
+
+    def _deleted(self, path: str) -> bool:
+        """Whether a queued DELETE covers cache keys of path (call under the lock)"""
+        segments = path.split("/")
+        prefixes = ["/".join(segments[:end]) for end in range(2, len(segments) + 1)]
+        return any(
+            path in parents or any(prefix in paths for prefix in prefixes)
+            for paths, parents in (self._deletes, self._flushing)
+            if paths
+        )
+
+    def _remember(self, key: str, entry: CachedResponse):
+        with self._lock:
+            if key not in self._entries:
+                path = _key_path(key)
+                self._by_path.setdefault(path, set()).add(key)
+                segments = path.split("/")
+                for end in range(2, len(segments)):
+                    self._below.setdefault("/".join(segments[:end]), set()).add(path)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._forget(next(iter(self._entries)))
+
+    def _forget(self, key: str):
+        """Drop an in-memory entry and its index entries (caller holds the lock)"""
+        del self._entries[key]
+        path = _key_path(key)
+        keys = self._by_path[path]
+        keys.discard(key)
+        if keys:
+            return
+        del self._by_path[path]
+        segments = path.split("/")
+        for end in range(2, len(segments)):
+            ancestor = "/".join(segments[:end])
+            below = self._below[ancestor]
+            below.discard(path)
+            if not below:
+                del self._below[ancestor]
+
+    @staticmethod
+    def _path(url: str) -> str:
+        # PyGithub mixes relative paths and absolute API URLs for the same resource
+        parts = urlsplit(url)
+        path = parts.path.rstrip("/")
+        return f"{path}?{parts.query}" if parts.query else path
+
+    def _key(self, url: str, parameters: Optional[Dict[str, Any]]) -> str:
+        key = self._path(url)
+        if parameters:
+            query = urlencode(sorted(parameters.items()))
+            key = f"{key}&{query}" if "?" in key else f"{key}?{query}"
+        return key
@@ -1,77 +1,949 @@
 import os
+import re
+import time
+import random
 import logging
-from github import Github
-from typing import Optional
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from github_cache import ResponseCache
+from metrics import metrics, GITHUB_REQUEST_ERRORS, GITHUB_REQUEST_SECONDS
+from tracing import tracer
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+# PyGithub (and requests/jwt beneath it) is imported on first use, which
+# keeps it off the worker boot path
+if TYPE_CHECKING:
+    from github import Github, GithubException
+    from github.Auth import Auth
+    from github.Issue import Issue
 
 logger = logging.getLogger(__name__)
 
+# Request priority classes; interactive webhook work always goes first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_request_priority = contextvars.ContextVar("github_request_priority", default=INTERACTIVE)
+
+# Methods that are safe to send again after a 5xx: GitHub may have applied
+# a POST before failing, and a second comment would be posted. This
+# client's PATCHes set absolute values (labels, assignees, state)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+# Issues per GraphQL query when fetching states in bulk
+ISSUE_STATE_PAGE_SIZE = 100
+
+DEFAULT_API_URL = "https://api.github.com"
+
+# Collapse repository names and ids so metric labels stay low-cardinality
+_REPO_PATH_RE = re.compile(r"^(?:/api/v3)?/repos/[^/]+/[^/]+")
+_LABEL_NAME_RE = re.compile(r"/labels/[^/]+$")
+_NUMERIC_ID_RE = re.compile(r"/\d+(?=/|$)")
+
+# X-RateLimit-Resource of REST calls; GraphQL and search have budgets of their own
+CORE = "core"
+_SEARCH_PATH_RE = re.compile(r"^(?:/api/v3)?/search/")
+
+
+def _endpoint(url: str) -> str:
+    """Templated API path of a request URL, e.g. /repos/{repo}/issues/{id}"""
+    path = _REPO_PATH_RE.sub("/repos/{repo}", urlsplit(url).path)
+    path = _LABEL_NAME_RE.sub("/labels/{name}", path)
+    return _NUMERIC_ID_RE.sub("/{id}", path)
+
+
+def _rate_limit_resource(url: str) -> str:
+    """The rate limit resource a request to url is charged to"""
+    path = urlsplit(url).path
+    if path.endswith("/graphql"):
+        return "graphql"
+    if _SEARCH_PATH_RE.match(path):
+        return "search"
+    return CORE
+
+
+def _instrumented(request: Callable) -> Callable:
+    """Wrap a PyGithub requestJsonAndCheck to record latency and errors per attempt"""
+
+    from github import GithubException
+
+    def timed(verb, url, parameters=None, headers=None, input=None):
+        endpoint = _endpoint(url)
+        start = time.perf_counter()
+        try:
+            with tracer.span(f"github {verb} {endpoint}"):
+                return request(verb, url, parameters, headers, input)
+        except GithubException as e:
+            GITHUB_REQUEST_ERRORS.inc(method=verb, endpoint=endpoint, status=e.status)
+            raise
+        except Exception:
+            GITHUB_REQUEST_ERRORS.inc(method=verb, endpoint=endpoint, status="exception")
+            raise
+        finally:
+            GITHUB_REQUEST_SECONDS.observe(time.perf_counter() - start, method=verb, endpoint=endpoint)
+
+    return timed
+
+
+def _reauthenticating(request: Callable, app, installation_id: int) -> Callable:
+    """Retry once with a fresh installation token when GitHub answers 401"""
+    from github import GithubException
+
+    def call(verb, url, parameters=None, headers=None, input=None):
+        try:
+            return request(verb, url, parameters, headers, input)
+        except GithubException as e:
+            if e.status != 401:
+                raise
+            # Revoked early, or our clock is off; the next token() call mints a new one
+            app.invalidate(installation_id)
+            return request(verb, url, parameters, headers, input)
+
+    return call
+
+
+class RateLimitWaitTooLong(Exception):
+    """Raised when a request would have to wait longer than allowed for rate limit budget"""
+
+
+class _Budget:
+    """Known budget and token bucket of one rate limit resource"""
+
+    def __init__(self, tokens: float):
+        self.remaining: Optional[int] = None
+        self.limit: Optional[int] = None
+        self.reset_at = 0.0
+        self.tokens = tokens
+        self.refilled_at = time.time()
+
+
+class RequestScheduler:
+    """Central gate for every GitHub API request
+
+    Budget comes from the X-RateLimit-Remaining/Reset headers of previous
+    responses, kept per X-RateLimit-Resource: GraphQL and search are
+    counted apart from the REST (core) budget. Background requests are
+    paced by a token bucket that spreads the remaining budget over the time
+    left until reset. They stop entirely once the budget drops to the
+    reserve kept for interactive work. A spent budget pauses requests of its
+    resource until the reset time; Retry-After and secondary rate limit
+    responses pause all requests. 5xx responses are retried with
+    exponential backoff unless the request was a POST (GraphQL queries
+    aside), which GitHub may have applied before failing.
+    """
+
+    def __init__(self):
+        self.burst = int(os.getenv("GITHUB_RATE_BURST", "10"))
+        self.background_reserve = float(os.getenv("GITHUB_BACKGROUND_RESERVE", "0.2"))
+        self.max_retries = int(os.getenv("GITHUB_MAX_RETRIES", "3"))
+        self.max_wait = float(os.getenv("GITHUB_MAX_WAIT", "30"))
+        self.background_max_wait = float(os.getenv("GITHUB_BACKGROUND_MAX_WAIT", "3600"))
+
+        self._cond = threading.Condition()
+        self._budgets: Dict[str, _Budget] = {CORE: _Budget(float(self.burst))}
+        self._blocked_until = 0.0
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.counters = {
+            "requests": 0,
+            "interactive_requests": 0,
+            "background_requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "throttled_seconds": 0.0,
+        }
+
+    @contextmanager
+    def priority(self, priority: int):
+        """Run the enclosed GitHub calls with the given priority class"""
+        token = _request_priority.set(priority)
+        try:
+            yield
+        finally:
+            _request_priority.reset(token)
+
+    @property
+    def remaining(self) -> Optional[int]:
+        """Requests left in the REST (core) window, if known"""
+        return self._budgets[CORE].remaining
+
+    @property
+    def limit(self) -> Optional[int]:
+        return self._budgets[CORE].limit
+
+    @property
+    def reset_at(self) -> float:
+        return self._budgets[CORE].reset_at
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the known budget and request counters"""
+        with self._cond:
+            core = self._budgets[CORE]
+            return {
+                "remaining": core.remaining,
+                "limit": core.limit,
+                "reset_at": core.reset_at,
+                "blocked_until": self._blocked_until,
+                "tokens": round(core.tokens, 2),
+                "waiting_interactive": self._waiting[INTERACTIVE],
+                "waiting_background": self._waiting[BACKGROUND],
+                "resources": {
+                    resource: {"remaining": budget.remaining, "limit": budget.limit, "reset_at": budget.reset_at}
+                    for resource, budget in self._budgets.items()
+                },
+                **self.counters,
+            }
+
+    def wrap(self, request: Callable) -> Callable:
+        """Wrap a PyGithub requestJsonAndCheck so every call is scheduled"""
+
+        def scheduled(verb, url, *args, **kwargs):
+            return self.execute(lambda: request(verb, url, *args, **kwargs), verb, _rate_limit_resource(url))
+
+        return scheduled
+
+    def execute(self, call: Callable, verb: str, resource: str = CORE):
+        """Run one request once budget allows, retrying rate limits and 5xx (idempotent verbs only)
+
+        call() returns (headers, data) as requestJsonAndCheck does or raises
+        GithubException; the headers update the budget of resource either way.
+        """
+        from github import GithubException
+
+        priority = _request_priority.get()
+        max_wait = self.max_wait if priority == INTERACTIVE else self.background_max_wait
+        attempt = 0
+
+        while True:
+            self._acquire(priority, max_wait, resource)
+            try:
+                headers, data = call()
+            except GithubException as e:
+                self.observe(e.headers, resource)
+                delay = self._retry_delay(e, attempt, verb, resource)
+                if delay is None or attempt >= self.max_retries:
+                    raise
+                if delay > max_wait:
+                    raise RateLimitWaitTooLong(
+                        f"GitHub asked us to wait {delay:.0f}s (limit {max_wait:.0f}s)"
+                    ) from e
+                attempt += 1
+                with self._cond:
+                    self.counters["retries"] += 1
+                logger.warning(
+                    "GitHub request failed with %s, retry %s in %.1fs", e.status, attempt, delay
+                )
+                time.sleep(delay)
+                continue
+
+            self.observe(headers, resource)
+            return headers, data
+
+    async def execute_async(self, call: Callable[[], Awaitable], verb: str, resource: str = CORE):
+        """Coroutine version of execute(): waits and retries without blocking the loop
+
+        call() returns (headers, data) or raises GithubException carrying
+        the response headers, which update the budget either way.
+        """
+        import asyncio
+        from github import GithubException
+
+        priority = _request_priority.get()
+        max_wait = self.max_wait if priority == INTERACTIVE else self.background_max_wait
+        attempt = 0
+
+        while True:
+            await self._acquire_async(priority, max_wait, resource)
+            try:
+                headers, data = await call()
+            except GithubException as e:
+                self.observe(e.headers, resource)
+                delay = self._retry_delay(e, attempt, verb, resource)
+                if delay is None or attempt >= self.max_retries:
+                    raise
+                if delay > max_wait:
+                    raise RateLimitWaitTooLong(
+                        f"GitHub asked us to wait {delay:.0f}s (limit {max_wait:.0f}s)"
+                    ) from e
+                attempt += 1
+                with self._cond:
+                    self.counters["retries"] += 1
+                logger.warning(
+                    "GitHub request failed with %s, retry %s in %.1fs", e.status, attempt, delay
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            self.observe(headers, resource)
+            return headers, data
+
+    def _acquire(self, priority: int, max_wait: float, resource: str):
+        deadline = time.time() + max_wait
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    wait = self._take(priority, deadline, resource)
+                    if wait <= 0:
+                        return
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[priority] -= 1
+
+    async def _acquire_async(self, priority: int, max_wait: float, resource: str):
+        import asyncio
+
+        deadline = time.time() + max_wait
+        with self._cond:
+            self._waiting[priority] += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._take(priority, deadline, resource)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self._waiting[priority] -= 1
+
+    def _budget(self, resource: str) -> _Budget:
+        """The budget of resource, created on first use (caller holds the lock)"""
+        budget = self._budgets.get(resource)
+        if budget is None:
+            budget = self._budgets[resource] = _Budget(float(self.burst))
+        return budget
+
+    def _take(self, priority: int, deadline: float, resource: str) -> float:
+        """Use one request of budget, or return how long to wait first (caller holds the lock)"""
+        now = time.time()
+        budget = self._budget(resource)
+        wait = self._wait_time(priority, now, budget)
+        if wait > 0:
+            if now + wait > deadline:
+                raise RateLimitWaitTooLong(f"GitHub rate limit budget unavailable for {wait:.0f}s")
+            self.counters["throttled_seconds"] += min(wait, 1.0)
+            return min(wait, 1.0)
+
+        budget.tokens -= 1
+        if budget.remaining is not None:
+            # Local estimate until the response headers arrive
+            budget.remaining = max(budget.remaining - 1, 0)
+        self.counters["requests"] += 1
+        key = "interactive_requests" if priority == INTERACTIVE else "background_requests"
+        self.counters[key] += 1
+        return 0.0
+
+    def _wait_time(self, priority: int, now: float, budget: _Budget) -> float:
+        """Seconds until a request of this priority may be sent (caller holds the lock)"""
+        if self._blocked_until > now:
+            return self._blocked_until - now
+
+        window = max(budget.reset_at - now, 1.0)
+        if budget.remaining is not None and budget.reset_at <= now:
+            # The window has reset; the next response will tell us the new budget
+            budget.remaining = None
+
+        if budget.remaining == 0:
+            return window
+
+        # Refill the bucket so the remaining budget is spread until reset
+        rate = budget.remaining / window if budget.remaining is not None else float(self.burst)
+        budget.tokens = min(float(self.burst), budget.tokens + (now - budget.refilled_at) * rate)
+        budget.refilled_at = now
+
+        if priority == INTERACTIVE:
+            return 0.0
+
+        if self._waiting[INTERACTIVE]:
+            return 0.05
+        if (
+            budget.remaining is not None
+            and budget.limit
+            and budget.remaining <= budget.limit * self.background_reserve
+        ):
+            return window
+        if budget.tokens >= 1:
+            return 0.0
+        return (1 - budget.tokens) / max(rate, 1e-6)
+
+    def observe(self, headers: Optional[Dict[str, Any]], resource: str = CORE):
+        """Refresh the budget from raw X-RateLimit-* response headers
+
+        X-RateLimit-Resource, when GitHub sends it, names the budget the
+        headers describe; otherwise they are taken to be resource's.
+        """
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        if "x-ratelimit-remaining" not in headers or "x-ratelimit-limit" not in headers:
+            return
+        with self._cond:
+            budget = self._budget(headers.get("x-ratelimit-resource") or resource)
+            # ints expected but sometimes floats returned, as PyGithub notes
+            limit = int(float(headers["x-ratelimit-limit"]))
+            if limit >= 0:
+                budget.remaining, budget.limit = int(float(headers["x-ratelimit-remaining"])), limit
+            reset_at = float(headers.get("x-ratelimit-reset") or 0)
+            if reset_at:
+                budget.reset_at = reset_at
+            self._cond.notify_all()
+
+    def _retry_delay(
+        self, error: "GithubException", attempt: int, verb: str, resource: str = CORE
+    ) -> Optional[float]:
+        """Seconds to wait before retrying error, or None if it should not be retried
+
+        A primary rate limit only spends the budget of its own resource, so
+        it pauses that resource; Retry-After and secondary limits pause all.
+        """
+        from github import RateLimitExceededException
+
+        headers = {key.lower(): value for key, value in (error.headers or {}).items()}
+        now = time.time()
+        message = str(error.data).lower()
+
+        rate_limited = (
+            isinstance(error, RateLimitExceededException)
+            or error.status == 429
+            or (error.status == 403 and ("retry-after" in headers or "rate limit" in message))
+        )
+        if rate_limited:
+            primary = headers.get("x-ratelimit-remaining") == "0" and "x-ratelimit-reset" in headers
+            if primary and "retry-after" not in headers:
+                # Spent budget of one resource: it waits for its own reset
+                reset_at = float(headers["x-ratelimit-reset"])
+                with self._cond:
+                    self.counters["rate_limited"] += 1
+                    budget = self._budget(headers.get("x-ratelimit-resource") or resource)
+                    budget.remaining, budget.reset_at = 0, reset_at
+                return max(reset_at - now + 1, 1.0)
+
+            if "retry-after" in headers:
+                delay = float(headers["retry-after"])
+            else:
+                # Secondary limit without guidance: GitHub asks for at least a minute
+                delay = 60.0 * (2 ** attempt)
+            delay = max(delay, 1.0)
+            with self._cond:
+                self.counters["rate_limited"] += 1
+                self._blocked_until = max(self._blocked_until, now + delay)
+            return delay
+
+        if error.status >= 500:
+            with self._cond:
+                self.counters["server_errors"] += 1
+            # GraphQL goes out as POST, but this bot only sends queries there
+            if verb not in IDEMPOTENT_METHODS and resource != "graphql":
+                return None
+            return min(2 ** attempt, 30) + random.uniform(0, 1)
+
+        return None
+
+
+class IssueBatch:
+    """Accumulates mutations for one issue and applies them in as few requests as possible
+
+    When the issue's current labels and assignees are known (e.g. from the
+    webhook payload) labels, assignees and state go out as a single PATCH.
+    Otherwise labels and assignees are added with their own POST. No GET is
+    ever issued.
+    """
+
+    def __init__(
+        self,
+        client: "GitHubClient",
+        repo_full_name: str,
+        issue_number: int,
+        current_labels: Optional[Iterable[str]] = None,
+        current_assignees: Optional[Iterable[str]] = None,
+        durable: bool = True,
+    ):
+        self.client = client
+        # With OUTBOX_ENABLED, flush() records the writes for the outbox dispatcher
+        self.durable = durable
+        self.repo_full_name = repo_full_name
+        self.issue_number = issue_number
+        self.current_labels = list(current_labels) if current_labels is not None else None
+        self.current_assignees = (
+            list(current_assignees) if current_assignees is not None else None
+        )
+        self.labels: List[str] = []
+        self.assignees: List[str] = []
+        self.comments: List[str] = []
+        self.state: Optional[str] = None
+        # Requests of the last flush that succeeded (1 once recorded in the
+        # outbox), so callers can tell a partial failure from a total one
+        self.applied = 0
+
+    def add_labels(self, labels: Iterable[str]) -> "IssueBatch":
+        self.labels.extend(label for label in labels if label not in self.labels)
+        return self
+
+    def add_assignees(self, assignees: Iterable[str]) -> "IssueBatch":
+        self.assignees.extend(user for user in assignees if user not in self.assignees)
+        return self
+
+    def add_comment(self, comment: str) -> "IssueBatch":
+        self.comments.append(comment)
+        return self
+
+    def close(self) -> "IssueBatch":
+        self.state = "closed"
+        return self
+
+    def is_empty(self) -> bool:
+        return not (self.labels or self.assignees or self.comments or self.state)
+
+    def _plan(self):
+        """The PATCH fields, and whether labels/assignees need their own POST"""
+        edit = {}
+        if self.state:
+            edit["state"] = self.state
+        if self.labels and self.current_labels is not None:
+            edit["labels"] = list(dict.fromkeys(self.current_labels + self.labels))
+        if self.assignees and self.current_assignees is not None:
+            edit["assignees"] = list(dict.fromkeys(self.current_assignees + self.assignees))
+
+        labels_pending = bool(self.labels) and "labels" not in edit
+        assignees_pending = bool(self.assignees) and "assignees" not in edit
+        return edit, labels_pending, assignees_pending
+
+    def _reset(self):
+        self.labels, self.assignees, self.comments, self.state = [], [], [], None
+
+    def flush(self) -> bool:
+        """Send all pending mutations; returns True if every request succeeded"""
+        from github import GithubException
+
+        if self.is_empty():
+            return True
+
+        where = f"issue #{self.issue_number} in {self.repo_full_name}"
+        self.applied = 0
+        if self.durable and self._defer(where):
+            self.applied = 1
+            return True
+
+        try:
+            issue = self.client.get_lazy_issue(self.repo_full_name, self.issue_number)
+        except Exception as e:
+            logger.error("Failed to prepare mutations for %s: %s", where, e)
+            return False
+
+        ok = True
+
+        # Comments go first so a closing comment precedes the state change
+        for comment in self.comments:
+            try:
+                issue.create_comment(comment)
+                logger.info("Added comment to %s", where)
+                self.applied += 1
+            except Exception as e:
+                logger.error("Failed to add comment to issue: %s", e)
+                ok = False
+
+        edit, labels_pending, assignees_pending = self._plan()
+
+        if edit:
+            try:
+                issue.edit(**edit)
+                logger.info("Updated %s on %s", sorted(edit), where)
+                self.applied += 1
+            except GithubException as e:
+                if "assignees" not in edit:
+                    logger.error("Failed to update issue: %s", e)
+                    ok = False
+                else:
+                    # An unassignable user rejects the whole PATCH; retry the
+                    # rest without it and add assignees separately below
+                    logger.warning("Combined update failed for %s, retrying: %s", where, e)
+                    del edit["assignees"]
+                    assignees_pending = True
+                    if edit:
+                        try:
+                            issue.edit(**edit)
+                            self.applied += 1
+                        except Exception as e:
+                            logger.error("Failed to update issue: %s", e)
+                            ok = False
+            except Exception as e:
+                logger.error("Failed to update issue: %s", e)
+                ok = False
+
+        if labels_pending:
+            try:
+                issue.add_to_labels(*self.labels)
+                logger.info("Added labels %s to %s", self.labels, where)
+                self.applied += 1
+            except Exception as e:
+                logger.error("Failed to add labels to issue: %s", e)
+                ok = False
+
+        if assignees_pending:
+            try:
+                issue.add_to_assignees(*self.assignees)
+                logger.info("Assigned %s to %s", self.assignees, where)
+                self.applied += 1
+            except Exception as e:
+                logger.error("Failed to assign users to issue: %s", e)
+                ok = False
+
+        self._reset()
+        return ok
+
+    def _defer(self, where: str) -> bool:
+        """Hand the writes to the outbox if it is enabled; False to send them now"""
+        from outbox import outbox
+
+        if not outbox.enabled:
+            return False
+        try:
+            outbox.enqueue(
+                self.repo_full_name, self.issue_number, self.labels, self.assignees, self.comments, self.state
+            )
+        except Exception as e:
+            logger.error("Could not record writes for %s in the outbox, sending now: %s", where, e)
+            return False
+        logger.info("Recorded writes for %s in the outbox", where)
+        self._reset()
+        return True
+
+    async def flush_async(self) -> bool:
+        """Like flush(), but independent requests are in flight at the same time
+
+        Comments, the PATCH and any separate label/assignee POSTs touch
+        different parts of the issue and go out concurrently. Only a state
+        change waits for the comments, so a closing comment still comes first.
+        """
+        import asyncio
+        from github import GithubException
+
+        if self.is_empty():
+            return True
+
+        where = f"issue #{self.issue_number} in {self.repo_full_name}"
+        self.applied = 0
+        issue = self.client.async_issue(self.repo_full_name, self.issue_number)
+        edit, labels_pending, assignees_pending = self._plan()
+        labels, assignees, comments = self.labels, self.assignees, self.comments
+        self._reset()
+
+        async def comment() -> bool:
+            ok = True
+            # One after another, so they appear on the issue in order
+            for body in comments:
+                try:
+                    await issue.create_comment(body)
+                    logger.info("Added comment to %s", where)
+                    self.applied += 1
+                except Exception as e:
+                    logger.error("Failed to add comment to issue: %s", e)
+                    ok = False
+            return ok
+
+        async def add_labels() -> bool:
+            try:
+                await issue.add_to_labels(*labels)
+                logger.info("Added labels %s to %s", labels, where)
+                self.applied += 1
+                return True
+            except Exception as e:
+                logger.error("Failed to add labels to issue: %s", e)
+                return False
+
+        async def add_assignees() -> bool:
+            try:
+                await issue.add_to_assignees(*assignees)
+                logger.info("Assigned %s to %s", assignees, where)
+                self.applied += 1
+                return True
+            except Exception as e:
+                logger.error("Failed to assign users to issue: %s", e)
+                return False
+
+        async def update(after: Optional[Awaitable[bool]] = None) -> bool:
+            ok = await after if after is not None else True
+            try:
+                await issue.edit(**edit)
+                logger.info("Updated %s on %s", sorted(edit), where)
+                self.applied += 1
+                return ok
+            except GithubException as e:
+                if "assignees" not in edit:
+                    logger.error("Failed to update issue: %s", e)
+                    return False
+                # Same fallback as flush(): drop assignees and add them by POST
+                logger.warning("Combined update failed for %s, retrying: %s", where, e)
+                del edit["assignees"]
+                retried = [add_assignees()]
+                if edit:
+                    retried.append(update())
+                return all(await asyncio.gather(*retried)) and ok
+            except Exception as e:
+                logger.error("Failed to update issue: %s", e)
+                return False
+
+        pending = []
+        if "state" in edit:
+            pending.append(update(after=comment()))
+        else:
+            if comments:
+                pending.append(comment())
+            if edit:
+                pending.append(update())
+        if labels_pending:
+            pending.append(add_labels())
+        if assignees_pending:
+            pending.append(add_assignees())
+
+        return all(await asyncio.gather(*pending))
+
 class GitHubClient:
     """Wrapper around PyGithub for easier GitHub API interactions"""
 
     def __init__(self):
-        token = os.getenv("GH_APP_TOKEN", os.getenv("GITHUB_TOKEN"))
-        if not token:
-            logger.warning("No GitHub token found. Set GH_APP_TOKEN or GITHUB_TOKEN environment variable.")
-            self.github = None
-        else:
-            self.github = Github(token)
+        self.token = os.getenv("GH_APP_TOKEN", os.getenv("GITHUB_TOKEN"))
+        # With GITHUB_APP_ID set, requests use installation tokens of that
+        # GitHub App instead of the static token (see github_app.py)
+        self.app_id = os.getenv("GITHUB_APP_ID", "")
+        # GitHub Enterprise, or a local fake API for load tests
+        self.base_url = os.getenv("GITHUB_API_URL", DEFAULT_API_URL).rstrip("/")
+        if not self.token and not self.app_id:
+            logger.warning(
+                "No GitHub credentials found. Set GITHUB_APP_ID, GH_APP_TOKEN or GITHUB_TOKEN environment variable."
+            )
+        self.pool_size = max(1, int(os.getenv("GITHUB_APP_POOL_SIZE", "100")))
+        self.scheduler = RequestScheduler()
+        self.cache = ResponseCache()
+        self._github: Optional["Github"] = None
+        # installation id -> (client, its scheduler), least recently used first
+        self._installations: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
 
-    def get_repo(self, full_name: str):
-        """Get repository by full name (owner/repo)"""
+    @property
+    def github(self) -> Optional["Github"]:
+        """PyGithub client for the static token, built on first use (None without a token)"""
+        if self._github is None and self.token:
+            with self._lock:
+                if self._github is None:
+                    from github.Auth import Token
+
+                    self._github = self._connect(Token(self.token), self.scheduler)
+        return self._github
+
+    def _github_for(self, repo_full_name: str) -> "Github":
+        """PyGithub client allowed to act on repo_full_name"""
+        if self.app_id:
+            from github_app import github_app
+
+            return self._installation(github_app.installation_for(repo_full_name))
         if not self.github:
             raise ValueError("GitHub client not initialized - missing token")
-        return self.github.get_repo(full_name)
+        return self.github
+
+    def _installation(self, installation_id: int) -> "Github":
+        """Pooled client of one installation, with its own rate limit scheduler
+
+        Each installation has its own rate limit budget on GitHub, so each
+        gets its own scheduler; a busy organisation then cannot stall the
+        others. Clients keep their HTTP session and are evicted least
+        recently used beyond GITHUB_APP_POOL_SIZE.
+        """
+        return self._installation_entry(installation_id)[0]
+
+    def installation_scheduler(self, installation_id: int, create: bool = True) -> Optional["RequestScheduler"]:
+        """Scheduler of an installation's pooled client; None if not pooled and not create"""
+        if not create:
+            with self._lock:
+                entry = self._installations.get(installation_id)
+            return entry[1] if entry is not None else None
+        return self._installation_entry(installation_id)[1]
+
+    def _installation_entry(self, installation_id: int) -> tuple:
+        with self._lock:
+            entry = self._installations.get(installation_id)
+            if entry is not None:
+                self._installations.move_to_end(installation_id)
+                return entry
+
+            from github_app import github_app
+
+            if not github_app.enabled:
+                raise ValueError("GitHub App not configured - set GITHUB_APP_PRIVATE_KEY(_PATH)")
+            scheduler = RequestScheduler()
+            github = self._connect(github_app.auth(installation_id), scheduler)
+            requester = github._Github__requester
+            requester.requestJsonAndCheck = _reauthenticating(
+                requester.requestJsonAndCheck, github_app, installation_id
+            )
+            entry = self._installations[installation_id] = (github, scheduler)
+            while len(self._installations) > self.pool_size:
+                self._installations.popitem(last=False)
+            return entry
+
+    def _connect(self, auth: "Auth", scheduler: "RequestScheduler") -> "Github":
+        from github import Github
+
+        github = Github(auth=auth, base_url=self.base_url)
+        if self.base_url != DEFAULT_API_URL:
+            logger.info("Using GitHub API at %s", self.base_url)
+        # PyGithub routes every REST call through its requester, so
+        # scheduling there covers pagination and lazy objects as well.
+        # The cache sits outside the scheduler: pure hits use no budget.
+        # Metrics sit inside it, so each attempt on the wire is timed.
+        # A repository belongs to one installation, so the cache is shared.
+        requester = github._Github__requester
+        requester.requestJsonAndCheck = self.cache.wrap(
+            scheduler.wrap(_instrumented(requester.requestJsonAndCheck))
+        )
+        return github
+
+    def remember_installation(self, repo_full_name: str, installation_id: Optional[int]):
+        """Note the App installation of a repository, as sent with its webhooks"""
+        if self.app_id and installation_id:
+            from github_app import github_app
+
+            github_app.remember(repo_full_name, installation_id)
+
+    def schedulers(self) -> List[RequestScheduler]:
+        """The static-token scheduler plus one per pooled installation"""
+        with self._lock:
+            return [self.scheduler] + [scheduler for _, scheduler in self._installations.values()]
+
+    @property
+    def graphql_url(self) -> str:
+        # Enterprise serves REST under /api/v3 but GraphQL at /api/graphql
+        if self.base_url.endswith("/api/v3"):
+            return self.base_url[: -len("/v3")] + "/graphql"
+        return "/graphql"
+
+    def background(self):
+        """Context manager marking the enclosed calls as low-priority background work"""
+        return self.scheduler.priority(BACKGROUND)
+
+    def rate_limit_status(self) -> Dict[str, Any]:
+        """Remaining budget and request counters from the scheduler (and per installation)"""
+        stats = self.scheduler.stats()
+        if self.app_id:
+            with self._lock:
+                installations = list(self._installations.items())
+            stats["installations"] = {
+                installation_id: scheduler.stats() for installation_id, (_, scheduler) in installations
+            }
+        return stats
+
+    def cache_status(self) -> Dict[str, Any]:
+        """Size and hit/revalidation counters of the response cache"""
+        return self.cache.stats()
+
+    def get_repo(self, full_name: str):
+        """Get repository by full name (owner/repo)"""
+        return self._github_for(full_name).get_repo(full_name)
 
     def get_issue(self, repo_full_name: str, issue_number: int):
         """Get specific issue from repository"""
         repo = self.get_repo(repo_full_name)
         return repo.get_issue(number=issue_number)
 
+    def get_lazy_issue(self, repo_full_name: str, issue_number: int) -> "Issue":
+        """Issue handle for writes only; built from its URL without any GET"""
+        from github.Issue import Issue
+
+        repo = self._github_for(repo_full_name).get_repo(repo_full_name, lazy=True)
+        return Issue(
+            repo._requester,
+            {},
+            {"url": f"{repo.url}/issues/{issue_number}", "number": issue_number},
+            completed=False,
+        )
+
+    def async_issue(self, repo_full_name: str, issue_number: int):
+        """Awaitable write handle for an issue, served by the shared async client"""
+        from async_github import async_github
+
+        return async_github.issue(repo_full_name, issue_number)
+
+    def batch(
+        self,
+        repo_full_name: str,
+        issue_number: int,
+        current_labels: Optional[Iterable[str]] = None,
+        current_assignees: Optional[Iterable[str]] = None,
+        durable: bool = True,
+    ) -> IssueBatch:
+        """Start a batch of mutations for an issue, applied by IssueBatch.flush()
+
+        durable=False always sends directly, even with OUTBOX_ENABLED.
+        """
+        return IssueBatch(
+            self, repo_full_name, issue_number, current_labels, current_assignees, durable
+        )
+
     def add_labels_to_issue(self, repo_full_name: str, issue_number: int, labels: list):
         """Add labels to an issue"""
-        try:
-            issue = self.get_issue(repo_full_name, issue_number)
-            if labels:
-                issue.add_to_labels(*labels)
-                logger.info(f"Added labels {labels} to issue #{issue_number} in {repo_full_name}")
-                return True
-        except Exception as e:
-            logger.error(f"Failed to add labels to issue: {e}")
-            return False
+        return self.batch(repo_full_name, issue_number).add_labels(labels).flush()
 
     def assign_users_to_issue(self, repo_full_name: str, issue_number: int, assignees: list):
         """Assign users to an issue"""
-        try:
-            issue = self.get_issue(repo_full_name, issue_number)
-            if assignees:
-                issue.add_to_assignees(*assignees)
-                logger.info(f"Assigned {assignees} to issue #{issue_number} in {repo_full_name}")
-                return True
-        except Exception as e:
-            logger.error(f"Failed to assign users to issue: {e}")
-            return False
+        return self.batch(repo_full_name, issue_number).add_assignees(assignees).flush()
 
     def add_comment_to_issue(self, repo_full_name: str, issue_number: int, comment: str):
         """Add a comment to an issue"""
-        try:
-            issue = self.get_issue(repo_full_name, issue_number)
-            issue.create_comment(comment)
-            logger.info(f"Added comment to issue #{issue_number} in {repo_full_name}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to add comment to issue: {e}")
-            return False
+        return self.batch(repo_full_name, issue_number).add_comment(comment).flush()
 
     def close_issue(self, repo_full_name: str, issue_number: int):
         """Close an issue"""
-        try:
-            issue = self.get_issue(repo_full_name, issue_number)
-            issue.edit(state="closed")
-            logger.info(f"Closed issue #{issue_number} in {repo_full_name}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to close issue: {e}")
-            return False
+        return self.batch(repo_full_name, issue_number).close().flush()
+
+    def get_issue_states(
+        self, repo_full_name: str, issue_numbers: Iterable[int]
+    ) -> Dict[int, Optional[Dict[str, Any]]]:
+        """Fetch state and labels for many issues with one GraphQL query per 100
+
+        Returns {number: {"state": "open"|"closed", "labels": [...]}}, with None
+        for issues that no longer exist (deleted or transferred).
+        """
+        from github import GithubException
+
+        requester = self._github_for(repo_full_name)._Github__requester
+        owner, name = repo_full_name.split("/", 1)
+        numbers = list(dict.fromkeys(issue_numbers))
+        states: Dict[int, Optional[Dict[str, Any]]] = {}
+
+        for start in range(0, len(numbers), ISSUE_STATE_PAGE_SIZE):
+            chunk = numbers[start : start + ISSUE_STATE_PAGE_SIZE]
+            fields = " ".join(
+                f"i{number}: issue(number: {int(number)}) "
+                "{ state labels(first: 100) { nodes { name } } }"
+                for number in chunk
+            )
+            query = (
+                "query($owner: String!, $name: String!) "
+                f"{{ repository(owner: $owner, name: $name) {{ {fields} }} }}"
+            )
+            _, data = requester.requestJsonAndCheck(
+                "POST",
+                self.graphql_url,
+                input={"query": query, "variables": {"owner": owner, "name": name}},
+            )
+            repository = ((data or {}).get("data") or {}).get("repository")
+            if repository is None:
+                raise GithubException(404, data, None)
+
+            for number in chunk:
+                issue = repository.get(f"i{number}")
+                states[number] = (
+                    {
+                        "state": issue["state"].lower(),
+                        "labels": [label["name"] for label in issue["labels"]["nodes"]],
+                    }
+                    if issue
+                    else None
+                )
+
+        return states
 
     def get_open_issues_older_than(self, repo_full_name: str, days: int):
         """Get open issues older than specified days"""
@@ -98,9 +970,18 @@ class GitHubClient:
 
             return old_issues
         except Exception as e:
-            logger.error(f"Failed to get old issues: {e}")
+            logger.error("Failed to get old issues: %s", e)
             return []
 
 
 # Global instance
 github_client = GitHubClient()
+
+metrics.gauge(
+    "triage_github_rate_limit_remaining",
+    "GitHub API requests left in the current rate limit window (lowest installation in App mode)",
+    lambda: min(
+        (scheduler.remaining for scheduler in github_client.schedulers() if scheduler.remaining is not None),
+        default=None,
+    ),
+)
@@ -1,8 +1,6 @@
 import logging
 from github_client import github_client
-from models import IssueActivity
-from app import db
-from datetime import datetime, timezone
+from activity_tracker import activity_tracker
 
 logger = logging.getLogger(__name__)
 
@@ -19,24 +17,10 @@ def handle_comment_event(payload: dict) -> dict:
         issue_number = payload["issue"]["number"]
         comment_body = payload["comment"].get("body", "").strip()
 
-        logger.info(f"Processing comment on issue #{issue_number} in {repo_full_name}")
+        logger.info("Processing comment on issue #%s in %s", issue_number, repo_full_name)
 
         # Update activity tracking
-        try:
-            activity = (
-                db.session.query(IssueActivity)
-                .filter_by(repo_full_name=repo_full_name, issue_number=issue_number)
-                .first()
-            )
-
-            if activity:
-                activity.last_activity = datetime.now(timezone.utc)
-                activity.is_stale = False
-                db.session.commit()
-
-        except Exception as e:
-            logger.error(f"Failed to update issue activity: {e}")
-            db.session.rollback()
+        activity_tracker.touch(repo_full_name, issue_number)
 
         # Process slash commands
         if comment_body.startswith("/"):
@@ -45,7 +29,7 @@ def handle_comment_event(payload: dict) -> dict:
         return {"status": "success", "message": "Comment processed"}
 
     except Exception as e:
-        logger.error(f"Failed to handle comment event: {e}")
+        logger.error("Failed to handle comment event: %s", e)
         return {"status": "error", "message": str(e)}
 
 
@@ -116,5 +100,5 @@ def process_slash_command(repo_full_name: str, issue_number: int, command: str)
             return {"status": "error", "message": f"Unknown command: {cmd}"}
 
     except Exception as e:
-        logger.error(f"Failed to process slash command '{command}': {e}")
+        logger.error("Failed to process slash command '%s': %s", command, e)
         return {"status": "error", "message": str(e)}
@@ -1,80 +1,77 @@
 import logging
 from github_client import github_client
-from rules_manager import rules_manager
-from models import IssueActivity
-from app import db
-from datetime import datetime, timezone
+from async_github import async_github
+from outbox import outbox
+from triage import CHECKLIST_COMMENT, decide
+from activity_tracker import activity_tracker
 
 logger = logging.getLogger(__name__)
 
 
-async def handle_issue_opened(payload: dict) -> dict:
+def triage_issue(payload: dict):
+    """Labels, owners and checklist for a new issue: its pending IssueBatch and the handler result"""
+    # Extract issue information
+    repo_full_name = payload["repository"]["full_name"]
+    issue_number = payload["issue"]["number"]
+    issue_title = payload["issue"].get("title", "")
+    issue_body = payload["issue"].get("body", "")
+
+    logger.info("Processing new issue #%s in %s", issue_number, repo_full_name)
+
+    # Match labels on title and body, owners on path hints in the body
+    decision = decide(issue_title, issue_body)
+    matched_labels = decision["labels"]
+    matched_owners = decision["owners"]
+
+    # Collect all mutations and send them together; the payload already
+    # carries the current labels and assignees, so no GET is needed
+    batch = github_client.batch(
+        repo_full_name,
+        issue_number,
+        current_labels=[label["name"] for label in payload["issue"].get("labels", [])],
+        current_assignees=[user["login"] for user in payload["issue"].get("assignees", [])],
+    )
+    if matched_labels:
+        batch.add_labels(matched_labels)
+    if matched_owners:
+        batch.add_assignees(matched_owners)
+
+    # Add checklist comment if body is too short
+    if decision["checklist"]:
+        batch.add_comment(CHECKLIST_COMMENT)
+
+    return batch, {
+        "status": "success",
+        "issue": issue_number,
+        "labels_added": matched_labels,
+        "owners_assigned": matched_owners,
+        "checklist_added": decision["checklist"],
+    }
+
+
+def handle_issue_opened(payload: dict) -> dict:
     """Handle issues.opened webhook event"""
     try:
-        # Extract issue information
-        repo_full_name = payload["repository"]["full_name"]
-        issue_number = payload["issue"]["number"]
-        issue_title = payload["issue"].get("title", "")
-        issue_body = payload["issue"].get("body", "")
-
-        logger.info(f"Processing new issue #{issue_number} in {repo_full_name}")
-
-        # Combine title and body for keyword matching
-        issue_text = f"{issue_title} {issue_body}"
-
-        # Match labels based on keywords
-        matched_labels = rules_manager.match_labels(issue_text)
-        if matched_labels:
-            github_client.add_labels_to_issue(
-                repo_full_name, issue_number, matched_labels
-            )
-
-        # Match owners based on path hints in the body
-        matched_owners = rules_manager.match_owners(issue_body)
-        if matched_owners:
-            github_client.assign_users_to_issue(
-                repo_full_name, issue_number, matched_owners
-            )
-
-        # Add checklist comment if body is too short
-        if len(issue_body.strip()) < 40:
-            checklist_comment = """Thanks for opening this issue! To help us better understand and resolve it, please provide:
-
-- [ ] **Steps to reproduce** the issue
-- [ ] **Expected behavior** vs **actual behavior**
-- [ ] **Error messages or logs** (if any)
-- [ ] **Environment details** (OS, browser, version, etc.)
-- [ ] **Screenshots or recordings** (if applicable)
-
-This information will help us investigate and resolve the issue more quickly."""
-
-            github_client.add_comment_to_issue(
-                repo_full_name, issue_number, checklist_comment
-            )
-
-        # Track issue activity for stale detection
-        try:
-            issue_activity = IssueActivity(
-                repo_full_name=repo_full_name,
-                issue_number=issue_number,
-                last_activity=datetime.now(timezone.utc),
-            )
-            db.session.add(issue_activity)
-            db.session.commit()
-        except Exception as e:
-            logger.error(f"Failed to track issue activity: {e}")
-            db.session.rollback()
-
-        return {
-            "status": "success",
-            "issue": issue_number,
-            "labels_added": matched_labels,
-            "owners_assigned": matched_owners,
-            "checklist_added": len(issue_body.strip()) < 40,
-        }
+        # Matching runs on this webhook thread; only the GitHub writes are
+        # handed to the shared event loop, so they never wait on CPU work
+        batch, result = triage_issue(payload)
+        if outbox.enabled:
+            # Recorded in the outbox and sent by its dispatcher
+            applied = batch.flush()
+        else:
+            # Labels, assignees and the checklist comment go out concurrently
+            applied = async_github.run(batch.flush_async())
+        if not applied:
+            if not batch.applied:
+                # An error result releases the delivery claim, so GitHub's redelivery is handled
+                return {"status": "error", "message": "Failed to apply triage to GitHub"}
+            # Part of it went through; a redelivery would repeat that (and the
+            # checklist comment), so the delivery stays claimed
+            return {**result, "status": "partial", "message": "Some triage writes to GitHub failed"}
+        return result
 
     except Exception as e:
-        logger.error(f"Failed to handle issue opened event: {e}")
+        logger.error("Failed to handle issue opened event: %s", e)
         return {"status": "error", "message": str(e)}
 
 
@@ -83,28 +80,22 @@ def handle_issue_event(payload: dict) -> dict:
     action = payload.get("action")
 
     if action == "opened":
-        import asyncio
-
-        return asyncio.run(handle_issue_opened(payload))
+        result = handle_issue_opened(payload)
+        # Track issue activity for stale detection whatever became of the
+        # triage; failing here must not release the delivery for a redo
+        try:
+            activity_tracker.touch(payload["repository"]["full_name"], payload["issue"]["number"])
+        except Exception as e:
+            logger.error("Failed to track activity: %s", e)
+        return result
     elif action in ["edited", "labeled", "assigned", "commented"]:
-        # Update activity tracking for these events
+        # Update activity tracking for these events (also resets stale status
+        # and starts tracking issues opened before the bot was installed)
         try:
             repo_full_name = payload["repository"]["full_name"]
             issue_number = payload["issue"]["number"]
-
-            activity = (
-                db.session.query(IssueActivity)
-                .filter_by(repo_full_name=repo_full_name, issue_number=issue_number)
-                .first()
-            )
-
-            if activity:
-                activity.last_activity = datetime.now(timezone.utc)
-                activity.is_stale = False  # Reset stale status on activity
-                db.session.commit()
-
-        except Exception as e:
-            logger.error(f"Failed to update issue activity: {e}")
-            db.session.rollback()
+            activity_tracker.touch(repo_full_name, issue_number)
+        except KeyError as e:
+            logger.error("Failed to update issue activity: missing %s", e)
 
     return {"status": "ignored", "action": action}
@@ -1,139 +1,504 @@
+import time
+import zlib
+import random
 import logging
-from datetime import datetime, timedelta, timezone
+import contextvars
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import and_, delete, or_, update
 from github_client import github_client
-from models import IssueActivity
+from models import IssueActivity, SweepCheckpoint, utcnow
+from job_lease import Lease, LeaseLost, job_leases
+from metrics import STALE_SWEEP_ISSUES, STALE_SWEEP_SECONDS
 from app import db
 import os
 
 logger = logging.getLogger(__name__)
 
+# Per-issue outcomes reported by the repo workers
+MARKED_STALE = "marked_stale"
+UNTRACK = "untrack"
+KEEP = "keep"
+FAILED = "failed"
 
-def check_stale_issues():
-    """Background job to check and mark stale issues"""
-    from app import app
+STALE_COMMENT = """This issue has been automatically marked as stale because it has not had recent activity for {stale_days} days.
 
-    with app.app_context():
+It will be closed in 7 days if no further activity occurs. To keep this issue open:
+- Add a comment explaining why this issue should remain open
+- Remove the `stale` label
+- Add the `pinned` label to prevent future stale marking
+
+Thank you for your contributions!"""
+
+# A finished shard stays claimed this long, so processes that start late skip it
+SWEEP_DONE_HOLD = timedelta(hours=12)
+
+# Due issues whose GitHub update failed are retried after this long, not every poll
+DUE_RETRY_DELAY = timedelta(hours=1)
+
+CLOSE_COMMENT = "This issue has been automatically closed due to inactivity. If you believe this issue is still relevant, please reopen it or create a new issue with updated information."
+
+
+def check_stale_issues(app):
+    """Background job to check and mark stale issues
+
+    Every process runs this job on schedule. Each of the STALE_SHARDS shards
+    is claimed through a job lease, so it is swept by exactly one process;
+    the others wait and take over a shard whose holder stops heartbeating,
+    resuming from its checkpoint.
+    """
+    # Webhook-driven work gets GitHub API budget ahead of the sweep
+    with app.app_context(), github_client.background():
+        try:
+            shard_count = max(1, int(os.getenv("STALE_SHARDS", "1")))
+            pending = list(range(shard_count))
+            # Processes starting together then tend to claim different shards
+            random.shuffle(pending)
+
+            while pending:
+                for shard in list(pending):
+                    name = f"stale_sweep:{shard}"
+                    lease = job_leases.try_acquire(name)
+                    if lease is None:
+                        if job_leases.is_done(name):
+                            pending.remove(shard)
+                        continue
+
+                    pending.remove(shard)
+                    try:
+                        sweep_shard(shard, shard_count, lease)
+                    except LeaseLost as e:
+                        logger.warning("Stopped sweeping shard %s: %s", shard, e)
+                        db.session.rollback()
+                        continue
+                    except Exception as e:
+                        logger.error("Failed to check stale issues in shard %s: %s", shard, e)
+                        db.session.rollback()
+                        # Let a waiting process retry the shard
+                        job_leases.release(lease)
+                        continue
+                    job_leases.release(lease, done_for=SWEEP_DONE_HOLD)
+
+                if pending:
+                    # The rest are held by live processes; wait in case one dies
+                    time.sleep(job_leases.heartbeat)
+
+        except Exception as e:
+            logger.error("Failed to check stale issues: %s", e)
+            db.session.rollback()
+
+
+def sweep_shard(shard: int, shard_count: int, lease: Optional[Lease] = None):
+    """Mark and close stale issues of the repositories in one shard"""
+    stale_days = int(os.getenv("STALE_DAYS", "14"))  # Default 14 days
+    cutoff_date = utcnow() - timedelta(days=stale_days)
+    batch_size = max(1, int(os.getenv("STALE_BATCH_SIZE", "500")))
+
+    scope, suffix = [], ""
+    if shard_count > 1:
+        repos = shard_repositories(shard, shard_count)
+        if not repos:
+            return
+        scope, suffix = [IssueActivity.repo_full_name.in_(repos)], f":{shard}"
+
+    logger.info("Checking for issues stale after %s days (shard %s/%s)", stale_days, shard + 1, shard_count)
+
+    # Find issues that haven't been active and aren't already marked as stale
+    processed = sweep_phase(
+        "mark_stale" + suffix,
+        [
+            IssueActivity.last_activity < cutoff_date,
+            IssueActivity.is_stale == False,
+            *scope,
+        ],
+        lambda repo, numbers: mark_repo_stale(repo, numbers, stale_days),
+        batch_size,
+        lease,
+    )
+
+    logger.info("Processed %s potentially stale issues", processed)
+
+    # Clean up very old stale issues (close them after additional time)
+    close_days = int(
+        os.getenv("STALE_CLOSE_DAYS", "7")
+    )  # Additional days before closing
+    close_cutoff = utcnow() - timedelta(
+        days=stale_days + close_days
+    )
+
+    processed = sweep_phase(
+        "close_stale" + suffix,
+        [
+            IssueActivity.last_activity < close_cutoff,
+            IssueActivity.is_stale == True,
+            *scope,
+        ],
+        close_repo_stale,
+        batch_size,
+        lease,
+    )
+
+    logger.info("Stale issue check completed (%s very stale issues)", processed)
+
+
+def poll_due_issues(app):
+    """Background job for STALE_MODE=incremental: handle only issues that came due
+
+    Each IssueActivity row carries next_check_at, its stale deadline (or its
+    close deadline once stale), and activity pushes it forward. A poll reads
+    the due rows through the next_check_at index, so its cost follows the
+    number of due issues rather than the size of the table.
+    """
+    with app.app_context(), github_client.background():
+        lease = None
         try:
-            stale_days = int(os.getenv("STALE_DAYS", "14"))  # Default 14 days
-            cutoff_date = datetime.now(timezone.utc) - timedelta(days=stale_days)
+            # One poller at a time; other processes skip this tick
+            lease = job_leases.try_acquire("stale_due")
+            if lease is None:
+                return
 
-            logger.info(f"Checking for issues stale after {stale_days} days")
+            start = time.perf_counter()
+            batch_size = max(1, int(os.getenv("STALE_BATCH_SIZE", "500")))
+            backfilled = backfill_deadlines(batch_size)
+            if backfilled:
+                logger.info("Set stale deadlines for %s tracked issues", backfilled)
 
-            # Find issues that haven't been active and aren't already marked as stale
-            stale_issues = (
-                db.session.query(IssueActivity)
-                .filter(
-                    IssueActivity.last_activity < cutoff_date,
-                    IssueActivity.is_stale == False,
+            processed = 0
+            while True:
+                lease.check()
+                now = utcnow()
+                page = (
+                    db.session.query(IssueActivity)
+                    .filter(IssueActivity.next_check_at <= now)
+                    .order_by(IssueActivity.next_check_at)
+                    .limit(batch_size)
+                    .all()
                 )
-                .all()
-            )
+                if not page:
+                    break
+                counts = _apply_due_outcomes(page, now)
+                db.session.commit()
+                processed += len(page)
+                for (phase, outcome), count in counts.items():
+                    STALE_SWEEP_ISSUES.inc(count, phase=phase, outcome=outcome)
+                db.session.expunge_all()
 
-            logger.info(f"Found {len(stale_issues)} potentially stale issues")
+            if processed:
+                STALE_SWEEP_SECONDS.observe(time.perf_counter() - start, phase="incremental")
+                logger.info("Handled %s due stale issues", processed)
 
-            for issue_activity in stale_issues:
-                try:
-                    repo_full_name = issue_activity.repo_full_name
-                    issue_number = issue_activity.issue_number
+        except LeaseLost as e:
+            logger.warning("Stopped polling due stale issues: %s", e)
+            db.session.rollback()
+        except Exception as e:
+            logger.error("Failed to poll due stale issues: %s", e)
+            db.session.rollback()
+        finally:
+            if lease is not None:
+                job_leases.release(lease)
 
-                    # Check if the issue is still open on GitHub
-                    issue = github_client.get_issue(repo_full_name, issue_number)
 
-                    if issue.state == "open":
-                        # Add stale label
-                        github_client.add_labels_to_issue(
-                            repo_full_name, issue_number, ["stale"]
-                        )
+def backfill_deadlines(batch_size: int) -> int:
+    """Give rows without a deadline (tracked before incremental mode) their next one"""
+    stale_after, close_after = stale_windows()
+    filled = 0
+    while True:
+        rows = (
+            db.session.query(IssueActivity)
+            .filter(IssueActivity.next_check_at.is_(None))
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return filled
+        for row in rows:
+            base = row.last_activity or row.created_at or utcnow()
+            row.next_check_at = base + stale_after + (close_after if row.is_stale else timedelta(0))
+        db.session.commit()
+        filled += len(rows)
+        db.session.expunge_all()
 
-                        # Post stale comment
-                        stale_comment = f"""This issue has been automatically marked as stale because it has not had recent activity for {stale_days} days.
 
-It will be closed in 7 days if no further activity occurs. To keep this issue open:
-- Add a comment explaining why this issue should remain open
-- Remove the `stale` label
-- Add the `pinned` label to prevent future stale marking
+def stale_windows() -> Tuple[timedelta, timedelta]:
+    """Inactivity before an issue is marked stale, and further inactivity before it is closed"""
+    return (
+        timedelta(days=int(os.getenv("STALE_DAYS", "14"))),
+        timedelta(days=int(os.getenv("STALE_CLOSE_DAYS", "7"))),
+    )
 
-Thank you for your contributions!"""
 
-                        github_client.add_comment_to_issue(
-                            repo_full_name, issue_number, stale_comment
-                        )
-
-                        # Mark as stale in our database
-                        issue_activity.is_stale = True
-                        db.session.commit()
-
-                        logger.info(
-                            f"Marked issue #{issue_number} in {repo_full_name} as stale"
-                        )
-
-                    else:
-                        # Issue is closed, remove from tracking
-                        db.session.delete(issue_activity)
-                        db.session.commit()
-                        logger.info(
-                            f"Removed closed issue #{issue_number} from tracking"
-                        )
-
-                except Exception as e:
-                    logger.error(
-                        f"Failed to process stale issue {issue_activity.repo_full_name}#{issue_activity.issue_number}: {e}"
-                    )
-                    db.session.rollback()
-                    continue
+def close_deadline(last_activity: datetime, now: datetime) -> datetime:
+    """When a just-marked issue may be closed; never sooner than STALE_CLOSE_DAYS from now"""
+    stale_after, close_after = stale_windows()
+    return max(last_activity + stale_after + close_after, now + close_after)
+
+
+def shard_of(repo_full_name: str, shard_count: int) -> int:
+    """Stable shard of a repository; crc32 gives the same answer in every process"""
+    return zlib.crc32(repo_full_name.encode()) % shard_count
+
+
+def shard_repositories(shard: int, shard_count: int) -> List[str]:
+    """Tracked repositories belonging to a shard"""
+    rows = db.session.query(IssueActivity.repo_full_name).distinct()
+    return [repo for (repo,) in rows if shard_of(repo, shard_count) == shard]
+
+
+def sweep_phase(
+    phase: str,
+    criteria: list,
+    task: Callable[[str, List[int]], Dict[int, str]],
+    batch_size: int,
+    lease: Optional[Lease] = None,
+) -> int:
+    """Stream matching rows in keyset pages, committing results once per page
 
-            # Clean up very old stale issues (close them after additional time)
-            close_days = int(
-                os.getenv("STALE_CLOSE_DAYS", "7")
-            )  # Additional days before closing
-            close_cutoff = datetime.now(timezone.utc) - timedelta(
-                days=stale_days + close_days
+    A checkpoint with the last committed key is written in the same
+    transaction as each page, so a sweep that crashes resumes after it.
+    With a lease, the sweep stops before a page once the lease is lost.
+    """
+    start = time.perf_counter()
+    checkpoint = db.session.get(SweepCheckpoint, phase)
+    after = None
+    if checkpoint is not None:
+        after = (checkpoint.repo_full_name, checkpoint.issue_number)
+        logger.info("Resuming %s sweep after %s#%s", phase, after[0], after[1])
+
+    processed = 0
+    for page, last_key in iter_activity_pages(criteria, batch_size, after):
+        if lease is not None:
+            lease.check()
+        outcomes = _apply_outcomes(page, task)
+        db.session.merge(
+            SweepCheckpoint(
+                phase=phase,
+                repo_full_name=last_key[0],
+                issue_number=last_key[1],
+                updated_at=utcnow(),
             )
+        )
+        db.session.commit()
+        processed += len(page)
+        for outcome, count in outcomes.items():
+            STALE_SWEEP_ISSUES.inc(count, phase=phase, outcome=outcome)
+        # Keep the identity map from growing across pages
+        db.session.expunge_all()
+
+    # Phase finished; the next run starts from the beginning
+    db.session.query(SweepCheckpoint).filter_by(phase=phase).delete()
+    db.session.commit()
+    STALE_SWEEP_SECONDS.observe(time.perf_counter() - start, phase=phase)
+    return processed
+
 
-            very_stale_issues = (
-                db.session.query(IssueActivity)
-                .filter(
-                    IssueActivity.last_activity < close_cutoff,
-                    IssueActivity.is_stale == True,
+def iter_activity_pages(
+    criteria: list, batch_size: int, after: Optional[Tuple[str, int]] = None
+) -> Iterator[Tuple[List[IssueActivity], Tuple[str, int]]]:
+    """Yield (rows, last_key) pages ordered by the (repo, issue) unique index
+
+    Keyset pagination keeps every page query cheap and is unaffected by rows
+    being updated or deleted while the sweep runs. Ordering by repository
+    also keeps each page's bulk GitHub lookups grouped.
+    """
+    while True:
+        query = db.session.query(IssueActivity).filter(*criteria)
+        if after is not None:
+            query = query.filter(
+                or_(
+                    IssueActivity.repo_full_name > after[0],
+                    and_(
+                        IssueActivity.repo_full_name == after[0],
+                        IssueActivity.issue_number > after[1],
+                    ),
                 )
-                .all()
             )
+        page = (
+            query.order_by(IssueActivity.repo_full_name, IssueActivity.issue_number)
+            .limit(batch_size)
+            .all()
+        )
+        if not page:
+            return
+        after = (page[-1].repo_full_name, page[-1].issue_number)
+        yield page, after
+        if len(page) < batch_size:
+            return
+
+
+def mark_repo_stale(repo_full_name: str, issue_numbers: List[int], stale_days: int) -> Dict[int, str]:
+    """Label and comment on the still-open candidates of one repository, in order"""
+    states = github_client.get_issue_states(repo_full_name, issue_numbers)
+    outcomes = {}
+
+    for issue_number in issue_numbers:
+        state = states.get(issue_number)
+        if state is None or state["state"] != "open":
+            # Issue is closed or gone, remove from tracking
+            outcomes[issue_number] = UNTRACK
+            continue
+        if "pinned" in state["labels"]:
+            outcomes[issue_number] = KEEP
+            continue
+
+        # The bulk lookup gives us the current labels for a single PATCH.
+        # Sent directly: a failed issue is simply retried by the next sweep
+        batch = github_client.batch(
+            repo_full_name, issue_number, current_labels=state["labels"], durable=False
+        )
+        batch.add_labels(["stale"])
+        batch.add_comment(STALE_COMMENT.format(stale_days=stale_days))
+        outcomes[issue_number] = MARKED_STALE if batch.flush() else FAILED
+
+    return outcomes
+
+
+def close_repo_stale(repo_full_name: str, issue_numbers: List[int]) -> Dict[int, str]:
+    """Close the stale, unpinned issues of one repository, in order"""
+    states = github_client.get_issue_states(repo_full_name, issue_numbers)
+    outcomes = {}
+
+    for issue_number in issue_numbers:
+        state = states.get(issue_number)
+        labels = state["labels"] if state else []
+        if state and state["state"] == "open" and "stale" in labels and "pinned" not in labels:
+            closed = (
+                github_client.batch(repo_full_name, issue_number, durable=False)
+                .add_comment(CLOSE_COMMENT)
+                .close()
+                .flush()
+            )
+            if not closed:
+                outcomes[issue_number] = FAILED
+                continue
+            logger.info(
+                "Automatically closed stale issue #%s in %s", issue_number, repo_full_name
+            )
+        outcomes[issue_number] = UNTRACK
+
+    return outcomes
+
+
+def run_per_repo(
+    groups: Dict[str, List[int]], task: Callable[[str, List[int]], Dict[int, str]]
+) -> Iterator[Tuple[str, Dict[int, str]]]:
+    """Run task for each repository concurrently, yielding results as they finish
+
+    Issues of one repository are handled by a single task, so their GitHub
+    mutations stay in order; different repositories proceed in parallel.
+    """
+    max_workers = max(1, int(os.getenv("STALE_CONCURRENCY", "4")))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stale-sweep") as executor:
+        # copy_context carries the background request priority into the workers
+        futures = {
+            executor.submit(contextvars.copy_context().run, task, repo, numbers): repo
+            for repo, numbers in groups.items()
+        }
+        for future in as_completed(futures):
+            repo = futures[future]
+            try:
+                yield repo, future.result()
+            except Exception as e:
+                logger.error("Failed to sweep stale issues in %s: %s", repo, e)
 
-            for issue_activity in very_stale_issues:
-                try:
-                    repo_full_name = issue_activity.repo_full_name
-                    issue_number = issue_activity.issue_number
 
-                    # Check if issue is still open and has stale label
-                    issue = github_client.get_issue(repo_full_name, issue_number)
+def _apply_outcomes(
+    activities: List[IssueActivity], task: Callable[[str, List[int]], Dict[int, str]]
+) -> Counter:
+    """Run task per repository and stage the outcomes in the session (caller commits)
 
-                    if issue.state == "open":
-                        stale_labels = [label.name for label in issue.labels]
-                        if "stale" in stale_labels and "pinned" not in stale_labels:
-                            # Close the issue
-                            close_comment = "This issue has been automatically closed due to inactivity. If you believe this issue is still relevant, please reopen it or create a new issue with updated information."
+    Returns how many issues got each outcome; issues of repositories whose
+    task raised count as FAILED.
+    """
+    counts = Counter()
+    by_repo: Dict[str, Dict[int, IssueActivity]] = defaultdict(dict)
+    for activity in activities:
+        by_repo[activity.repo_full_name][activity.issue_number] = activity
 
-                            github_client.add_comment_to_issue(
-                                repo_full_name, issue_number, close_comment
-                            )
-                            github_client.close_issue(repo_full_name, issue_number)
+    groups = {repo: list(rows) for repo, rows in by_repo.items()}
+    for repo_full_name, outcomes in run_per_repo(groups, task):
+        rows = by_repo[repo_full_name]
+        for issue_number, outcome in outcomes.items():
+            counts[outcome] += 1
+            activity = rows[issue_number]
+            if outcome == MARKED_STALE:
+                # Mark as stale in our database
+                activity.is_stale = True
+                activity.next_check_at = close_deadline(
+                    activity.last_activity, utcnow()
+                )
+                logger.info(
+                    "Marked issue #%s in %s as stale", issue_number, repo_full_name
+                )
+            elif outcome == UNTRACK:
+                db.session.delete(activity)
+
+    missing = len(activities) - sum(counts.values())
+    if missing:
+        counts[FAILED] += missing
+    return counts
+
+
+def _apply_due_outcomes(activities: List[IssueActivity], now: datetime) -> Counter:
+    """Mark or close due issues and move each row's deadline (caller commits)
 
-                            logger.info(
-                                f"Automatically closed stale issue #{issue_number} in {repo_full_name}"
-                            )
+    GitHub is updated for the whole page before any row is written, so no
+    write transaction stays open across API calls. Rows are updated only if
+    last_activity is unchanged, so activity that arrived meanwhile keeps its
+    fresher deadline. Returns a count per (phase, outcome).
+    """
+    stale_after, _ = stale_windows()
+    stale_days = stale_after.days
+    tasks = {
+        "mark_stale": lambda repo, numbers: mark_repo_stale(repo, numbers, stale_days),
+        "close_stale": close_repo_stale,
+    }
+    groups: Dict[str, Dict[str, Dict[int, IssueActivity]]] = {
+        phase: defaultdict(dict) for phase in tasks
+    }
+    for activity in activities:
+        phase = "close_stale" if activity.is_stale else "mark_stale"
+        groups[phase][activity.repo_full_name][activity.issue_number] = activity
 
-                    # Remove from tracking
-                    db.session.delete(issue_activity)
-                    db.session.commit()
+    results = {
+        phase: dict(run_per_repo({repo: list(rows) for repo, rows in by_repo.items()}, tasks[phase]))
+        for phase, by_repo in groups.items()
+        if by_repo
+    }
 
-                except Exception as e:
-                    logger.error(
-                        f"Failed to close stale issue {issue_activity.repo_full_name}#{issue_activity.issue_number}: {e}"
+    counts = Counter()
+    for phase, outcomes_by_repo in results.items():
+        for repo_full_name, rows in groups[phase].items():
+            outcomes = outcomes_by_repo.get(repo_full_name, {})
+            for issue_number, activity in rows.items():
+                outcome = outcomes.get(issue_number, FAILED)
+                counts[(phase, outcome)] += 1
+                unchanged = and_(
+                    IssueActivity.id == activity.id,
+                    IssueActivity.last_activity == activity.last_activity,
+                )
+                if outcome == UNTRACK:
+                    db.session.execute(
+                        delete(IssueActivity).where(unchanged).execution_options(synchronize_session=False)
                     )
-                    db.session.rollback()
                     continue
+                if outcome == MARKED_STALE:
+                    values = {
+                        "is_stale": True,
+                        "next_check_at": close_deadline(activity.last_activity, now),
+                    }
+                    logger.info("Marked issue #%s in %s as stale", issue_number, repo_full_name)
+                elif outcome == KEEP:
+                    # Pinned; look again after another full stale period
+                    values = {"next_check_at": now + stale_after}
+                else:
+                    values = {"next_check_at": now + DUE_RETRY_DELAY}
+                db.session.execute(
+                    update(IssueActivity)
+                    .where(unchanged)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
 
-            logger.info("Stale issue check completed")
-
-        except Exception as e:
-            logger.error(f"Failed to check stale issues: {e}")
+    return counts
@@ -0,0 +1,198 @@
+import os
+import uuid
+import atexit
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import JobLease, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Holder prefix of a lease whose work finished; it blocks re-runs until it expires
+DONE_PREFIX = "done:"
+
+
+class LeaseLost(Exception):
+    """Raised when a lease expired and was taken over while its work was running"""
+
+
+class Lease:
+    """A job lease held by this process and kept alive by the heartbeat thread"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lost = False
+
+    def check(self):
+        """Raise LeaseLost if another process has taken this lease over"""
+        if self.lost:
+            raise LeaseLost(f"Lease {self.name} was lost")
+
+
+class JobLeaseManager:
+    """DB-backed leases so a scheduled job (or shard of one) runs on one process
+
+    Claiming is a single conditional UPDATE (or INSERT of a missing row),
+    so it is atomic on SQLite and Postgres without advisory locks. Held
+    leases are renewed every JOB_LEASE_HEARTBEAT seconds; if a holder dies
+    its lease expires after JOB_LEASE_TTL seconds and another process can
+    claim it. Clocks of all nodes must agree to well within the TTL.
+    """
+
+    def __init__(self):
+        self.ttl = float(os.getenv("JOB_LEASE_TTL", "60"))
+        self.heartbeat = float(os.getenv("JOB_LEASE_HEARTBEAT", "15"))
+        self._nonce = uuid.uuid4().hex[:8]
+        self._held: Dict[str, Lease] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._app = None
+
+    @property
+    def holder(self) -> str:
+        # The pid is read on every call so forked workers get distinct identities
+        return f"{socket.gethostname()}:{os.getpid()}:{self._nonce}"
+
+    def try_acquire(self, name: str) -> Optional[Lease]:
+        """Claim a free or expired lease (must run in an app context); None if held elsewhere"""
+        now = utcnow()
+        if not self._claim(name, self.holder, now, now + timedelta(seconds=self.ttl)):
+            return None
+
+        with self._lock:
+            # Re-claiming a lease we already hold keeps the same handle
+            lease = self._held.setdefault(name, Lease(name))
+        self._start_heartbeat()
+        logger.info("Acquired lease %s as %s", name, self.holder)
+        return lease
+
+    def release(self, lease: Lease, done_for: Optional[timedelta] = None):
+        """Give up a lease; with done_for, mark its work finished for that long"""
+        with self._lock:
+            self._held.pop(lease.name, None)
+        if lease.lost:
+            return
+
+        now = utcnow()
+        values = {"updated_at": now}
+        if done_for:
+            values.update(holder=DONE_PREFIX + self.holder, expires_at=now + done_for)
+        else:
+            values.update(expires_at=now)
+        try:
+            db.session.query(JobLease).filter_by(name=lease.name, holder=self.holder).update(
+                values, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Failed to release lease %s: %s", lease.name, e)
+
+    def is_done(self, name: str) -> bool:
+        """True if the lease's work was finished recently (by any process)"""
+        row = db.session.get(JobLease, name)
+        db.session.commit()
+        return bool(
+            row
+            and row.holder.startswith(DONE_PREFIX)
+            and row.expires_at > utcnow()
+        )
+
+    def stop(self):
+        """Stop heartbeating and release held leases so another process can take over"""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        thread.join(timeout=5)
+        with self._lock:
+            held = list(self._held.values())
+        with self._app.app_context():
+            for lease in held:
+                self.release(lease)
+
+    def _claim(self, name: str, holder: str, now: datetime, expires_at: datetime) -> bool:
+        try:
+            claimed = (
+                db.session.query(JobLease)
+                .filter(
+                    JobLease.name == name,
+                    or_(JobLease.holder == holder, JobLease.expires_at < now),
+                )
+                .update(
+                    {"holder": holder, "expires_at": expires_at, "updated_at": now},
+                    synchronize_session=False,
+                )
+            )
+            if not claimed:
+                if db.session.get(JobLease, name) is not None:
+                    db.session.rollback()
+                    return False
+                db.session.add(
+                    JobLease(name=name, holder=holder, expires_at=expires_at, updated_at=now)
+                )
+            db.session.commit()
+            return True
+        except IntegrityError:
+            # Another process inserted the row first
+            db.session.rollback()
+            return False
+
+    def _renew(self, lease: Lease) -> bool:
+        now = utcnow()
+        renewed = (
+            db.session.query(JobLease)
+            .filter_by(name=lease.name, holder=self.holder)
+            .update(
+                {"expires_at": now + timedelta(seconds=self.ttl), "updated_at": now},
+                synchronize_session=False,
+            )
+        )
+        db.session.commit()
+        return bool(renewed)
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._app = current_app._get_current_object()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="job-lease-heartbeat", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat):
+            with self._lock:
+                held = list(self._held.values())
+            if not held:
+                continue
+            with self._app.app_context():
+                for lease in held:
+                    try:
+                        renewed = self._renew(lease)
+                    except Exception as e:
+                        # Keep trying; the lease is only lost once someone else claims it
+                        db.session.rollback()
+                        logger.warning("Failed to renew lease %s: %s", lease.name, e)
+                        continue
+                    if not renewed:
+                        lease.lost = True
+                        with self._lock:
+                            self._held.pop(lease.name, None)
+                        logger.warning("Lease %s was taken over by another process", lease.name)
+
+
+# Global instance
+job_leases = JobLeaseManager()
@@ -0,0 +1,175 @@
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+KEYED_CONTENDED = metrics.counter(
+    "triage_keyed_contended_total",
+    "Tasks submitted while another task with the same key was queued or running, by executor",
+    ["executor"],
+)
+KEYED_BACKLOG_FULL = metrics.counter(
+    "triage_keyed_backlog_full_total",
+    "Tasks that found their key's backlog full and had to wait (or were rejected), by executor",
+    ["executor"],
+)
+KEYED_WAIT_SECONDS = metrics.histogram(
+    "triage_keyed_wait_seconds",
+    "Time from submitting a task to it starting, by executor",
+    ["executor"],
+)
+
+# (callable, args, caller's context, future, submitted at)
+_Task = Tuple[Callable, tuple, contextvars.Context, Future, float]
+
+
+class KeyBacklogFull(Exception):
+    """Raised when a key already has its maximum number of tasks waiting"""
+
+
+class KeyedExecutor:
+    """Thread pool that never runs two tasks with the same key at the same time
+
+    Each key has a FIFO lane of waiting tasks. A key is handed to at most
+    one worker at a time; after each task it goes to the back of the ready
+    queue if more are waiting, so one busy key cannot starve the others
+    and different keys run fully in parallel. At most max_backlog tasks
+    may wait per key; submit() then blocks (or raises KeyBacklogFull).
+    Tasks run in a copy of the submitter's context variables.
+    """
+
+    def __init__(self, name: str, workers: int, max_backlog: int):
+        self.name = name
+        self.num_workers = max(1, workers)
+        self.max_backlog = max(1, max_backlog)
+
+        # key -> tasks waiting; a key is present while it has work queued or running
+        self._lanes: Dict[Hashable, Deque[_Task]] = {}
+        self._ready: Deque[Hashable] = deque()
+        self._cond = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._stopping = False
+        self._waiting = 0
+        self.counters = {"submitted": 0, "contended": 0, "backlog_full": 0, "completed": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        with self._cond:
+            if self._workers:
+                return
+            self._stopping = False
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, key: Hashable, fn: Callable, *args, block: bool = True, timeout: Optional[float] = None) -> Future:
+        """Queue fn(*args) behind the other tasks of key; returns its Future"""
+        future: Future = Future()
+        task = (fn, args, contextvars.copy_context(), future, time.perf_counter())
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError(f"{self.name} is stopping")
+            lane = self._lanes.get(key)
+            if lane is None:
+                self._lanes[key] = deque([task])
+                self._ready.append(key)
+                self._waiting += 1
+                self.counters["submitted"] += 1
+                self._cond.notify_all()
+                return future
+
+            self.counters["contended"] += 1
+            KEYED_CONTENDED.inc(executor=self.name)
+            if len(lane) >= self.max_backlog:
+                self.counters["backlog_full"] += 1
+                KEYED_BACKLOG_FULL.inc(executor=self.name)
+                while len(lane) >= self.max_backlog:
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if not block or (remaining is not None and remaining <= 0):
+                        raise KeyBacklogFull(f"{self.max_backlog} tasks already waiting for {key!r}")
+                    self._cond.wait(remaining)
+                    # The lane may have drained and been replaced while we waited
+                    lane = self._lanes.get(key)
+                    if lane is None:
+                        lane = self._lanes[key] = deque()
+                        self._ready.append(key)
+                        self._cond.notify_all()
+            lane.append(task)
+            self._waiting += 1
+            self.counters["submitted"] += 1
+            return future
+
+    def depth(self) -> int:
+        """Tasks submitted but not yet started"""
+        return self._waiting
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "active_keys": len(self._lanes),
+                "waiting": self._waiting,
+                "longest_backlog": max((len(lane) for lane in self._lanes.values()), default=0),
+                **self.counters,
+            }
+
+    def stop(self, drain: bool = True, timeout: Optional[float] = None):
+        """Stop the workers, optionally running everything already submitted first"""
+        with self._cond:
+            workers, self._workers = self._workers, []
+            self._stopping = True
+            if not drain:
+                for lane in self._lanes.values():
+                    while lane:
+                        lane.popleft()[3].cancel()
+                        self._waiting -= 1
+            self._cond.notify_all()
+        for worker in workers:
+            worker.join(timeout=timeout)
+            if worker.is_alive():
+                logger.warning("%s did not finish in time", worker.name)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopping:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                lane = self._lanes[key]
+                if not lane:
+                    # Cancelled by stop(drain=False)
+                    del self._lanes[key]
+                    continue
+                fn, args, context, future, submitted = lane.popleft()
+                self._waiting -= 1
+                # Room in the lane for a blocked submitter
+                self._cond.notify_all()
+
+            KEYED_WAIT_SECONDS.observe(time.perf_counter() - submitted, executor=self.name)
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(context.run(fn, *args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            with self._cond:
+                self.counters["completed"] += 1
+                if self._lanes[key]:
+                    self._ready.append(key)
+                else:
+                    del self._lanes[key]
+                self._cond.notify_all()
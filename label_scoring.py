@@ -0,0 +1,205 @@
+import re
+import math
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional; scoring falls back to plain Python
+    np = None
+
+# Words as the scorer sees them; n-gram keywords match across any non-word run
+WORD_SPLIT_RE = re.compile(r"\W+")
+
+# Scores are rounded so ties and thresholds do not depend on summation order
+SCORE_DECIMALS = 9
+
+# Distinct matches whose credited keyword columns are remembered; prefix
+# keywords match arbitrary words, so this has to be bounded
+CREDIT_CACHE_SIZE = 4096
+
+# Rows scored per matrix product, bounding the dense feature block's memory
+BATCH_ROWS = 1024
+
+
+def rule_keywords(spec: Any) -> List[str]:
+    """The keywords of a label rule, in either the list or the weighted form"""
+    if isinstance(spec, dict):
+        spec = spec.get("keywords", [])
+    if isinstance(spec, dict):
+        # Negative weights only lower a score; they never trigger a label
+        spec = [keyword for keyword, weight in spec.items() if weight > 0]
+    return [keyword.rstrip("*") for keyword in spec]
+
+
+def _normalize(keyword: str) -> str:
+    return " ".join(word for word in WORD_SPLIT_RE.split(keyword.lower()) if word)
+
+
+class LabelScorer:
+    """Weighted keyword/n-gram scoring of issues against all labels at once
+
+    Each label rule is either a list of keywords (weight 1 each) or an
+    object with weighted keywords and its own threshold:
+
+        "question": {"keywords": {"how do i": 2, "question": 1.5, "how": 0.4}, "threshold": 1.5}
+
+    Keywords are whole words or word n-grams; a trailing * makes a single
+    word a prefix ("fail*" matches "failed"). A text's score for a label is
+    the sum of weight * (1 + ln(count)) over the label's keywords found in
+    it, so repeating a word adds little. Labels scoring at least their
+    threshold are returned best first, at most top_k of them (0 = all).
+
+    The rules are compiled into one (keywords x labels) weight matrix and a
+    batch of texts is scored with a single matrix product when NumPy is
+    installed; without it the same scores are summed in Python.
+    """
+
+    def __init__(self, rules: Dict[str, Any], threshold: float = 1.0, top_k: int = 0):
+        self.labels = list(rules)
+        self.top_k = max(0, top_k)
+        self.thresholds: List[float] = []
+
+        # column -> [(label index, weight)]; exact words/n-grams and prefixes
+        self._columns: List[List[Tuple[int, float]]] = []
+        self._exact: Dict[str, int] = {}
+        self._prefix: Dict[str, int] = {}
+
+        for index, (label, spec) in enumerate(rules.items()):
+            keywords, label_threshold = spec, threshold
+            if isinstance(spec, dict):
+                keywords = spec.get("keywords", [])
+                label_threshold = float(spec.get("threshold", threshold))
+            if not isinstance(keywords, dict):
+                keywords = dict.fromkeys(keywords, 1.0)
+            self.thresholds.append(label_threshold)
+
+            for keyword, weight in keywords.items():
+                is_prefix = keyword.endswith("*") and " " not in keyword.strip()
+                normalized = _normalize(keyword.rstrip("*"))
+                if not normalized:
+                    continue
+                table = self._prefix if is_prefix else self._exact
+                column = table.get(normalized)
+                if column is None:
+                    column = table[normalized] = len(self._columns)
+                    self._columns.append([])
+                self._columns[column].append((index, float(weight)))
+
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._prefix}, reverse=True)
+        # Words of a match -> columns it credits; LRU because a prefix keyword
+        # ("fail*") matches any word starting with it, user text included
+        self._credits_for = lru_cache(maxsize=CREDIT_CACHE_SIZE)(self._compute_credits)
+
+        self._pattern = None
+        alternatives = sorted(self._exact, key=lambda keyword: (keyword.count(" "), len(keyword)), reverse=True)
+        patterns = [r"\W+".join(map(re.escape, keyword.split(" "))) for keyword in alternatives]
+        patterns += [rf"{re.escape(prefix)}\w*" for prefix in sorted(self._prefix, key=len, reverse=True)]
+        if patterns:
+            # Zero-width lookahead so overlapping keywords are all found, as in LabelMatcher
+            self._pattern = re.compile(rf"(?=\b({'|'.join(patterns)})\b)")
+
+        if np is not None:
+            self._weights = np.zeros((len(self._columns), len(self.labels)))
+            for column, entries in enumerate(self._columns):
+                for index, weight in entries:
+                    self._weights[column, index] += weight
+            self._threshold_row = np.array(self.thresholds)
+
+    @property
+    def vectorized(self) -> bool:
+        return np is not None
+
+    def _credits(self, matched: str) -> Tuple[int, ...]:
+        """Columns of every keyword that starts where matched does and fits inside it"""
+        # Keyed by the words alone, so separators between n-gram words do not matter
+        return self._credits_for(tuple(word for word in WORD_SPLIT_RE.split(matched) if word))
+
+    def _compute_credits(self, words: Tuple[str, ...]) -> Tuple[int, ...]:
+        found = []
+        for end in range(1, len(words) + 1):
+            column = self._exact.get(" ".join(words[:end]))
+            if column is not None:
+                found.append(column)
+        first = words[0]
+        for length in self._prefix_lengths:
+            if length <= len(first):
+                column = self._prefix.get(first[:length])
+                if column is not None:
+                    found.append(column)
+        return tuple(found)
+
+    def features(self, text: str) -> Dict[int, float]:
+        """Sublinear term frequency of each keyword column found in text"""
+        if self._pattern is None:
+            return {}
+        counts: Dict[int, int] = {}
+        for match in self._pattern.finditer(text.lower()):
+            for column in self._credits(match.group(1)):
+                counts[column] = counts.get(column, 0) + 1
+        return {column: 1.0 + math.log(count) for column, count in counts.items()}
+
+    def scores(self, texts: Sequence[str]) -> List[List[float]]:
+        """Score of every label for every text, in rule order"""
+        if np is None:
+            return [self._score_row(self.features(text)) for text in texts]
+        scores: List[List[float]] = []
+        for start in range(0, len(texts), BATCH_ROWS):
+            rows = [self.features(text) for text in texts[start : start + BATCH_ROWS]]
+            scores.extend(self._score_matrix(rows).tolist())
+        return scores
+
+    def _score_matrix(self, rows: List[Dict[int, float]]):
+        matrix = np.zeros((len(rows), len(self._columns)))
+        for i, row in enumerate(rows):
+            if row:
+                matrix[i, list(row)] = list(row.values())
+        return np.round(matrix @ self._weights, SCORE_DECIMALS)
+
+    def _score_row(self, row: Dict[int, float]) -> List[float]:
+        scores = [0.0] * len(self.labels)
+        for column, value in row.items():
+            for index, weight in self._columns[column]:
+                scores[index] += weight * value
+        return [round(score, SCORE_DECIMALS) for score in scores]
+
+    def _select(self, scores: Sequence[float]) -> List[str]:
+        ranked = sorted(
+            (index for index, score in enumerate(scores) if score >= self.thresholds[index]),
+            key=lambda index: -scores[index],
+        )
+        if self.top_k:
+            ranked = ranked[: self.top_k]
+        return [self.labels[index] for index in ranked]
+
+    def match_batch(self, texts: Iterable[str]) -> List[List[str]]:
+        """Labels for each text, best scoring first"""
+        texts = list(texts)
+        if np is None:
+            return [self._select(self._score_row(self.features(text))) for text in texts]
+
+        results: List[List[str]] = []
+        for start in range(0, len(texts), BATCH_ROWS):
+            chunk = texts[start : start + BATCH_ROWS]
+            scores = self._score_matrix([self.features(text) for text in chunk])
+            selected = scores >= self._threshold_row
+            # Labels below their threshold sort last, so the first top_k
+            # columns of the ranking hold every label that may be returned
+            ranking = np.argsort(np.where(selected, -scores, np.inf), axis=1, kind="stable")
+            if self.top_k:
+                ranking = ranking[:, : self.top_k]
+            counts = selected.sum(axis=1)
+            for order, count in zip(ranking.tolist(), counts.tolist()):
+                results.append([self.labels[index] for index in order[:count]])
+        return results
+
+    def match(self, text: str) -> List[str]:
+        """Labels for one text, best scoring first"""
+        # A one-row matrix product costs more in NumPy call overhead than it saves
+        return self._select(self._score_row(self.features(text)))
+
+    def explain(self, text: str) -> Dict[str, float]:
+        """Non-zero label scores for text, highest first; for tuning weights"""
+        scores = self.scores([text])[0]
+        ranked = sorted(range(len(self.labels)), key=lambda index: -scores[index])
+        return {self.labels[index]: round(scores[index], 4) for index in ranked if scores[index]}
@@ -0,0 +1,196 @@
+import os
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from metrics import metrics
+
+_log_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "context"}
+
+# Argument types that cannot change between the logging call and the writer thread
+_IMMUTABLE = (str, int, float, bool, type(None), bytes)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+LOG_RECORDS_DROPPED = metrics.counter(
+    "triage_log_records_dropped_total",
+    "Log records dropped because the log queue was full, by level",
+    ["level"],
+)
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields (delivery, repo, issue, ...) to every record logged in the block
+
+    The fields live in a context variable, so work handed to thread pools
+    through contextvars.copy_context() keeps them.
+    """
+    merged = dict(_log_context.get())
+    merged.update((key, value) for key, value in fields.items() if value is not None)
+    token = _log_context.set(merged)
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, context and extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        entry.update(getattr(record, "context", None) or {})
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry.setdefault(key, value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Classic one-line format with the correlation fields appended"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = getattr(record, "context", None)
+        if not context:
+            return line
+        fields = " ".join(f"{key}={value}" for key, value in context.items())
+        first, newline, rest = line.partition("\n")
+        return f"{first} [{fields}]{newline}{rest}"
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread; never blocks the calling thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only capture what would change later; formatting happens in the writer
+        record = copy.copy(record)
+        record.context = _log_context.get()
+        args = record.args
+        if args and not (
+            isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE) for arg in args)
+        ):
+            # Mutable arguments could change before the writer formats them
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(level=record.levelname)
+
+
+class LogPipeline:
+    """Queue-backed logging: request threads enqueue, one thread formats and writes
+
+    LOG_LEVEL sets the root level and LOG_LEVELS overrides it per logger
+    (e.g. "github_client=DEBUG,alembic=WARNING"). LOG_FORMAT is json (one
+    object per line, with correlation fields from log_context) or text.
+    When LOG_QUEUE_SIZE records are waiting, new ones are dropped and
+    counted rather than blocking.
+    """
+
+    def __init__(self):
+        self.level = os.getenv("LOG_LEVEL", "INFO").upper()
+        self.levels = self._parse_levels(os.getenv("LOG_LEVELS", ""))
+        self.format = os.getenv("LOG_FORMAT", "json").lower()
+        self.queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+        self._handler: Optional[_NonBlockingQueueHandler] = None
+        self._listener: Optional[QueueListener] = None
+        self._output: Optional[logging.Handler] = None
+        self._lock = threading.Lock()
+
+    def configure(self):
+        """Install the queue handler on the root logger and start the writer (once)"""
+        with self._lock:
+            if self._handler is not None:
+                return
+            self._output = logging.StreamHandler()
+            self._output.setFormatter(JsonFormatter() if self.format == "json" else TextFormatter())
+            self._handler = _NonBlockingQueueHandler(queue.Queue(self.queue_size))
+
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(self._handler)
+            root.setLevel(self.level)
+            for name, level in self.levels.items():
+                logging.getLogger(name).setLevel(level)
+
+            self._start_listener()
+            atexit.register(self.stop)
+            # A forked worker inherits the handler but not the writer thread
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    @property
+    def configured(self) -> bool:
+        return self._handler is not None
+
+    def queue_depth(self) -> Optional[int]:
+        return self._handler.queue.qsize() if self._handler is not None else None
+
+    def stop(self):
+        """Write out queued records and stop the writer thread"""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+
+    def _start_listener(self):
+        self._listener = QueueListener(self._handler.queue, self._output)
+        self._listener.start()
+
+    def _after_fork(self):
+        if self._handler is None:
+            return
+        # The parent's queue lock may have been held mid-fork; start clean
+        self._lock = threading.Lock()
+        self._handler.queue = queue.Queue(self.queue_size)
+        self._start_listener()
+
+    @staticmethod
+    def _parse_levels(spec: str) -> Dict[str, str]:
+        levels = {}
+        for item in spec.split(","):
+            name, _, level = item.partition("=")
+            if name.strip() and level.strip():
+                levels[name.strip()] = level.strip().upper()
+        return levels
+
+
+# Global instance
+log_pipeline = LogPipeline()
+
+metrics.gauge(
+    "triage_log_queue_depth",
+    "Log records waiting for the writer thread",
+    log_pipeline.queue_depth,
+)
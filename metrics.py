@@ -0,0 +1,262 @@
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-millisecond rule matching up to slow GitHub calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Optional[float]]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.debug("Gauge %s failed: %s", self.name, e)
+            value = None
+        if value is None:
+            return []
+        return super().render() + [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """Bucketed observations (usually seconds) per label set"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the enclosed block; labels may be added to inside it"""
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            snapshot = [(key, list(counts), total[0]) for key, (counts, total) in sorted(self._values.items())]
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text format
+
+    Values live in this process only; with several worker processes each
+    one reports its own series.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], Optional[float]]) -> Gauge:
+        """Register (or replace) a gauge whose value is read at scrape time"""
+        gauge = Gauge(name, documentation, callback)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def instrument_engine(self, engine):
+        """Time every SQL statement executed through a SQLAlchemy engine"""
+        from sqlalchemy import event
+
+        def before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+        def after(conn, cursor, statement, parameters, context, executemany):
+            start = conn.info["query_start"].pop()
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation=operation)
+
+        def failed(exception_context):
+            stack = exception_context.connection.info.get("query_start") if exception_context.connection else None
+            if stack:
+                stack.pop()
+            DB_QUERY_ERRORS.inc()
+
+        event.listen(engine, "before_cursor_execute", before)
+        event.listen(engine, "after_cursor_execute", after)
+        event.listen(engine, "handle_error", failed)
+
+
+# Global instance
+metrics = MetricsRegistry()
+
+WEBHOOK_REQUEST_SECONDS = metrics.histogram(
+    "triage_webhook_request_duration_seconds",
+    "Time to answer a webhook delivery, by event and HTTP status",
+    ["event", "status"],
+)
+WEBHOOK_EVENT_SECONDS = metrics.histogram(
+    "triage_webhook_event_duration_seconds",
+    "Time to process a webhook event in its handler, by event, action and result",
+    ["event", "action", "result"],
+)
+GITHUB_REQUEST_SECONDS = metrics.histogram(
+    "triage_github_request_duration_seconds",
+    "GitHub API request latency per attempt, by HTTP method and endpoint",
+    ["method", "endpoint"],
+)
+GITHUB_REQUEST_ERRORS = metrics.counter(
+    "triage_github_request_errors_total",
+    "GitHub API requests that failed, by HTTP method, endpoint and status",
+    ["method", "endpoint", "status"],
+)
+DB_QUERY_SECONDS = metrics.histogram(
+    "triage_db_query_duration_seconds",
+    "SQL statement execution time, by statement type",
+    ["operation"],
+)
+DB_QUERY_ERRORS = metrics.counter(
+    "triage_db_query_errors_total",
+    "SQL statements that raised an error",
+)
+RULES_MATCH_SECONDS = metrics.histogram(
+    "triage_rules_match_duration_seconds",
+    "Time to match issue text against label or owner rules",
+    ["rules"],
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+)
+STALE_SWEEP_SECONDS = metrics.histogram(
+    "triage_stale_sweep_duration_seconds",
+    "Duration of each stale sweep phase",
+    ["phase"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+STALE_SWEEP_ISSUES = metrics.counter(
+    "triage_stale_sweep_issues_total",
+    "Issues handled by the stale sweep, by phase and outcome",
+    ["phase", "outcome"],
+)
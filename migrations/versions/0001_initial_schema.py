@@ -0,0 +1,53 @@
+"""initial schema
+
+Matches the tables previously created by db.create_all(). Databases that
+already have them are adopted as-is, so existing installs can simply run
+`flask db upgrade`.
+
+Revision ID: 0001_initial_schema
+Revises: 
+Create Date: 2026-10-17 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'issue_activity' not in tables:
+        op.create_table(
+            'issue_activity',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('repo_full_name', sa.String(length=255), nullable=False),
+            sa.Column('issue_number', sa.Integer(), nullable=False),
+            sa.Column('last_activity', sa.DateTime(), nullable=True),
+            sa.Column('is_stale', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('repo_full_name', 'issue_number'),
+        )
+
+    if 'rule_history' not in tables:
+        op.create_table(
+            'rule_history',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('rule_type', sa.String(length=50), nullable=False),
+            sa.Column('action', sa.String(length=20), nullable=False),
+            sa.Column('rule_data', sa.Text(), nullable=False),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+
+def downgrade():
+    op.drop_table('rule_history')
+    op.drop_table('issue_activity')
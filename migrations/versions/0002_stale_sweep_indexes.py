@@ -0,0 +1,45 @@
+"""stale sweep indexes and checkpoint table
+
+Revision ID: 0002_stale_sweep_indexes
+Revises: 0001_initial_schema
+Create Date: 2026-10-17 09:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_stale_sweep_indexes'
+down_revision = '0001_initial_schema'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() may already have created this table on older installs
+    if 'sweep_checkpoint' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'sweep_checkpoint',
+            sa.Column('phase', sa.String(length=50), nullable=False),
+            sa.Column('repo_full_name', sa.String(length=255), nullable=False),
+            sa.Column('issue_number', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('phase'),
+        )
+
+    op.create_index(
+        'ix_issue_activity_is_stale_last_activity',
+        'issue_activity',
+        ['is_stale', 'last_activity'],
+        unique=False,
+    )
+    op.create_index(
+        op.f('ix_rule_history_timestamp'), 'rule_history', ['timestamp'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_rule_history_timestamp'), table_name='rule_history')
+    op.drop_index('ix_issue_activity_is_stale_last_activity', table_name='issue_activity')
+    op.drop_table('sweep_checkpoint')
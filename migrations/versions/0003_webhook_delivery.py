@@ -0,0 +1,34 @@
+"""webhook delivery de-duplication table
+
+Revision ID: 0003_webhook_delivery
+Revises: 0002_stale_sweep_indexes
+Create Date: 2026-10-17 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_webhook_delivery'
+down_revision = '0002_stale_sweep_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'webhook_delivery',
+        sa.Column('delivery_id', sa.String(length=64), nullable=False),
+        sa.Column('event_type', sa.String(length=50), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('delivery_id'),
+    )
+    op.create_index(
+        op.f('ix_webhook_delivery_received_at'), 'webhook_delivery', ['received_at'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_webhook_delivery_received_at'), table_name='webhook_delivery')
+    op.drop_table('webhook_delivery')
@@ -0,0 +1,31 @@
+"""next stale/close deadline on issue_activity
+
+Revision ID: 0005_issue_activity_deadline
+Revises: 0004_job_lease
+Create Date: 2026-10-17 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_issue_activity_deadline'
+down_revision = '0004_job_lease'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows keep NULL; the incremental poll backfills their deadlines
+    # from the configured STALE_DAYS, which a migration cannot know
+    op.add_column('issue_activity', sa.Column('next_check_at', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_issue_activity_next_check_at', 'issue_activity', ['next_check_at'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_issue_activity_next_check_at', table_name='issue_activity')
+    with op.batch_alter_table('issue_activity') as batch_op:
+        batch_op.drop_column('next_check_at')
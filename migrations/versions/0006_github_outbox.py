@@ -0,0 +1,53 @@
+"""durable outbox of GitHub mutations
+
+Revision ID: 0006_github_outbox
+Revises: 0005_issue_activity_deadline
+Create Date: 2026-10-17 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_github_outbox'
+down_revision = '0005_issue_activity_deadline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'github_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('repo_full_name', sa.String(length=255), nullable=False),
+        sa.Column('issue_number', sa.Integer(), nullable=False),
+        sa.Column('labels', sa.Text(), nullable=False),
+        sa.Column('assignees', sa.Text(), nullable=False),
+        sa.Column('comments', sa.Text(), nullable=False),
+        sa.Column('state', sa.String(length=20), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('claimed_by', sa.String(length=255), nullable=True),
+        sa.Column('claimed_until', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_github_outbox_status_next_attempt_at',
+        'github_outbox',
+        ['status', 'next_attempt_at'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_github_outbox_repo_issue', 'github_outbox', ['repo_full_name', 'issue_number'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_github_outbox_repo_issue', table_name='github_outbox')
+    op.drop_index('ix_github_outbox_status_next_attempt_at', table_name='github_outbox')
+    op.drop_table('github_outbox')
@@ -1,8 +1,17 @@
 from app import db
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Index, UniqueConstraint
 from datetime import datetime, timezone
 
 
+def utcnow() -> datetime:
+    """Naive UTC, as the DateTime columns hold
+
+    An aware value compared against them in SQL would be shifted by the
+    database session's time zone.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class IssueActivity(db.Model):
     """Track issue activity for stale detection"""
 
@@ -11,11 +20,20 @@ class IssueActivity(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     repo_full_name = db.Column(db.String(255), nullable=False)
     issue_number = db.Column(db.Integer, nullable=False)
-    last_activity = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    last_activity = db.Column(db.DateTime, default=utcnow)
     is_stale = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=utcnow)
+    # When the issue is due to be marked stale (or closed, once stale);
+    # polled by STALE_MODE=incremental and pushed forward by activity
+    next_check_at = db.Column(db.DateTime, nullable=True)
 
-    __table_args__ = (UniqueConstraint("repo_full_name", "issue_number"),)
+    __table_args__ = (
+        UniqueConstraint("repo_full_name", "issue_number"),
+        # Serves the stale sweep's is_stale + last_activity range filters
+        Index("ix_issue_activity_is_stale_last_activity", "is_stale", "last_activity"),
+        # Due-queue for the incremental stale poll
+        Index("ix_issue_activity_next_check_at", "next_check_at"),
+    )
 
 
 class RuleHistory(db.Model):
@@ -28,4 +46,74 @@ class RuleHistory(db.Model):
     rule_type = db.Column(db.String(50), nullable=False) 
     action = db.Column(db.String(20), nullable=False) 
     rule_data = db.Column(db.Text, nullable=False)  
-    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    timestamp = db.Column(
+        db.DateTime, default=utcnow, index=True
+    )
+
+
+class SweepCheckpoint(db.Model):
+    """Resume point of an interrupted stale sweep phase"""
+
+    __tablename__ = "sweep_checkpoint"
+
+    phase = db.Column(db.String(50), primary_key=True)
+    # Last (repo_full_name, issue_number) whose results were committed
+    repo_full_name = db.Column(db.String(255), nullable=False)
+    issue_number = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=utcnow)
+
+
+class WebhookDelivery(db.Model):
+    """Webhook deliveries already processed, keyed by X-GitHub-Delivery"""
+
+    __tablename__ = "webhook_delivery"
+
+    delivery_id = db.Column(db.String(64), primary_key=True)
+    event_type = db.Column(db.String(50), nullable=True)
+    received_at = db.Column(
+        db.DateTime, default=utcnow, index=True
+    )
+
+
+class JobLease(db.Model):
+    """Lease giving one process the right to run a scheduled job or shard"""
+
+    __tablename__ = "job_lease"
+
+    name = db.Column(db.String(100), primary_key=True)
+    # hostname:pid:nonce of the holder, prefixed with "done:" once the work finished
+    holder = db.Column(db.String(255), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=utcnow)
+
+
+class OutboxMutation(db.Model):
+    """GitHub writes for one issue waiting to be sent by the outbox dispatcher"""
+
+    __tablename__ = "github_outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    repo_full_name = db.Column(db.String(255), nullable=False)
+    issue_number = db.Column(db.Integer, nullable=False)
+    # JSON lists of labels and assignees to add and comments to post, in order
+    labels = db.Column(db.Text, nullable=False, default="[]")
+    assignees = db.Column(db.Text, nullable=False, default="[]")
+    comments = db.Column(db.Text, nullable=False, default="[]")
+    state = db.Column(db.String(20), nullable=True)
+    # "pending" until sent (then deleted), or "dead" once given up on
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    # Dispatcher currently sending the row, and until when that claim holds
+    claimed_by = db.Column(db.String(255), nullable=True)
+    claimed_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    updated_at = db.Column(db.DateTime, default=utcnow)
+
+    __table_args__ = (
+        # Due-queue for the dispatcher
+        Index("ix_github_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+        # Finds the pending row of an issue to coalesce into
+        Index("ix_github_outbox_repo_issue", "repo_full_name", "issue_number"),
+    )
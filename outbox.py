@@ -0,0 +1,442 @@
+import os
+import json
+import uuid
+import atexit
+import random
+import socket
+import asyncio
+import logging
+import itertools
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import aliased
+
+from app import db
+from metrics import metrics
+from models import OutboxMutation, utcnow
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DEAD = "dead"
+
+# Tries at merging into a pending row other enqueuers keep changing before
+# a separate row is added instead
+COALESCE_ATTEMPTS = 3
+
+OUTBOX_MUTATIONS = metrics.counter(
+    "triage_outbox_mutations_total",
+    "Outbox rows by outcome of a send attempt (sent, retry, dead)",
+    ["result"],
+)
+
+
+def _retryable(error: Exception) -> bool:
+    """Whether a failed write may succeed later (outage, rate limit) or never will"""
+    from github import GithubException
+
+    if isinstance(error, GithubException):
+        # 401/403 also cover expiring tokens and secondary rate limits
+        return error.status >= 500 or error.status in (401, 403, 408, 429)
+    # Timeouts, connection errors, RateLimitWaitTooLong, missing credentials
+    return True
+
+
+class MutationOutbox:
+    """Durable queue of GitHub writes, drained by a background dispatcher
+
+    With OUTBOX_ENABLED=true, IssueBatch.flush() records the batch as a
+    github_outbox row in the request's transaction and returns; the
+    webhook never waits for GitHub. A pending row of an issue that no
+    dispatcher has claimed yet absorbs later writes for the same issue.
+    The dispatcher claims due rows (so several processes can run one),
+    sends up to OUTBOX_CONCURRENCY issues at once on the async client, and
+    deletes rows once sent. Failed parts are retried with exponential
+    backoff from OUTBOX_BACKOFF_SECONDS up to OUTBOX_MAX_BACKOFF_SECONDS;
+    after OUTBOX_MAX_ATTEMPTS, or on an error that cannot succeed later
+    (e.g. 404, 422), the row is kept with status "dead" for inspection.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("OUTBOX_ENABLED", "false").lower() == "true"
+        self.concurrency = max(1, int(os.getenv("OUTBOX_CONCURRENCY", "8")))
+        self.batch_size = max(1, int(os.getenv("OUTBOX_BATCH_SIZE", "100")))
+        self.poll_interval = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+        self.max_attempts = max(1, int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")))
+        self.backoff = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "5"))
+        self.max_backoff = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "900"))
+        # A claim outlives a dispatcher that died mid-send by this much
+        self.claim_ttl = timedelta(seconds=float(os.getenv("OUTBOX_CLAIM_SECONDS", "120")))
+
+        self._nonce = uuid.uuid4().hex[:8]
+        self._claims = itertools.count()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._app = None
+        self.counters = {"enqueued": 0, "coalesced": 0, "sent": 0, "retried": 0, "dead": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, app):
+        """Start the dispatcher thread if OUTBOX_ENABLED is set"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._app = app
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info("Outbox dispatcher started (concurrency %s)", self.concurrency)
+
+    def stop(self):
+        """Stop the dispatcher after its current batch; unsent rows stay in the table"""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        thread.join(timeout=30)
+
+    def enqueue(
+        self,
+        repo_full_name: str,
+        issue_number: int,
+        labels: Iterable[str] = (),
+        assignees: Iterable[str] = (),
+        comments: Iterable[str] = (),
+        state: Optional[str] = None,
+    ):
+        """Record writes for an issue (must run in an app context); commits the session"""
+        labels, assignees, comments = list(labels), list(assignees), list(comments)
+        try:
+            if not self._coalesce(repo_full_name, issue_number, labels, assignees, comments, state):
+                db.session.add(
+                    OutboxMutation(
+                        repo_full_name=repo_full_name,
+                        issue_number=issue_number,
+                        labels=json.dumps(labels),
+                        assignees=json.dumps(assignees),
+                        comments=json.dumps(comments),
+                        state=state,
+                        status=PENDING,
+                        attempts=0,
+                        next_attempt_at=utcnow(),
+                    )
+                )
+                self.counters["enqueued"] += 1
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self._wake.set()
+
+    def _coalesce(
+        self,
+        repo_full_name: str,
+        issue_number: int,
+        labels: List[str],
+        assignees: List[str],
+        comments: List[str],
+        state: Optional[str],
+    ) -> bool:
+        """Merge into the issue's unclaimed pending row; False if there is none"""
+        for _ in range(COALESCE_ATTEMPTS):
+            row = (
+                db.session.query(OutboxMutation)
+                .filter_by(repo_full_name=repo_full_name, issue_number=issue_number, status=PENDING)
+                .filter(OutboxMutation.claimed_by.is_(None))
+                .order_by(OutboxMutation.id.desc())
+                .first()
+            )
+            if row is None:
+                return False
+
+            # Compare-and-swap: only while still unclaimed, so a dispatcher never
+            # drops what it did not send, and only if no other enqueuer merged
+            # into the row since we read it, so neither merge is lost
+            merged = (
+                db.session.query(OutboxMutation)
+                .filter(
+                    OutboxMutation.id == row.id,
+                    OutboxMutation.claimed_by.is_(None),
+                    OutboxMutation.labels == row.labels,
+                    OutboxMutation.assignees == row.assignees,
+                    OutboxMutation.comments == row.comments,
+                    OutboxMutation.state.is_(None) if row.state is None else OutboxMutation.state == row.state,
+                )
+                .update(
+                    {
+                        OutboxMutation.labels: json.dumps(_union(json.loads(row.labels), labels)),
+                        OutboxMutation.assignees: json.dumps(_union(json.loads(row.assignees), assignees)),
+                        OutboxMutation.comments: json.dumps(json.loads(row.comments) + comments),
+                        OutboxMutation.state: state or row.state,
+                        OutboxMutation.updated_at: utcnow(),
+                    },
+                    synchronize_session=False,
+                )
+            )
+            if merged:
+                self.counters["coalesced"] += 1
+                return True
+            # Lost the race; drop the stale copy and look again
+            db.session.expire(row)
+        # Still contended: a separate row is sent after the pending one
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Row counts by status (must run in an app context) and dispatcher counters"""
+        counts = dict(
+            db.session.query(OutboxMutation.status, db.func.count()).group_by(OutboxMutation.status).all()
+        )
+        return {"pending": counts.get(PENDING, 0), "dead": counts.get(DEAD, 0), **self.counters}
+
+    def requeue_dead(self, repo_full_name: Optional[str] = None) -> int:
+        """Give dead rows (optionally of one repository) a fresh set of attempts"""
+        query = db.session.query(OutboxMutation).filter_by(status=DEAD)
+        if repo_full_name:
+            query = query.filter_by(repo_full_name=repo_full_name)
+        requeued = query.update(
+            {
+                OutboxMutation.status: PENDING,
+                OutboxMutation.attempts: 0,
+                OutboxMutation.next_attempt_at: utcnow(),
+                OutboxMutation.claimed_by: None,
+                OutboxMutation.claimed_until: None,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        self._wake.set()
+        return requeued
+
+    def drain_once(self) -> int:
+        """Claim and send one batch of due rows (must run in an app context); returns rows claimed"""
+        claim, rows = self._claim()
+        if not rows:
+            return 0
+
+        # Rows of one issue go out in order; different issues in parallel
+        by_issue: Dict[Tuple[str, int], List[OutboxMutation]] = defaultdict(list)
+        for row in rows:
+            by_issue[(row.repo_full_name, row.issue_number)].append(row)
+
+        from async_github import async_github
+
+        outcomes = async_github.run(self._send_all(list(by_issue.values())))
+        self._settle(claim, rows, outcomes)
+        return len(rows)
+
+    def _claim(self) -> Tuple[str, List[OutboxMutation]]:
+        now = utcnow()
+        claim = f"{socket.gethostname()}:{os.getpid()}:{self._nonce}:{next(self._claims)}"
+        claimable = or_(OutboxMutation.claimed_by.is_(None), OutboxMutation.claimed_until < now)
+        # Skip issues another dispatcher is sending, so their writes stay in order
+        held = aliased(OutboxMutation)
+        issue_held = (
+            db.session.query(held.id)
+            .filter(
+                held.repo_full_name == OutboxMutation.repo_full_name,
+                held.issue_number == OutboxMutation.issue_number,
+                held.claimed_until >= now,
+            )
+            .exists()
+        )
+        ids = [
+            row_id
+            for (row_id,) in db.session.query(OutboxMutation.id)
+            .filter(OutboxMutation.status == PENDING, OutboxMutation.next_attempt_at <= now, claimable)
+            .filter(~issue_held)
+            .order_by(OutboxMutation.next_attempt_at, OutboxMutation.id)
+            .limit(self.batch_size)
+        ]
+        if not ids:
+            db.session.rollback()
+            return claim, []
+
+        # Conditional on the row still being claimable and its issue still not
+        # held by another dispatcher, so two dispatchers never share a row
+        db.session.query(OutboxMutation).filter(OutboxMutation.id.in_(ids), claimable, ~issue_held).update(
+            {OutboxMutation.claimed_by: claim, OutboxMutation.claimed_until: now + self.claim_ttl},
+            synchronize_session=False,
+        )
+        db.session.commit()
+
+        # Under READ COMMITTED two dispatchers claiming rows of one issue at
+        # the same instant both pass the check above, as neither claim is
+        # committed yet. Looking again now ours is committed closes that gap:
+        # of two overlapping claims at least the later look sees the other,
+        # so at most one dispatcher keeps the issue (possibly neither)
+        other = aliased(OutboxMutation)
+        contested = (
+            db.session.query(OutboxMutation.repo_full_name, OutboxMutation.issue_number)
+            .filter(OutboxMutation.claimed_by == claim)
+            .filter(
+                db.session.query(other.id)
+                .filter(
+                    other.repo_full_name == OutboxMutation.repo_full_name,
+                    other.issue_number == OutboxMutation.issue_number,
+                    other.claimed_by != claim,
+                    other.claimed_until >= now,
+                )
+                .exists()
+            )
+            .distinct()
+            .all()
+        )
+        for repo_full_name, issue_number in contested:
+            db.session.query(OutboxMutation).filter_by(
+                claimed_by=claim, repo_full_name=repo_full_name, issue_number=issue_number
+            ).update(
+                {OutboxMutation.claimed_by: None, OutboxMutation.claimed_until: None},
+                synchronize_session=False,
+            )
+        if contested:
+            db.session.commit()
+            logger.info("Left %s issue(s) to another outbox dispatcher", len(contested))
+        rows = (
+            db.session.query(OutboxMutation)
+            .filter_by(claimed_by=claim)
+            .order_by(OutboxMutation.id)
+            .all()
+        )
+        return claim, rows
+
+    async def _send_all(self, issues: List[List[OutboxMutation]]) -> Dict[int, tuple]:
+        """Send every row; returns {row id: (labels, assignees, comments, state, error)} left unsent"""
+        slots = asyncio.Semaphore(self.concurrency)
+        outcomes: Dict[int, tuple] = {}
+
+        async def send_issue(rows: List[OutboxMutation]):
+            async with slots:
+                for row in rows:
+                    outcomes[row.id] = await self._send(row)
+
+        await asyncio.gather(*(send_issue(rows) for rows in issues))
+        return outcomes
+
+    async def _send(self, row: OutboxMutation) -> tuple:
+        """Send one row's writes; returns what is left to send and the last error"""
+        from github_client import github_client
+
+        issue = github_client.async_issue(row.repo_full_name, row.issue_number)
+        labels = json.loads(row.labels)
+        assignees = json.loads(row.assignees)
+        comments = json.loads(row.comments)
+        state = row.state
+        errors: List[Exception] = []
+
+        async def post_comments() -> List[str]:
+            # In order; stop at the first failure so none is posted out of turn
+            for index, body in enumerate(comments):
+                try:
+                    await issue.create_comment(body)
+                except Exception as e:
+                    errors.append(e)
+                    return comments[index:]
+            return []
+
+        async def send(call, *args) -> bool:
+            try:
+                await call(*args)
+                return True
+            except Exception as e:
+                errors.append(e)
+                return False
+
+        async def comments_then_state() -> Tuple[List[str], Optional[str]]:
+            left = await post_comments()
+            if state and not left and await send(lambda: issue.edit(state=state)):
+                return left, None
+            return left, state
+
+        (comments, state), labels_sent, assignees_sent = await asyncio.gather(
+            comments_then_state(),
+            send(issue.add_to_labels, *labels) if labels else _done(),
+            send(issue.add_to_assignees, *assignees) if assignees else _done(),
+        )
+        return (
+            [] if labels_sent else labels,
+            [] if assignees_sent else assignees,
+            comments,
+            state,
+            errors[-1] if errors else None,
+        )
+
+    def _settle(self, claim: str, rows: List[OutboxMutation], outcomes: Dict[int, tuple]):
+        """Delete sent rows; reschedule or dead-letter the rest (only rows still claimed by us)"""
+        now = utcnow()
+        for row in rows:
+            labels, assignees, comments, state, error = outcomes[row.id]
+            mine = db.session.query(OutboxMutation).filter_by(id=row.id, claimed_by=claim)
+            if not (labels or assignees or comments or state):
+                mine.delete(synchronize_session=False)
+                self.counters["sent"] += 1
+                OUTBOX_MUTATIONS.inc(result="sent")
+                continue
+
+            attempts = row.attempts + 1
+            dead = attempts >= self.max_attempts or (error is not None and not _retryable(error))
+            delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+            mine.update(
+                {
+                    OutboxMutation.labels: json.dumps(labels),
+                    OutboxMutation.assignees: json.dumps(assignees),
+                    OutboxMutation.comments: json.dumps(comments),
+                    OutboxMutation.state: state,
+                    OutboxMutation.status: DEAD if dead else PENDING,
+                    OutboxMutation.attempts: attempts,
+                    OutboxMutation.next_attempt_at: now + timedelta(seconds=delay),
+                    OutboxMutation.claimed_by: None,
+                    OutboxMutation.claimed_until: None,
+                    OutboxMutation.last_error: str(error)[:2000] if error is not None else None,
+                    OutboxMutation.updated_at: now,
+                },
+                synchronize_session=False,
+            )
+            where = f"issue #{row.issue_number} in {row.repo_full_name}"
+            if dead:
+                self.counters["dead"] += 1
+                OUTBOX_MUTATIONS.inc(result="dead")
+                logger.error(
+                    "Giving up on GitHub writes for %s after %s attempts: %s", where, attempts, error
+                )
+            else:
+                self.counters["retried"] += 1
+                OUTBOX_MUTATIONS.inc(result="retry")
+                logger.warning(
+                    "GitHub writes for %s failed (%s), retry %s in %.0fs", where, error, attempts, delay
+                )
+        db.session.commit()
+        db.session.expunge_all()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            claimed = 0
+            try:
+                with self._app.app_context():
+                    claimed = self.drain_once()
+            except Exception as e:
+                logger.error("Outbox dispatch failed: %s", e)
+            if claimed < self.batch_size:
+                # Caught up: sleep until the next poll or a local enqueue
+                self._wake.wait(self.poll_interval)
+
+
+def _union(current: List[str], extra: List[str]) -> List[str]:
+    return list(dict.fromkeys(current + extra))
+
+
+async def _done() -> bool:
+    return True
+
+
+# Global instance
+outbox = MutationOutbox()
@@ -1,50 +1,122 @@
 import json
+import time
 import logging
+from typing import Optional
 from flask import Blueprint, request, jsonify
 from security import verify_github_signature, get_webhook_secret
 from handlers.issues import handle_issue_event
 from handlers.comments import handle_comment_event
+from event_queue import event_queue, QueueFullError
+from delivery_dedup import delivery_deduplicator
+from metrics import WEBHOOK_EVENT_SECONDS, WEBHOOK_REQUEST_SECONDS
+from tracing import tracer
+from log_pipeline import log_context
+from github_client import github_client
 
 logger = logging.getLogger(__name__)
 
 webhook_bp = Blueprint('webhook', __name__)
 
+
+def dispatch_event(event_type: str, payload: dict, delivery_id: Optional[str] = None) -> dict:
+    """Route a parsed webhook payload to the appropriate handler"""
+    action, repo, issue = "", None, None
+    if isinstance(payload, dict):
+        action = payload.get("action", "")
+        repo = (payload.get("repository") or {}).get("full_name")
+        issue = (payload.get("issue") or {}).get("number")
+        tracer.annotate(action=action, repo=repo)
+        if repo:
+            # GitHub App deliveries name the installation that may act on the repo
+            github_client.remember_installation(repo, (payload.get("installation") or {}).get("id"))
+    # Every record logged while handling the event carries these fields
+    correlation = log_context(delivery=delivery_id, event=event_type, repo=repo, issue=issue)
+    with correlation, WEBHOOK_EVENT_SECONDS.time(event=event_type, action=action, result="exception") as labels:
+        try:
+            if event_type == "issues":
+                result = handle_issue_event(payload)
+            elif event_type == "issue_comment":
+                result = handle_comment_event(payload)
+            elif event_type == "ping":
+                result = {"status": "pong", "message": "Webhook configured successfully"}
+            else:
+                result = {"status": "ignored", "event": event_type}
+        except Exception:
+            delivery_deduplicator.release(delivery_id)
+            raise
+        labels["result"] = result.get("status", "")
+
+    if result.get("status") == "error":
+        # Let a redelivery of a failed event be processed again
+        delivery_deduplicator.release(delivery_id)
+    return result
+
+
 @webhook_bp.route('/webhook', methods=['POST'])
 def handle_webhook():
     """Handle GitHub webhook events"""
+    start = time.perf_counter()
+    event_type = request.headers.get('X-GitHub-Event')
+    delivery_id = request.headers.get('X-GitHub-Delivery')
+    with log_context(delivery=delivery_id, event=event_type), tracer.trace(
+        "webhook", event=event_type, delivery=delivery_id
+    ):
+        response = _handle_webhook()
+    status = response[1] if isinstance(response, tuple) else 200
+    # Only verified deliveries may name the event label
+    event = request.headers.get('X-GitHub-Event', '') if status != 401 else "unverified"
+    WEBHOOK_REQUEST_SECONDS.observe(time.perf_counter() - start, event=event, status=status)
+    return response
+
+
+def _handle_webhook():
     try:
         # Get request data
         signature = request.headers.get('X-Hub-Signature-256')
         event_type = request.headers.get('X-GitHub-Event')
+        delivery_id = request.headers.get('X-GitHub-Delivery')
         body = request.get_data()
         
         # Verify signature
         webhook_secret = get_webhook_secret()
-        if not signature or not verify_github_signature(signature, body, webhook_secret):
+        with tracer.span("verify_signature"):
+            verified = bool(signature) and verify_github_signature(signature, body, webhook_secret)
+        if not verified:
             logger.warning("Invalid webhook signature")
             return jsonify({"error": "Invalid signature"}), 401
         
+        # Skip redeliveries before any handler or GitHub call runs
+        if not delivery_deduplicator.claim(delivery_id, event_type):
+            logger.info("Ignoring duplicate delivery %s", delivery_id)
+            return jsonify({"status": "duplicate", "delivery": delivery_id})
+        
+        # Hand off to the worker pool and acknowledge immediately
+        if event_queue.running:
+            try:
+                event_queue.enqueue(event_type, body, delivery_id)
+            except QueueFullError as e:
+                logger.warning(str(e))
+                delivery_deduplicator.release(delivery_id)
+                return jsonify({"error": "Queue full, retry later"}), 503
+            logger.info("Queued %s webhook event", event_type)
+            return jsonify({"status": "queued", "event": event_type}), 202
+        
         # Parse payload
         try:
-            payload = json.loads(body)
+            with tracer.span("json.loads"):
+                payload = json.loads(body)
         except json.JSONDecodeError:
             logger.error("Invalid JSON payload")
+            delivery_deduplicator.release(delivery_id)
             return jsonify({"error": "Invalid JSON"}), 400
         
-        logger.info(f"Received {event_type} webhook event")
+        logger.info("Received %s webhook event", event_type)
         
         # Route to appropriate handler
-        result = {"status": "ignored", "event": event_type}
-        
-        if event_type == "issues":
-            result = handle_issue_event(payload)
-        elif event_type == "issue_comment":
-            result = handle_comment_event(payload)
-        elif event_type == "ping":
-            result = {"status": "pong", "message": "Webhook configured successfully"}
+        result = dispatch_event(event_type, payload, delivery_id)
         
         return jsonify(result)
         
     except Exception as e:
-        logger.error(f"Webhook handler error: {e}")
+        logger.error("Webhook handler error: %s", e)
         return jsonify({"error": "Internal server error"}), 500
@@ -1,28 +1,258 @@
+import re
 import json
 import os
 import logging
-from typing import Dict, List, Any
+from fnmatch import fnmatchcase
+from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
+from metrics import RULES_MATCH_SECONDS
+from label_scoring import LabelScorer, rule_keywords
+from tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+
+class LabelMatcher:
+    """Keyword matcher compiled from label rules into a single regex
+
+    Each position in the text is scanned once. Keywords are tried longest
+    first, and every shorter keyword that is a prefix of the match is
+    credited too, so results are identical to a per-keyword substring test.
+    """
+
+    def __init__(self, rules: Dict[str, Any], word_boundary: bool = False):
+        self.labels = list(rules)
+        self.word_boundary = word_boundary
+
+        keyword_labels: Dict[str, List[int]] = {}
+        for index, (label, spec) in enumerate(rules.items()):
+            for keyword in rule_keywords(spec):
+                keyword = keyword.lower()
+                if keyword:
+                    keyword_labels.setdefault(keyword, []).append(index)
+
+        # Map each keyword to the labels of all keywords that also match
+        # wherever it matches (itself and its qualifying prefixes)
+        self._keyword_hits: Dict[str, frozenset] = {}
+        for keyword in keyword_labels:
+            hits = set()
+            for end in range(1, len(keyword) + 1):
+                prefix = keyword[:end]
+                if prefix in keyword_labels and self._prefix_matches(prefix, keyword):
+                    hits.update(keyword_labels[prefix])
+            self._keyword_hits[keyword] = frozenset(hits)
+
+        self._pattern = None
+        if keyword_labels:
+            alternation = "|".join(
+                re.escape(keyword)
+                for keyword in sorted(keyword_labels, key=len, reverse=True)
+            )
+            if word_boundary:
+                alternation = rf"\b(?:{alternation})\b"
+            # Zero-width lookahead so overlapping matches are all reported
+            self._pattern = re.compile(rf"(?=({alternation}))")
+
+    def _prefix_matches(self, prefix: str, keyword: str) -> bool:
+        """Whether prefix also matches wherever keyword matches"""
+        if not self.word_boundary or prefix == keyword:
+            return True
+        # The prefix needs a word boundary between its last character and
+        # the next character of the longer keyword
+        return _is_word_char(prefix[-1]) != _is_word_char(keyword[len(prefix)])
+
+    def match(self, text: str) -> List[str]:
+        """Return labels whose keywords occur in text, in rule order"""
+        if self._pattern is None:
+            return []
+
+        hits = set()
+        for match in self._pattern.finditer(text.lower()):
+            hits |= self._keyword_hits[match.group(1)]
+            if len(hits) == len(self.labels):
+                break
+
+        return [label for index, label in enumerate(self.labels) if index in hits]
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+# Path-like tokens: runs of filename characters optionally joined by slashes
+PATH_TOKEN_RE = re.compile(r"/?[\w.@+-]+(?:/[\w.@+-]*)*")
+GLOB_CHARS = set("*?[")
+
+
+class _TrieNode:
+    __slots__ = ("children", "glob_children", "owners", "dir_owners", "rank")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.glob_children: List[Tuple[str, "_TrieNode"]] = []
+        # Owners for rules ending here; dir_owners only apply when the
+        # mentioned path continues below this segment (rule had a trailing /)
+        self.owners: Optional[List[str]] = None
+        self.dir_owners: Optional[List[str]] = None
+        self.rank = 0
+
+
+class OwnerTrie:
+    """Path-segment trie built from owner rules
+
+    Path-like tokens are extracted from the text and each is resolved to
+    the most specific (deepest) matching rule, CODEOWNERS style. A rule
+    with a trailing slash only matches paths below that directory, and
+    segments may contain *, ? or [...] globs.
+    """
+
+    def __init__(self, rules: Dict[str, List[str]]):
+        self.root = _TrieNode()
+        self.rule_count = 0
+
+        for rank, (path, owners) in enumerate(rules.items()):
+            segments = [segment for segment in path.strip("/").split("/") if segment]
+            if not segments:
+                continue
+            node = self.root
+            for segment in segments:
+                node = self._child(node, segment)
+            node.rank = rank
+            if path.endswith("/"):
+                node.dir_owners = list(owners)
+            else:
+                node.owners = list(owners)
+            self.rule_count += 1
+
+    def _child(self, node: _TrieNode, segment: str) -> _TrieNode:
+        if GLOB_CHARS.intersection(segment):
+            for pattern, child in node.glob_children:
+                if pattern == segment:
+                    return child
+            child = _TrieNode()
+            node.glob_children.append((segment, child))
+            return child
+        return node.children.setdefault(segment, _TrieNode())
+
+    def _longest(self, segments: List[str], start: int):
+        """Deepest rule matching segments[start:] as (depth, rank, owners)"""
+        best = None
+        stack = [(self.root, start)]
+        while stack:
+            node, index = stack.pop()
+            if index >= len(segments) or not segments[index]:
+                continue
+            segment = segments[index]
+            candidates = []
+            child = node.children.get(segment)
+            if child is not None:
+                candidates.append(child)
+            for pattern, glob_child in node.glob_children:
+                if fnmatchcase(segment, pattern):
+                    candidates.append(glob_child)
+
+            has_more = index + 1 < len(segments)
+            for child in candidates:
+                owners = child.dir_owners if has_more else None
+                if owners is None:
+                    owners = child.owners
+                if owners is not None:
+                    found = (index - start + 1, -child.rank, owners)
+                    if best is None or found[:2] > best[:2]:
+                        best = found
+                stack.append((child, index + 1))
+        return best
+
+    def resolve_path(self, token: str) -> List[str]:
+        """Owners for a single path; rules may match starting at any segment"""
+        segments = token.rstrip(".").split("/")
+        for start in range(len(segments)):
+            best = self._longest(segments, start)
+            if best is not None:
+                return best[2]
+        return []
+
+    def match(self, text: str) -> List[str]:
+        """Return owners for every path mentioned in text, without duplicates"""
+        matched_owners = []
+        resolved: Dict[str, List[str]] = {}
+        for token in PATH_TOKEN_RE.findall(text):
+            if token not in resolved:
+                resolved[token] = self.resolve_path(token)
+                matched_owners.extend(resolved[token])
+        return list(dict.fromkeys(matched_owners))
+
+
 class RulesManager:
     """Manage label and owner assignment rules"""
     
-    def __init__(self):
+    def __init__(self, word_boundary: Optional[bool] = None):
         self.rules_dir = Path("rules")
         self.rules_dir.mkdir(exist_ok=True)
         self.labels_file = self.rules_dir / "labels.json"
         self.owners_file = self.rules_dir / "owners.json"
+        if word_boundary is None:
+            word_boundary = os.getenv("LABEL_MATCH_WORD_BOUNDARY", "false").lower() == "true"
+        self.word_boundary = word_boundary
+        # "keywords" (any keyword present) or "scored" (weighted, thresholded)
+        self.label_engine = os.getenv("LABEL_ENGINE", "keywords").lower()
+        self.score_threshold = float(os.getenv("LABEL_SCORE_THRESHOLD", "1.0"))
+        self.score_top_k = int(os.getenv("LABEL_SCORE_TOP_K", "0"))
+
+        # Compiled matchers, keyed by the rules file state they were built from
+        self._compiled: Dict[str, Tuple[Optional[Tuple[int, int]], Any]] = {}
+
+    def _file_key(self, path: Path) -> Optional[Tuple[int, int]]:
+        """Cache key for a rules file; changes whenever the file is rewritten"""
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _get_compiled(self, name: str, path: Path, build):
+        """Return a cached build of a rules file, rebuilding it if the file changed"""
+        key = self._file_key(path)
+        cached = self._compiled.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        compiled = build()
+        self._compiled[name] = (key, compiled)
+        logger.debug("Compiled %s from %s", name, path)
+        return compiled
+
+    def get_label_matcher(self) -> LabelMatcher:
+        """Return the compiled label matcher, rebuilding it if labels.json changed"""
+        return self._get_compiled(
+            "label_matcher",
+            self.labels_file,
+            lambda: LabelMatcher(self.load_label_rules(), self.word_boundary),
+        )
+
+    def get_label_scorer(self) -> LabelScorer:
+        """Return the weighted label scorer, rebuilding it if labels.json changed"""
+        return self._get_compiled(
+            "label_scorer",
+            self.labels_file,
+            lambda: LabelScorer(self.load_label_rules(), self.score_threshold, self.score_top_k),
+        )
+
+    def get_owner_trie(self) -> OwnerTrie:
+        """Return the owner path trie, rebuilding it if owners.json changed"""
+        return self._get_compiled(
+            "owner_trie",
+            self.owners_file,
+            lambda: OwnerTrie(self.load_owner_rules()),
+        )
         
-    def load_label_rules(self) -> Dict[str, List[str]]:
+    def load_label_rules(self) -> Dict[str, Any]:
         """Load label assignment rules from JSON file"""
         try:
             if self.labels_file.exists():
                 with open(self.labels_file, 'r') as f:
                     return json.load(f)
         except Exception as e:
-            logger.error(f"Failed to load label rules: {e}")
+            logger.error("Failed to load label rules: %s", e)
         
         # Return default rules if file doesn't exist or failed to load
         return {
@@ -36,7 +266,7 @@ class RulesManager:
             "security": ["security", "vulnerability", "exploit", "attack"]
         }
     
-    def save_label_rules(self, rules: Dict[str, List[str]]) -> bool:
+    def save_label_rules(self, rules: Dict[str, Any]) -> bool:
         """Save label assignment rules to JSON file"""
         try:
             with open(self.labels_file, 'w') as f:
@@ -44,7 +274,7 @@ class RulesManager:
             logger.info("Label rules saved successfully")
             return True
         except Exception as e:
-            logger.error(f"Failed to save label rules: {e}")
+            logger.error("Failed to save label rules: %s", e)
             return False
     
     def load_owner_rules(self) -> Dict[str, List[str]]:
@@ -54,7 +284,7 @@ class RulesManager:
                 with open(self.owners_file, 'r') as f:
                     return json.load(f)
         except Exception as e:
-            logger.error(f"Failed to load owner rules: {e}")
+            logger.error("Failed to load owner rules: %s", e)
         
         # Return default rules if file doesn't exist or failed to load
         return {
@@ -76,32 +306,28 @@ class RulesManager:
             logger.info("Owner rules saved successfully")
             return True
         except Exception as e:
-            logger.error(f"Failed to save owner rules: {e}")
+            logger.error("Failed to save owner rules: %s", e)
             return False
     
     def match_labels(self, text: str) -> List[str]:
         """Match text against label rules and return applicable labels"""
-        rules = self.load_label_rules()
-        text_lower = text.lower()
-        matched_labels = []
-        
-        for label, keywords in rules.items():
-            if any(keyword in text_lower for keyword in keywords):
-                matched_labels.append(label)
-        
-        return matched_labels
+        with RULES_MATCH_SECONDS.time(rules="labels"), tracer.span("match_labels"):
+            if self.label_engine == "scored":
+                return self.get_label_scorer().match(text)
+            return self.get_label_matcher().match(text)
+
+    def match_labels_batch(self, texts: List[str]) -> List[List[str]]:
+        """match_labels() for many texts; the scored engine scores them in one pass"""
+        with tracer.span("match_labels_batch"):
+            if self.label_engine == "scored":
+                return self.get_label_scorer().match_batch(texts)
+            matcher = self.get_label_matcher()
+            return [matcher.match(text) for text in texts]
     
     def match_owners(self, text: str) -> List[str]:
         """Match text against owner rules and return applicable owners"""
-        rules = self.load_owner_rules()
-        matched_owners = []
-        
-        for path, owners in rules.items():
-            if path in text:
-                matched_owners.extend(owners)
-        
-        # Remove duplicates while preserving order
-        return list(dict.fromkeys(matched_owners))
+        with RULES_MATCH_SECONDS.time(rules="owners"), tracer.span("match_owners"):
+            return self.get_owner_trie().match(text)
 
 # Global instance
 rules_manager = RulesManager()
@@ -49,7 +49,7 @@ def verify_github_signature(signature_header: str, body: bytes, secret: str) ->
         return is_valid
         
     except Exception as e:
-        logger.error(f"Error verifying signature: {e}")
+        logger.error("Error verifying signature: %s", e)
         return False
 
 def get_webhook_secret():
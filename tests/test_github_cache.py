@@ -0,0 +1,40 @@
+from github_cache import ResponseCache
+
+ISSUE = "/repos/octo/repo/issues/1"
+
+
+def _fresh(path: str) -> ResponseCache:
+    # An empty LRU, so every read falls through to the SQLite file
+    return ResponseCache(max_size=0, ttl=60, path=path)
+
+
+def test_persisted_writes_wait_for_flush(tmp_path, monkeypatch):
+    monkeypatch.setenv("GITHUB_CACHE_FLUSH_MS", "60000")
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(max_size=10, ttl=60, path=path)
+
+    cache.put(ISSUE, {"etag": '"a"'}, {"number": 1})
+    assert _fresh(path).get(ISSUE) is None
+
+    assert cache.flush() == 1
+    assert _fresh(path).get(ISSUE).data == {"number": 1}
+    cache.stop()
+
+
+def test_queued_delete_hides_persisted_rows(tmp_path, monkeypatch):
+    monkeypatch.setenv("GITHUB_CACHE_FLUSH_MS", "60000")
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(max_size=10, ttl=60, path=path)
+    cache.put(ISSUE, {"etag": '"a"'}, {"number": 1})
+    cache.put("/repos/octo/repo/issues?state=open", {"etag": '"b"'}, [])
+    cache.flush()
+
+    cache.invalidate("https://api.github.com" + ISSUE + "/labels")
+    # The DELETE is still queued, but the rows must not be served
+    assert cache.get(ISSUE) is None
+    assert cache.get("/repos/octo/repo/issues?state=open") is None
+    assert _fresh(path).get(ISSUE) is not None
+
+    cache.flush()
+    assert _fresh(path).get(ISSUE) is None
+    cache.stop()
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+from github import GithubException
+
+from github_client import CORE, RateLimitWaitTooLong, RequestScheduler
+
+
+def _exhausted(resource: str, reset_in: float) -> GithubException:
+    return GithubException(
+        403,
+        {"message": "API rate limit exceeded"},
+        {
+            "X-RateLimit-Limit": "5000",
+            "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset": str(int(time.time() + reset_in)),
+            "X-RateLimit-Resource": resource,
+        },
+    )
+
+
+def _raise(error: Exception):
+    raise error
+
+
+def test_graphql_exhaustion_leaves_core_unthrottled():
+    scheduler = RequestScheduler()
+
+    with pytest.raises(RateLimitWaitTooLong):
+        scheduler.execute(lambda: _raise(_exhausted("graphql", 1800)), "POST", "graphql")
+
+    start = time.monotonic()
+    response = ({"X-RateLimit-Remaining": "4999", "X-RateLimit-Limit": "5000"}, {})
+    scheduler.execute(lambda: response, "GET", CORE)
+    assert time.monotonic() - start < 1
+    assert scheduler.remaining == 4999
+    assert scheduler.stats()["blocked_until"] == 0
+
+    # GraphQL itself stays paused until its own reset
+    with pytest.raises(RateLimitWaitTooLong):
+        scheduler.execute(lambda: ({}, {}), "POST", "graphql")
+
+
+def test_secondary_limit_pauses_every_resource():
+    scheduler = RequestScheduler()
+    error = GithubException(403, {"message": "secondary rate limit"}, {"Retry-After": "600"})
+
+    with pytest.raises(RateLimitWaitTooLong):
+        scheduler.execute(lambda: _raise(error), "POST", "graphql")
+    with pytest.raises(RateLimitWaitTooLong):
+        scheduler.execute(lambda: ({}, {}), "GET", CORE)
+
+
+def test_server_errors_retry_only_idempotent_verbs(monkeypatch):
+    scheduler = RequestScheduler()
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise GithubException(502, {"message": "Bad Gateway"}, {})
+
+    # A POST may have been applied before the 502; sending it again could duplicate it
+    with pytest.raises(GithubException):
+        scheduler.execute(failing, "POST")
+    assert len(calls) == 1
+
+    calls.clear()
+    with pytest.raises(GithubException):
+        scheduler.execute(failing, "GET")
+    assert len(calls) == 1 + scheduler.max_retries
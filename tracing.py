@@ -0,0 +1,219 @@
+import os
+import time
+import heapq
+import random
+import pstats
+import logging
+import cProfile
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_NOOP = nullcontext()
+
+
+class Trace:
+    """Spans recorded for one unit of work, such as a webhook delivery"""
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        # (name, start offset, duration, depth, attrs)
+        self.spans: List[Tuple[str, float, float, int, Dict[str, Any]]] = []
+
+    def breakdown(self) -> str:
+        """Total time and count per span name, slowest first"""
+        totals: Dict[str, List[float]] = {}
+        for name, _, duration, _, _ in self.spans:
+            entry = totals.setdefault(name, [0.0, 0])
+            entry[0] += duration
+            entry[1] += 1
+        parts = [
+            f"{name} {total * 1000:.1f} ms" + (f" x{count}" if count > 1 else "")
+            for name, (total, count) in sorted(totals.items(), key=lambda item: -item[1][0])
+        ]
+        return ", ".join(parts) or "no spans"
+
+
+class _Span:
+    __slots__ = ("tracer", "trace", "name", "attrs", "start", "token")
+
+    def __init__(self, tracer: "Tracer", trace: Trace, name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.token = self.tracer._depth.set(self.tracer._depth.get() + 1)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        depth = self.tracer._depth.get()
+        self.tracer._depth.reset(self.token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace.spans.append(
+            (self.name, self.start - self.trace.start, end - self.start, depth, self.attrs)
+        )
+        return False
+
+
+class Tracer:
+    """Opt-in spans around the webhook pipeline and a sampling profiler
+
+    With TRACE_ENABLED=true, every delivery records spans (signature check,
+    JSON parsing, rule matching, GitHub requests, DB commits) and deliveries
+    slower than TRACE_SLOW_MS are logged with a per-span breakdown. With
+    PROFILE_DIR set, a PROFILE_SAMPLE_RATE fraction of deliveries run under
+    cProfile and the pstats of the slowest PROFILE_KEEP are kept there.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("TRACE_ENABLED", "false").lower() == "true"
+        self.slow_ms = float(os.getenv("TRACE_SLOW_MS", "500"))
+        self.profile_dir = os.getenv("PROFILE_DIR", "")
+        self.profile_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0.1"))
+        self.profile_keep = int(os.getenv("PROFILE_KEEP", "20"))
+
+        self._current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+            "trace", default=None
+        )
+        self._depth = contextvars.ContextVar("trace_depth", default=0)
+        # Min-heap of (duration, path) so the fastest kept profile is evicted first
+        self._profiles: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        # cProfile cannot run concurrently on 3.12+, so profile one request at a time
+        self._profiling = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.enabled or bool(self.profile_dir)
+
+    def current(self) -> Optional[Trace]:
+        return self._current.get()
+
+    def span(self, name: str, **attrs):
+        """Context manager timing a step of the current trace (no-op outside one)"""
+        trace = self._current.get()
+        if trace is None:
+            return _NOOP
+        return _Span(self, trace, name, attrs)
+
+    def annotate(self, **attrs):
+        """Add attributes (e.g. repo, action) to the current trace"""
+        trace = self._current.get()
+        if trace is not None:
+            trace.attrs.update(attrs)
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """Record one unit of work; nested calls become spans of the outer trace"""
+        if not self.active:
+            yield None
+            return
+        if self._current.get() is not None:
+            with self.span(name, **attrs):
+                yield self._current.get()
+            return
+
+        trace = Trace(name, attrs)
+        token = self._current.set(trace)
+        profiler = self._start_profiler()
+        try:
+            yield trace
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            trace.duration = time.perf_counter() - trace.start
+            self._current.reset(token)
+            if profiler is not None:
+                self._profiling.release()
+                self._keep_profile(trace, profiler)
+            if self.enabled and trace.duration * 1000 >= self.slow_ms:
+                logger.warning(
+                    "Slow %s %s took %.1f ms: %s",
+                    trace.name,
+                    self._describe(trace),
+                    trace.duration * 1000,
+                    trace.breakdown(),
+                )
+
+    def instrument_session(self, session):
+        """Record a span for every commit of a SQLAlchemy (scoped) session"""
+        from sqlalchemy import event
+
+        def before_commit(sess):
+            if self._current.get() is not None:
+                sess.info["trace_commit_start"] = time.perf_counter()
+
+        def after_commit(sess):
+            start = sess.info.pop("trace_commit_start", None)
+            trace = self._current.get()
+            if start is not None and trace is not None:
+                end = time.perf_counter()
+                trace.spans.append(
+                    ("db.commit", start - trace.start, end - start, self._depth.get() + 1, {})
+                )
+
+        event.listen(session, "before_commit", before_commit)
+        event.listen(session, "after_commit", after_commit)
+        event.listen(session, "after_rollback", lambda sess: sess.info.pop("trace_commit_start", None))
+
+    def _describe(self, trace: Trace) -> str:
+        return " ".join(f"{key}={value}" for key, value in trace.attrs.items() if value)
+
+    def _start_profiler(self) -> Optional[cProfile.Profile]:
+        if not self.profile_dir or random.random() >= self.profile_rate:
+            return None
+        if not self._profiling.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is already active
+            self._profiling.release()
+            return None
+        return profiler
+
+    def _keep_profile(self, trace: Trace, profiler: cProfile.Profile):
+        """Dump the profile if it is among the slowest PROFILE_KEEP seen so far"""
+        with self._lock:
+            if len(self._profiles) >= self.profile_keep and trace.duration <= self._profiles[0][0]:
+                return
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+            label = "-".join(
+                str(trace.attrs[key]).replace("/", "_") for key in ("event", "action") if trace.attrs.get(key)
+            )
+            path = os.path.join(
+                self.profile_dir,
+                f"{trace.duration * 1000:08.1f}ms-{trace.name}-{label or 'unknown'}-{stamp}.pstats",
+            )
+            try:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                stats = pstats.Stats(profiler)
+                stats.dump_stats(path)
+            except Exception as e:
+                logger.warning("Failed to write profile %s: %s", path, e)
+                return
+            heapq.heappush(self._profiles, (trace.duration, path))
+            while len(self._profiles) > self.profile_keep:
+                _, evicted = heapq.heappop(self._profiles)
+                try:
+                    os.remove(evicted)
+                except OSError:
+                    pass
+        logger.info("Saved profile of %s (%.1f ms) to %s", trace.name, trace.duration * 1000, path)
+
+
+# Global instance
+tracer = Tracer()
@@ -0,0 +1,44 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from rules_manager import RulesManager, rules_manager
+
+# Bodies shorter than this (after stripping) get the checklist comment
+CHECKLIST_MIN_BODY = 40
+
+CHECKLIST_COMMENT = """Thanks for opening this issue! To help us better understand and resolve it, please provide:
+
+- [ ] **Steps to reproduce** the issue
+- [ ] **Expected behavior** vs **actual behavior**
+- [ ] **Error messages or logs** (if any)
+- [ ] **Environment details** (OS, browser, version, etc.)
+- [ ] **Screenshots or recordings** (if applicable)
+
+This information will help us investigate and resolve the issue more quickly."""
+
+
+def needs_checklist(body: Optional[str]) -> bool:
+    """Whether an issue body is too short to act on without more details"""
+    return len((body or "").strip()) < CHECKLIST_MIN_BODY
+
+
+def decide(title: Optional[str], body: Optional[str], rules: RulesManager = rules_manager) -> Dict[str, Any]:
+    """Labels, owners and checklist for an issue; no I/O besides reading the rules files"""
+    title, body = title or "", body or ""
+    return {
+        # Title and body together for keyword matching, path hints from the body
+        "labels": rules.match_labels(f"{title} {body}"),
+        "owners": rules.match_owners(body),
+        "checklist": needs_checklist(body),
+    }
+
+
+def decide_batch(
+    issues: Sequence[Tuple[Optional[str], Optional[str]]], rules: RulesManager = rules_manager
+) -> List[Dict[str, Any]]:
+    """decide() for many (title, body) pairs; labels are matched as one batch"""
+    issues = [(title or "", body or "") for title, body in issues]
+    labels = rules.match_labels_batch([f"{title} {body}" for title, body in issues])
+    return [
+        {"labels": matched, "owners": rules.match_owners(body), "checklist": needs_checklist(body)}
+        for matched, (title, body) in zip(labels, issues)
+    ]